@@ -1,48 +1,27 @@
-import re
-import subprocess
 import unittest
 from glob import glob
 from os.path import dirname
 
+from naps.soc.build_matrix import discover_targets, run_target
+
 
 class TestBuilds(unittest.TestCase):
     pass
 
 
-for file in glob("{}/*.py".format(dirname(__file__))):
-    if "builds_test" in file:  # we are not executing ourselves
-        continue
-    try:
-        subprocess.check_output(['python', file], stderr=subprocess.PIPE)
-        continue
-    except subprocess.CalledProcessError as e:
-        usage = e.stderr.decode("utf-8")
-    try:
-        devices = re.search("-d\\W*{(.*?)}", usage).group(1).split(",")
-        socs = re.search("-s\\W*{(.*?)}", usage).group(1).split(",")
-    except Exception as e:
-        print(e)
-        print(file, usage)
-        raise e
-
-    for device in devices:
-        for soc in socs:
-            def make_test_builds(file, device):
-                soc_local = str(soc)
-
-                def test_builds(self):
-                    command = ['python', file, '-e', '-d', device, '-s', soc_local]
-                    print("running '{}'".format(' '.join(command)))
-                    process = subprocess.Popen(command, stdout=subprocess.PIPE,
-                                               stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-                    stdout, stderr = process.communicate()
-                    print(stdout.decode("utf-8"))
-                    print(stderr.decode("utf-8"))
-
-                    self.assertEqual(0, process.returncode)
-
-                return test_builds
-
-
-            filename_stripped = file.split("/")[-1].replace(".py", "")
-            setattr(TestBuilds, "test_{}_{}_{}".format(filename_stripped, device, soc), make_test_builds(file, device))
+# every target is its own test, so the test runner (e.g. pytest-xdist) decides how many of them run in parallel.
+# every target writes its log to its own temporary directory. use `python -m naps.soc.build_matrix` to run the
+# whole matrix outside of the tests.
+files = [file for file in sorted(glob("{}/*.py".format(dirname(__file__)))) if "builds_test" not in file]
+
+for target in discover_targets(files):
+    def make_test_builds(target):
+        def test_builds(self):
+            result = run_target(target)
+            if not result.ok:
+                print(result.log_file.read_text())
+            self.assertTrue(result.ok, "elaborating {} failed (see {})".format(target.name, result.log_file))
+
+        return test_builds
+
+    setattr(TestBuilds, "test_{}".format(target.name), make_test_builds(target))
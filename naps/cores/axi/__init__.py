@@ -1,4 +1,5 @@
 from .axi_endpoint import *
+from .crossbar import *
 from .full_to_lite import *
 from .interconnect import *
 from .peripheral_connector import *
@@ -0,0 +1,232 @@
+from typing import List
+
+from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+from nmigen.utils import bits_for
+
+from naps.util.nmigen_misc import nAny
+from . import AxiEndpoint
+
+__all__ = ["AxiCrossbar"]
+
+
+class AxiCrossbar(Elaboratable):
+    def __init__(self, addr_bits=32, data_bits=64, max_outstanding=4):
+        """
+        A full AXI crossbar that connects many masters (e.g. `AxiWriter`s and `AxiReader`s) to many slaves (e.g. the
+        HP ports of the zynq).
+
+        The address channels of every slave are arbitrated between the masters (round robin, optionally weighted).
+        Bursts are routed as a whole: the write data of a burst follows its address and the responses are routed
+        back by their id. Every master gets a single id on the slave side (its index), the original ids of the
+        masters are remembered and restored for the responses. A master only talks to one slave at a time
+        (per direction), which keeps all the responses in order.
+
+        :param max_outstanding: the number of unfinished bursts every master may have per direction (multiplied by
+                                the weight of the master).
+        """
+        self.addr_bits = addr_bits
+        self.data_bits = data_bits
+        self.max_outstanding = max_outstanding
+
+        self._masters: List[AxiEndpoint] = []
+        self._weights: List[int] = []
+        self._slaves: List[AxiEndpoint] = []
+        self._slave_ranges: List[range] = []
+
+    def get_master_port(self, weight=1, id_bits=12):
+        """
+        Gets a new AXI port that a master can use to access the slaves of the crossbar.
+
+        :param weight: the relative share of the bandwidth of a slave the master gets if all masters are busy. the
+                       master may issue this many bursts in a row if other masters are waiting, too and may have
+                       this many times more bursts in flight.
+        :param id_bits: the width of the id signals of the master
+        """
+        assert weight >= 1
+        port = AxiEndpoint(
+            addr_bits=self.addr_bits, data_bits=self.data_bits, lite=False, id_bits=id_bits,
+            name="axi_crossbar_master_{}".format(len(self._masters))
+        )
+        self._masters.append(port)
+        self._weights.append(weight)
+        return port
+
+    def add_slave(self, slave: AxiEndpoint, address_range=None):
+        """
+        Connects a slave to the crossbar. Accesses to addresses that are not in the range of any slave are never accepted.
+
+        :param address_range: the range of addresses that are routed to this slave (all addresses if None)
+        """
+        assert not slave.is_lite
+        assert slave.addr_bits == self.addr_bits and slave.data_bits == self.data_bits
+        if address_range is None:
+            address_range = range(0, 2 ** self.addr_bits)
+        for other in self._slave_ranges:
+            assert address_range.stop <= other.start or other.stop <= address_range.start, "slave ranges overlap"
+        self._slaves.append(slave)
+        self._slave_ranges.append(address_range)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        masters, slaves = self._masters, self._slaves
+        assert masters and slaves
+        for slave in slaves:
+            assert slave.id_bits >= bits_for(len(masters) - 1), "the slaves need an id bit per master index bit"
+
+        def in_range(address, i):
+            address_range = self._slave_ranges[i]
+            return (address >= address_range.start) & (address < address_range.stop)
+
+        def remapped_id(slave, i):
+            return Const(i, slave.id_bits)
+
+        def master_index(slave, stream):
+            index = Signal(range(max(len(masters), 2)))
+            m.d.comb += index.eq(stream.id)
+            return index
+
+        limits = [self.max_outstanding * weight for weight in self._weights]
+
+        for direction in ["read", "write"]:
+            address_name = "{}_address".format(direction)
+            response_name = "read_data" if direction == "read" else "write_response"
+
+            # every master may only have outstanding bursts to one slave at a time
+            outstanding, target = [], []
+            for i, master in enumerate(masters):
+                outstanding.append(Signal(range(limits[i] + 1), name="{}_outstanding_{}".format(direction, i)))
+                target.append(Signal(range(len(slaves)), name="{}_target_{}".format(direction, i)))
+
+            started = [Signal(name="{}_started_{}".format(direction, i)) for i in range(len(masters))]
+            finished = [Signal(name="{}_finished_{}".format(direction, i)) for i in range(len(masters))]
+
+            # the original ids of the masters in the order of their bursts
+            id_fifos = []
+            for i, master in enumerate(masters):
+                id_fifo = m.submodules["{}_id_fifo_{}".format(direction, i)] = SyncFIFO(
+                    width=master.id_bits, depth=limits[i]
+                )
+                m.d.comb += id_fifo.w_data.eq(master[address_name].id)
+                m.d.comb += id_fifo.w_en.eq(started[i])
+                m.d.comb += id_fifo.r_en.eq(finished[i])
+                id_fifos.append(id_fifo)
+
+            # the address channels
+            master_ready = [[] for _ in masters]
+            for j, slave in enumerate(slaves):
+                requests = []
+                for i, master in enumerate(masters):
+                    request = Signal(name="{}_request_{}_{}".format(direction, i, j))
+                    allowed = (outstanding[i] == 0) | ((target[i] == j) & (outstanding[i] < limits[i]))
+                    m.d.comb += request.eq(master[address_name].valid & in_range(master[address_name].payload, j) & allowed)
+                    requests.append(request)
+
+                slave_address = slave[address_name]
+                handshake = slave_address.valid & slave_address.ready
+                grant, locked = self._arbiter(m, requests, "{}_arbiter_{}".format(direction, j), handshake)
+
+                with m.Switch(grant):
+                    for i, master in enumerate(masters):
+                        with m.Case(i):
+                            for name, signal in slave_address.payload_signals.items():
+                                if name == "id":
+                                    m.d.comb += signal.eq(remapped_id(slave, i))
+                                else:
+                                    m.d.comb += signal.eq(master[address_name][name])
+                            m.d.comb += slave_address.valid.eq(locked)
+
+                for i, master in enumerate(masters):
+                    granted = Signal(name="{}_granted_{}_{}".format(direction, i, j))
+                    m.d.comb += granted.eq(locked & (grant == i) & slave_address.ready)
+                    master_ready[i].append(granted)
+                    with m.If(granted):
+                        m.d.comb += started[i].eq(1)
+                        m.d.sync += target[i].eq(j)
+
+                if direction == "write":
+                    self._route_write_data(m, masters, slave, j, handshake, grant, sum(limits))
+
+            for i, master in enumerate(masters):
+                m.d.comb += master[address_name].ready.eq(nAny(master_ready[i]))
+
+            # the responses are routed back to the master that is encoded in their id
+            for i, master in enumerate(masters):
+                response = master[response_name]
+                with m.Switch(target[i]):
+                    for j, slave in enumerate(slaves):
+                        with m.Case(j):
+                            slave_response = slave[response_name]
+                            for_us = Signal(name="{}_response_{}_{}".format(direction, i, j))
+                            m.d.comb += for_us.eq(slave_response.valid & (master_index(slave, slave_response) == i))
+                            for name, signal in response.payload_signals.items():
+                                if name == "id":
+                                    m.d.comb += signal.eq(id_fifos[i].r_data)
+                                else:
+                                    m.d.comb += signal.eq(slave_response[name])
+                            m.d.comb += response.valid.eq(for_us)
+                last = response.last if direction == "read" else 1
+                m.d.comb += finished[i].eq(response.valid & response.ready & last)
+
+                with m.If(started[i] & ~finished[i]):
+                    m.d.sync += outstanding[i].eq(outstanding[i] + 1)
+                with m.Elif(~started[i] & finished[i]):
+                    m.d.sync += outstanding[i].eq(outstanding[i] - 1)
+
+            for j, slave in enumerate(slaves):
+                slave_response = slave[response_name]
+                with m.Switch(master_index(slave, slave_response)):
+                    for i, master in enumerate(masters):
+                        with m.Case(i):
+                            m.d.comb += slave_response.ready.eq(master[response_name].ready & (target[i] == j))
+
+        return m
+
+    def _route_write_data(self, m, masters, slave, j, address_handshake, grant, depth):
+        # the write data of the bursts is passed on in the order in which the slave accepted their addresses
+        order_fifo = m.submodules["write_order_fifo_{}".format(j)] = SyncFIFO(
+            width=max(bits_for(len(masters) - 1), 1), depth=depth
+        )
+        m.d.comb += order_fifo.w_data.eq(grant)
+        m.d.comb += order_fifo.w_en.eq(address_handshake)
+
+        with m.If(order_fifo.r_rdy):
+            with m.Switch(order_fifo.r_data):
+                for i, master in enumerate(masters):
+                    with m.Case(i):
+                        for name, signal in slave.write_data.payload_signals.items():
+                            if name == "id":
+                                m.d.comb += signal.eq(i)
+                            else:
+                                m.d.comb += signal.eq(master.write_data[name])
+                        m.d.comb += slave.write_data.valid.eq(master.write_data.valid)
+                        m.d.comb += master.write_data.ready.eq(slave.write_data.ready)
+        m.d.comb += order_fifo.r_en.eq(slave.write_data.valid & slave.write_data.ready & slave.write_data.last)
+
+    def _arbiter(self, m, requests, name, handshake):
+        """
+        Chooses one of the requests and holds the grant until the handshake happens. The last granted request may be
+        granted again up to its weight times in a row, after that the requests are served round robin.
+        """
+        n = len(requests)
+        grant = Signal(range(n), name="{}_grant".format(name))
+        locked = Signal(name="{}_locked".format(name))
+        in_a_row = Signal(range(max(self._weights) + 1), name="{}_in_a_row".format(name))
+
+        with m.If(~locked):
+            with m.Switch(grant):
+                for last in range(n):
+                    with m.Case(last):
+                        with m.If(requests[last] & (in_a_row < self._weights[last])):
+                            m.d.sync += locked.eq(1)
+                            m.d.sync += in_a_row.eq(in_a_row + 1)
+                        for i in [(last + k) % n for k in range(1, n + 1)]:
+                            with m.Elif(requests[i]):
+                                m.d.sync += grant.eq(i)
+                                m.d.sync += locked.eq(1)
+                                m.d.sync += in_a_row.eq(1)
+        with m.Elif(handshake):
+            m.d.sync += locked.eq(0)
+
+        return grant, locked
@@ -0,0 +1,181 @@
+import unittest
+
+import numpy as np
+from nmigen import *
+from nmigen.sim import Passive
+
+from naps import SimPlatform, BasicStream, write_to_stream
+from naps.stream.sim_util import StreamSource, StreamSink
+from .axi_endpoint import AxiEndpoint, AxiBurstType
+from .crossbar import AxiCrossbar
+from .sim_util import AxiSlaveModel, axi_read_burst, axi_write_burst
+from .stream_reader import AxiReader
+from .stream_writer import AxiWriter
+
+
+def saturating_master(platform, axi, direction, address, counter, beats=16):
+    """issues bursts of the given direction as fast as the crossbar accepts them and counts the finished ones"""
+    counter[axi] = 0
+
+    def issue_addresses():
+        yield Passive()
+        stream = axi.write_address if direction == "write" else axi.read_address
+        while True:
+            yield from write_to_stream(stream, payload=address, burst_len=beats - 1, burst_type=AxiBurstType.INCR,
+                                       beat_size_bytes=3, timeout=-1)
+
+    def write_data():
+        yield Passive()
+        while True:
+            for i in range(beats):
+                yield from write_to_stream(axi.write_data, payload=i, byte_strobe=0xff, last=(i == beats - 1),
+                                           timeout=-1)
+
+    def collect_responses():
+        yield Passive()
+        if direction == "write":
+            yield axi.write_response.ready.eq(1)
+        else:
+            yield axi.read_data.ready.eq(1)
+        while True:
+            yield
+            if direction == "write" and (yield axi.write_response.valid):
+                counter[axi] += 1
+            if direction == "read" and (yield axi.read_data.valid) and (yield axi.read_data.last):
+                counter[axi] += 1
+
+    platform.add_process(issue_addresses, "sync")
+    if direction == "write":
+        platform.add_process(write_data, "sync")
+    platform.add_process(collect_responses, "sync")
+
+
+class AxiCrossbarTest(unittest.TestCase):
+    def make_crossbar(self, platform, n_slaves=1, **kwargs):
+        crossbar = AxiCrossbar(**kwargs)
+        models = []
+        for j in range(n_slaves):
+            slave = AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12)
+            crossbar.add_slave(slave, range(j * 0x1000, (j + 1) * 0x1000))
+            models.append(AxiSlaveModel(platform, slave, read_latency=4, write_latency=2))
+        return crossbar, models
+
+    def test_routing_and_ids(self):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        crossbar, models = self.make_crossbar(platform, n_slaves=2)
+        masters = [crossbar.get_master_port() for _ in range(3)]
+
+        def master_process(i, axi):
+            def process():
+                for j in range(2):
+                    address = j * 0x1000 + i * 0x100
+                    data = [(i << 16) | (j << 8) | k for k in range(8)]
+                    yield from axi_write_burst(axi, address, data, id=i + 5, timeout=1000)
+                    self.assertEqual((yield from axi_read_burst(axi, address, 8, id=i + 7, timeout=1000)), data)
+                done[i] = True
+            return process
+
+        done = {}
+        for i, axi in enumerate(masters[1:], start=1):
+            platform.add_process(master_process(i, axi), "sync")
+        platform.sim(crossbar, master_process(0, masters[0]), traces="none")
+
+        self.assertEqual(len(done), 3)
+        self.assertEqual(models[1].memory.read_word(0x1000 + 0x200 + 8 * 3, 8), (2 << 16) | (1 << 8) | 3)
+        self.assertEqual(models[0].write_bursts, 3)
+        self.assertEqual(models[1].read_bursts, 3)
+
+    def check_fairness(self, direction, weights, cycles=3000):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        crossbar, models = self.make_crossbar(platform)
+        counter = {}
+        masters = [crossbar.get_master_port(weight=weight) for weight in weights]
+        for i, axi in enumerate(masters):
+            saturating_master(platform, axi, direction, i * 0x400, counter)
+
+        def testbench():
+            for _ in range(cycles):
+                yield
+
+        platform.sim(crossbar, testbench, traces="none")
+        finished = [counter[axi] for axi in masters]
+        stats = models[0].statistics()
+        bytes_per_cycle = stats["{}_bytes_per_cycle".format(direction)]
+        print("{} bursts per master with weights {}: {} ({:.2f} bytes / cycle)".format(
+            direction, weights, finished, bytes_per_cycle
+        ))
+        # the slave is kept busy
+        self.assertGreater(bytes_per_cycle, 0.8 * 8)
+        return finished
+
+    def assertShares(self, finished, weights):
+        total, total_weight = sum(finished), sum(weights)
+        for count, weight in zip(finished, weights):
+            self.assertAlmostEqual(count / total, weight / total_weight, delta=0.05)
+
+    def test_round_robin_write_fairness(self):
+        weights = [1, 1, 1]
+        self.assertShares(self.check_fairness("write", weights), weights)
+
+    def test_round_robin_read_fairness(self):
+        weights = [1, 1, 1, 1]
+        self.assertShares(self.check_fairness("read", weights), weights)
+
+    def test_weighted_fairness(self):
+        weights = [3, 1, 2]
+        self.assertShares(self.check_fairness("write", weights), weights)
+        self.assertShares(self.check_fairness("read", weights), weights)
+
+    def test_outstanding_limit(self):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        crossbar = AxiCrossbar(max_outstanding=2)
+        slave = AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12)
+        crossbar.add_slave(slave)
+        model = AxiSlaveModel(platform, slave, read_latency=30)
+        counter = {}
+        saturating_master(platform, crossbar.get_master_port(), "read", 0, counter)
+
+        def testbench():
+            for _ in range(500):
+                yield
+
+        platform.sim(crossbar, testbench, traces="none")
+        self.assertEqual(model.max_outstanding_reads, 2)
+
+    def test_writer_and_reader_share_a_port(self):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        crossbar, models = self.make_crossbar(platform)
+        m = Module()
+        m.submodules.crossbar = crossbar
+
+        words = 128
+        write_address, write_data, read_address = BasicStream(32), BasicStream(64), BasicStream(32)
+        m.submodules.writer = AxiWriter(write_address, write_data, crossbar.get_master_port())
+        reader = m.submodules.reader = AxiReader(read_address, crossbar.get_master_port())
+
+        addresses = np.arange(words) * 8
+        data = addresses * 0x1_0001
+        write_address_source = StreamSource(platform, write_address)
+        write_data_source = StreamSource(platform, write_data)
+        read_address_source = StreamSource(platform, read_address)
+        sink = StreamSink(platform, reader.output)
+
+        def testbench():
+            write_address_source.write(addresses)
+            write_data_source.write(data)
+            # read the first half while the rest is written
+            while models[0].write_beats < words // 2:
+                yield
+            read_address_source.write(addresses[:words // 2])
+            np.testing.assert_array_equal((yield from sink.read(words // 2, timeout=1000)), data[:words // 2])
+            while models[0].write_beats < words:
+                yield
+            read_address_source.write(addresses[words // 2:])
+            np.testing.assert_array_equal((yield from sink.read(words // 2, timeout=1000)), data[words // 2:])
+
+        platform.add_process(testbench, "sync")
+        platform.sim(m, traces="none")
@@ -1,20 +1,48 @@
 from nmigen import *
+from nmigen.lib.fifo import SyncFIFO
+
 from . import AxiEndpoint
 
 __all__ = ["AxiFullToLiteBridge"]
 
 
 class AxiFullToLiteBridge(Elaboratable):
-    def __init__(self, full_master: AxiEndpoint):
+    def __init__(self, full_master: AxiEndpoint, max_outstanding=1):
+        """
+        :param max_outstanding: the number of transactions per direction the lite slave can have in flight.
+                                if it is bigger than one, the ids of the full master are tracked in fifos.
+        """
         assert not full_master.is_lite
         self._full_master = full_master
+        self.max_outstanding = max_outstanding
         self.lite_master = AxiEndpoint.like(full_master, lite=True, name="axi_lite_bridge_master")
 
     def elaborate(self, platform):
         m = Module()
 
         m.d.comb += self._full_master.connect_downstream(self.lite_master, allow_partial=True)
-        
+
+        if self.max_outstanding > 1:
+            # the lite slave answers in order, so the ids of the responses are the ids of the requests in order
+            for name, address, lite_address, response in [
+                ("read", self._full_master.read_address, self.lite_master.read_address, self._full_master.read_data),
+                ("write", self._full_master.write_address, self.lite_master.write_address,
+                 self._full_master.write_response),
+            ]:
+                id_fifo = m.submodules["{}_id_fifo".format(name)] = SyncFIFO(
+                    width=len(address.id), depth=self.max_outstanding
+                )
+                # the slave can take a new request in the cycle in which the master takes a response. the fifo is still
+                # full in that cycle, so we hold the request back until there is space for its id
+                m.d.comb += lite_address.valid.eq(address.valid & id_fifo.w_rdy)
+                m.d.comb += address.ready.eq(lite_address.ready & id_fifo.w_rdy)
+                m.d.comb += id_fifo.w_data.eq(address.id)
+                m.d.comb += id_fifo.w_en.eq(address.valid & address.ready)
+                m.d.comb += response.id.eq(id_fifo.r_data)
+                m.d.comb += id_fifo.r_en.eq(response.valid & response.ready)
+            m.d.comb += self._full_master.read_data.last.eq(1)
+            return m
+
         # fake the id tracking
         read_id = Signal.like(self._full_master.read_data.id)
         write_id = Signal.like(self._full_master.write_data.id)
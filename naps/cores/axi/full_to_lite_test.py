@@ -0,0 +1,70 @@
+import unittest
+from types import SimpleNamespace
+
+from nmigen import *
+
+from naps import SimPlatform, write_to_stream, do_nothing
+from naps.soc.peripheral import Response
+from . import AxiEndpoint, AxiLitePipelinedPeripheralConnector
+from .full_to_lite import AxiFullToLiteBridge
+
+
+class BridgeWithConnector(Elaboratable):
+    def __init__(self):
+        self.axi = AxiEndpoint(addr_bits=32, data_bits=32, lite=False, id_bits=4)
+
+        def handle_read(m, addr, data, read_done_callback):
+            m.d.sync += data.eq(addr)
+            read_done_callback(Response.OK)
+
+        def handle_write(m, addr, data, write_done_callback):
+            write_done_callback(Response.OK)
+
+        peripheral = SimpleNamespace(range=lambda: range(0, 0x100), handle_read=handle_read, handle_write=handle_write)
+        self.connector = AxiLitePipelinedPeripheralConnector(peripheral)
+        self.bridge = AxiFullToLiteBridge(self.axi, max_outstanding=self.connector.max_outstanding)
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.connector = self.connector
+        m.submodules.bridge = self.bridge
+        m.d.comb += self.bridge.lite_master.connect_downstream(self.connector.axi)
+        return m
+
+
+class AxiFullToLiteBridgeTest(unittest.TestCase):
+    def check_ids_with_stalled_responses(self, write):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        dut = BridgeWithConnector()
+        axi = dut.axi
+        response = axi.write_response if write else axi.read_data
+        ids = list(range(1, 7))
+
+        def issue():
+            for id in ids:
+                if write:
+                    yield from write_to_stream(axi.write_address, payload=id * 4, id=id, timeout=1000)
+                    yield from write_to_stream(axi.write_data, payload=id, byte_strobe=0xf, last=1, timeout=1000)
+                else:
+                    yield from write_to_stream(axi.read_address, payload=id * 4, id=id, timeout=1000)
+
+        def testbench():
+            # the master holds back the responses so that the bridge and the connector fill up
+            yield from do_nothing(30)
+            yield response.ready.eq(1)
+            received = []
+            for _ in range(100):
+                yield
+                if (yield response.valid):
+                    received.append((yield response.id) if write else ((yield response.id), (yield response.payload)))
+            self.assertEqual(received, ids if write else [(id, id * 4) for id in ids])
+
+        platform.add_process(issue, "sync")
+        platform.sim(dut, testbench, traces="none")
+
+    def test_read_ids_with_stalled_responses(self):
+        self.check_ids_with_stalled_responses(write=False)
+
+    def test_write_ids_with_stalled_responses(self):
+        self.check_ids_with_stalled_responses(write=True)
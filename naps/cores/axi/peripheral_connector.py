@@ -1,9 +1,9 @@
 from nmigen import *
 
-from .axi_endpoint import AxiResponse as AxiResponse, AxiEndpoint
+from .axi_endpoint import AxiResponse as AxiResponse, AxiEndpoint, AxiBurstType
 from naps.soc.peripheral import Response as BusSlaveResponse, Peripheral
 
-__all__ = ["AxiLitePeripheralConnector"]
+__all__ = ["AxiLitePeripheralConnector", "AxiLitePipelinedPeripheralConnector", "AxiFullPeripheralConnector"]
 
 
 class AxiLitePeripheralConnector(Elaboratable):
@@ -99,3 +99,309 @@ class AxiLitePeripheralConnector(Elaboratable):
                     m.next = "IDLE"
 
         return m
+
+
+class AxiLitePipelinedPeripheralConnector(Elaboratable):
+    # the number of transactions per direction that can be in flight at the same time: one buffered request, one in
+    # the peripheral and one buffered response
+    max_outstanding = 3
+
+    def __init__(self, peripheral: Peripheral, bundle_name="axi", timeout=1000):
+        """
+        An axi lite `PeripheralConnector` that keeps multiple transactions in flight.
+        The read address, write address and write data channels are buffered independently of the peripheral access
+        and the responses are buffered as well. The master can thus issue the next request while the current one is
+        handled and its response is returned. If reads and writes are pending at the same time, they are handled
+        alternately.
+        As AXI lite has no transaction ids, this connector must be the only slave the master talks to (i.e. it should
+        not be used behind an `AxiInterconnect`).
+
+        :param peripheral: The peripheral which this controller should handle
+        :param timeout: the timeout after which an unsuccessful read attempt should fail (useful for not hanging everything)
+        """
+        assert callable(peripheral.handle_read) and callable(peripheral.handle_write)
+        self.peripheral = peripheral
+        self.timeout = timeout
+
+        self.axi = AxiEndpoint(addr_bits=32, data_bits=32, lite=True, name=bundle_name)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        address_range = self.peripheral.range()
+
+        assert address_range is not None
+        assert address_range.start < address_range.stop
+
+        def in_range(signal):
+            return (signal >= address_range.start) & (signal < address_range.stop)
+
+        # the request buffers
+        read_address_valid, read_address = Signal(), Signal.like(self.axi.read_address.payload)
+        write_address_valid, write_address = Signal(), Signal.like(self.axi.write_address.payload)
+        write_data_valid, write_data = Signal(), Signal.like(self.axi.write_data.payload)
+        take_read, take_write = Signal(), Signal()
+
+        # the response buffers
+        read_data_valid, read_data = Signal(), Signal.like(self.axi.read_data.payload)
+        read_resp = Signal.like(self.axi.read_data.resp)
+        write_response_valid, write_resp = Signal(), Signal.like(self.axi.write_response.resp)
+
+        # the transaction that is currently handled by the peripheral
+        addr = Signal.like(self.axi.read_address.payload)
+        data = Signal.like(self.axi.write_data.payload)
+        read_out = Signal.like(self.axi.read_data.payload)
+        resp_out = Signal.like(self.axi.read_data.resp)
+        last_was_write = Signal()
+
+        read_write_done = Signal()
+        timeout_counter = Signal(range(self.timeout + 1))
+
+        def read_write_done_callback(error):
+            m.d.sync += read_write_done.eq(1)
+            if error == BusSlaveResponse.ERR:
+                m.d.sync += resp_out.eq(AxiResponse.SLVERR)
+            else:
+                m.d.sync += resp_out.eq(AxiResponse.OKAY)
+
+        # the response buffers are drained first so that the fsm can refill them in the same cycle
+        with m.If(self.axi.read_data.ready):
+            m.d.sync += read_data_valid.eq(0)
+        with m.If(self.axi.write_response.ready):
+            m.d.sync += write_response_valid.eq(0)
+
+        def dispatch():
+            write_pending = write_address_valid & write_data_valid
+            with m.If(write_pending & (~read_address_valid | ~last_was_write)):
+                m.d.comb += take_write.eq(1)
+                m.d.sync += addr.eq(write_address)
+                m.d.sync += data.eq(write_data)
+                m.d.sync += last_was_write.eq(1)
+                m.d.sync += timeout_counter.eq(0)
+                m.next = "WRITE"
+            with m.Elif(read_address_valid):
+                m.d.comb += take_read.eq(1)
+                m.d.sync += addr.eq(read_address)
+                m.d.sync += last_was_write.eq(0)
+                m.d.sync += timeout_counter.eq(0)
+                m.next = "READ"
+            with m.Else():
+                m.next = "IDLE"
+
+        with m.FSM():
+            with m.State("IDLE"):
+                dispatch()
+
+            with m.State("READ"):
+                with m.If(read_write_done):
+                    # we can only finish if there is space for the response
+                    with m.If(~read_data_valid | self.axi.read_data.ready):
+                        m.d.sync += read_data_valid.eq(1)
+                        m.d.sync += read_data.eq(read_out)
+                        m.d.sync += read_resp.eq(resp_out)
+                        m.d.sync += read_write_done.eq(0)
+                        dispatch()
+                with m.Elif(timeout_counter == self.timeout):
+                    m.d.sync += read_write_done.eq(1)
+                    m.d.sync += resp_out.eq(AxiResponse.DECERR)
+                with m.Else():
+                    m.d.sync += timeout_counter.eq(timeout_counter + 1)
+                    self.peripheral.handle_read(m, addr, read_out, read_write_done_callback)
+
+            with m.State("WRITE"):
+                with m.If(read_write_done):
+                    with m.If(~write_response_valid | self.axi.write_response.ready):
+                        m.d.sync += write_response_valid.eq(1)
+                        m.d.sync += write_resp.eq(resp_out)
+                        m.d.sync += read_write_done.eq(0)
+                        dispatch()
+                with m.Elif(timeout_counter == self.timeout):
+                    m.d.sync += read_write_done.eq(1)
+                    m.d.sync += resp_out.eq(AxiResponse.DECERR)
+                with m.Else():
+                    m.d.sync += timeout_counter.eq(timeout_counter + 1)
+                    self.peripheral.handle_write(m, addr, data, read_write_done_callback)
+
+        # the request buffers accept a new request in the cycle in which the old one is taken by the fsm
+        m.d.comb += self.axi.read_address.ready.eq(
+            in_range(self.axi.read_address.payload) & (~read_address_valid | take_read)
+        )
+        with m.If(self.axi.read_address.valid & self.axi.read_address.ready):
+            m.d.sync += read_address_valid.eq(1)
+            m.d.sync += read_address.eq(self.axi.read_address.payload - address_range.start)
+        with m.Elif(take_read):
+            m.d.sync += read_address_valid.eq(0)
+
+        m.d.comb += self.axi.write_address.ready.eq(
+            in_range(self.axi.write_address.payload) & (~write_address_valid | take_write)
+        )
+        with m.If(self.axi.write_address.valid & self.axi.write_address.ready):
+            m.d.sync += write_address_valid.eq(1)
+            m.d.sync += write_address.eq(self.axi.write_address.payload - address_range.start)
+        with m.Elif(take_write):
+            m.d.sync += write_address_valid.eq(0)
+
+        # write data is only accepted for a write address that we accepted because other slaves might see it, too
+        m.d.comb += self.axi.write_data.ready.eq(write_address_valid & ~write_data_valid)
+        with m.If(self.axi.write_data.valid & self.axi.write_data.ready):
+            m.d.sync += write_data_valid.eq(1)
+            m.d.sync += write_data.eq(self.axi.write_data.payload)
+        with m.Elif(take_write):
+            m.d.sync += write_data_valid.eq(0)
+
+        # the outputs are zero when we have nothing to say so that multiple slaves can be ored together
+        m.d.comb += self.axi.read_data.valid.eq(read_data_valid)
+        with m.If(read_data_valid):
+            m.d.comb += self.axi.read_data.payload.eq(read_data)
+            m.d.comb += self.axi.read_data.resp.eq(read_resp)
+        m.d.comb += self.axi.write_response.valid.eq(write_response_valid)
+        with m.If(write_response_valid):
+            m.d.comb += self.axi.write_response.resp.eq(write_resp)
+
+        return m
+
+
+class AxiFullPeripheralConnector(Elaboratable):
+    def __init__(self, peripheral: Peripheral, id_bits=12, bundle_name="axi", timeout=1000):
+        """
+        An axi (full) `PeripheralConnector` that handles bursts. Every beat of a burst is handed to the peripheral
+        as a single access to the next address, so bursts do not have to be split into single transactions
+        upstream. FIXED bursts access the same address for every beat, WRAP bursts wrap at the boundary that is aligned
+        to the total size of the burst.
+        Byte strobes are ignored (like in the axi lite connectors).
+
+        :param peripheral: The peripheral which this controller should handle
+        :param id_bits: the number of bits of the transaction id (12 for the zynq gp masters)
+        :param timeout: the timeout after which an unsuccessful beat should fail (useful for not hanging everything)
+        """
+        assert callable(peripheral.handle_read) and callable(peripheral.handle_write)
+        self.peripheral = peripheral
+        self.timeout = timeout
+
+        self.axi = AxiEndpoint(addr_bits=32, data_bits=32, lite=False, id_bits=id_bits, name=bundle_name)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        address_range = self.peripheral.range()
+
+        assert address_range is not None
+        assert address_range.start < address_range.stop
+
+        def in_range(signal):
+            return (signal >= address_range.start) & (signal < address_range.stop)
+
+        # the burst that is currently handled
+        addr = Signal.like(self.axi.read_address.payload)
+        increment = Signal(range(self.axi.data_bytes + 1))
+        wrap_mask = Signal.like(addr)  # the address bits that change during the burst (all of them if it does not wrap)
+        beats_left = Signal.like(self.axi.read_address.burst_len)
+        burst_id = Signal.like(self.axi.read_address.id)
+        burst_error = Signal()
+
+        read_out = Signal.like(self.axi.read_data.payload)
+        resp_out = Signal.like(self.axi.read_data.resp)
+
+        # the read response buffer
+        read_data_valid, read_data = Signal(), Signal.like(self.axi.read_data.payload)
+        read_resp, read_last = Signal.like(self.axi.read_data.resp), Signal()
+        read_id = Signal.like(self.axi.read_data.id)
+
+        read_write_done = Signal()
+        timeout_counter = Signal(range(self.timeout + 1))
+
+        def read_write_done_callback(error):
+            m.d.sync += read_write_done.eq(1)
+            if error == BusSlaveResponse.ERR:
+                m.d.sync += resp_out.eq(AxiResponse.SLVERR)
+            else:
+                m.d.sync += resp_out.eq(AxiResponse.OKAY)
+
+        def start_burst(address):
+            m.d.comb += address.ready.eq(1)
+            m.d.sync += addr.eq(address.payload - address_range.start)
+            m.d.sync += beats_left.eq(address.burst_len)
+            m.d.sync += burst_id.eq(address.id)
+            m.d.sync += increment.eq(Mux(address.burst_type == AxiBurstType.FIXED, 0, 1 << address.beat_size_bytes))
+            with m.If(address.burst_type == AxiBurstType.WRAP):
+                m.d.sync += wrap_mask.eq(((address.burst_len + 1) << address.beat_size_bytes) - 1)
+            with m.Else():
+                m.d.sync += wrap_mask.eq(-1)
+            m.d.sync += burst_error.eq(0)
+            m.d.sync += timeout_counter.eq(0)
+
+        # the wrapping happens on the absolute addresses, the peripheral gets addresses relative to its start
+        absolute_addr = Signal.like(addr)
+        m.d.comb += absolute_addr.eq(addr + address_range.start)
+
+        def next_beat():
+            next_addr = (absolute_addr & ~wrap_mask) | ((absolute_addr + increment) & wrap_mask)
+            m.d.sync += addr.eq(next_addr - address_range.start)
+            m.d.sync += beats_left.eq(beats_left - 1)
+            m.d.sync += read_write_done.eq(0)
+            m.d.sync += timeout_counter.eq(0)
+
+        with m.If(self.axi.read_data.ready):
+            m.d.sync += read_data_valid.eq(0)
+
+        with m.FSM():
+            with m.State("IDLE"):
+                with m.If(self.axi.read_address.valid & in_range(self.axi.read_address.payload)):
+                    start_burst(self.axi.read_address)
+                    m.next = "READ"
+                with m.Elif(self.axi.write_address.valid & in_range(self.axi.write_address.payload)):
+                    start_burst(self.axi.write_address)
+                    m.next = "WRITE"
+
+            with m.State("READ"):
+                with m.If(read_write_done):
+                    # the beat is handed to the response buffer and the next beat is started right away
+                    with m.If(~read_data_valid | self.axi.read_data.ready):
+                        m.d.sync += read_data_valid.eq(1)
+                        m.d.sync += read_data.eq(read_out)
+                        m.d.sync += read_resp.eq(resp_out)
+                        m.d.sync += read_last.eq(beats_left == 0)
+                        m.d.sync += read_id.eq(burst_id)
+                        next_beat()
+                        with m.If(beats_left == 0):
+                            m.next = "IDLE"
+                with m.Elif(timeout_counter == self.timeout):
+                    m.d.sync += read_write_done.eq(1)
+                    m.d.sync += resp_out.eq(AxiResponse.DECERR)
+                with m.Else():
+                    m.d.sync += timeout_counter.eq(timeout_counter + 1)
+                    self.peripheral.handle_read(m, addr, read_out, read_write_done_callback)
+
+            with m.State("WRITE"):
+                with m.If(self.axi.write_data.valid):
+                    with m.If(read_write_done):
+                        m.d.comb += self.axi.write_data.ready.eq(1)
+                        with m.If(resp_out != AxiResponse.OKAY):
+                            m.d.sync += burst_error.eq(1)
+                        next_beat()
+                        with m.If(self.axi.write_data.last | (beats_left == 0)):
+                            m.next = "WRITE_RESPONSE"
+                    with m.Elif(timeout_counter == self.timeout):
+                        m.d.sync += read_write_done.eq(1)
+                        m.d.sync += resp_out.eq(AxiResponse.DECERR)
+                    with m.Else():
+                        m.d.sync += timeout_counter.eq(timeout_counter + 1)
+                        self.peripheral.handle_write(m, addr, self.axi.write_data.payload, read_write_done_callback)
+
+            with m.State("WRITE_RESPONSE"):
+                # there is only one response for the whole burst so we report if any of the beats failed
+                m.d.comb += self.axi.write_response.valid.eq(1)
+                m.d.comb += self.axi.write_response.id.eq(burst_id)
+                m.d.comb += self.axi.write_response.resp.eq(Mux(burst_error, AxiResponse.SLVERR, AxiResponse.OKAY))
+                with m.If(self.axi.write_response.ready):
+                    m.next = "IDLE"
+
+        # the read data is only driven when it is valid so that the outputs of multiple slaves can be ored together
+        m.d.comb += self.axi.read_data.valid.eq(read_data_valid)
+        with m.If(read_data_valid):
+            m.d.comb += self.axi.read_data.payload.eq(read_data)
+            m.d.comb += self.axi.read_data.resp.eq(read_resp)
+            m.d.comb += self.axi.read_data.last.eq(read_last)
+            m.d.comb += self.axi.read_data.id.eq(read_id)
+
+        return m
@@ -0,0 +1,184 @@
+import unittest
+
+from nmigen import *
+
+from naps import SimPlatform, ZynqSocPlatform, CsrBank, ControlSignal, StatusSignal, SocMemory, write_to_stream, \
+    read_from_stream
+from naps.cores.axi import axil_read, axil_write, axi_read_burst, axi_write_burst, AxiResponse, AxiBurstType
+from naps.soc.memorymap import Address
+
+base = 0x4000_0000
+
+
+class PipelinedPeripheralConnectorTest(unittest.TestCase):
+    def make_platform(self, pipelined, pipelined_decoding=False):
+        platform = ZynqSocPlatform(SimPlatform())
+        platform.pipelined_peripheral_connector = pipelined
+        if pipelined_decoding:
+            platform.pipelined_csr_read = True
+            platform.peripherals_decoder_pipeline_stages = 1
+        csr_bank = CsrBank()
+        controls = [ControlSignal(32, address=Address(i * 4, 0)) for i in range(4)]
+        statuses = [StatusSignal(32, address=Address(0x20 + i * 4, 0), reset=0x1000 + i) for i in range(4)]
+        for i, signal in enumerate(controls):
+            csr_bank.reg("control{}".format(i), signal)
+        for i, signal in enumerate(statuses):
+            csr_bank.reg("status{}".format(i), signal)
+        return platform, csr_bank, controls
+
+    def test_sequential_access(self):
+        platform, csr_bank, controls = self.make_platform(pipelined=True)
+
+        def testbench():
+            axi = platform.axi_lite_master
+            for i in range(4):
+                yield from axil_write(axi, base + i * 4, 0xabcd_0000 + i)
+                self.assertEqual((yield controls[i]), 0xabcd_0000 + i)
+            for i in range(4):
+                self.assertEqual((yield from axil_read(axi, base + i * 4)), 0xabcd_0000 + i)
+                self.assertEqual((yield from axil_read(axi, base + 0x20 + i * 4)), 0x1000 + i)
+
+            # there is nothing at 0x10
+            yield from write_to_stream(axi.read_address, payload=base + 0x10)
+            _, response = yield from read_from_stream(axi.read_data, extract=("payload", "resp"), timeout=100)
+            self.assertEqual(response, AxiResponse.SLVERR.value)
+
+        platform.sim(csr_bank, (testbench, "axi_lite"))
+
+    def run_back_to_back(self, pipelined, pipelined_decoding=False, n=32):
+        """issues n reads and n writes without waiting for the responses and returns the cycles until all are done"""
+        platform, csr_bank, controls = self.make_platform(pipelined, pipelined_decoding)
+        cycles = {}
+
+        def issue_reads():
+            axi = platform.axi_lite_master
+            for i in range(n):
+                yield from write_to_stream(axi.read_address, payload=base + 0x20 + (i % 4) * 4, timeout=100 * n)
+
+        def issue_writes():
+            axi = platform.axi_lite_master
+            for i in range(n):
+                yield from write_to_stream(axi.write_address, payload=base + (i % 4) * 4, timeout=100 * n)
+                yield from write_to_stream(axi.write_data, payload=i, byte_strobe=0xf, timeout=100 * n)
+
+        def collect(name, channel):
+            def process():
+                stream = getattr(platform.axi_lite_master, channel)
+                yield stream.ready.eq(1)
+                received = []
+                cycles[name] = 0
+                while len(received) < n:
+                    yield
+                    cycles[name] += 1
+                    self.assertLess(cycles[name], 100 * n)
+                    if (yield stream.valid):
+                        self.assertEqual((yield stream.resp), AxiResponse.OKAY.value)
+                        received.append((yield stream.payload) if name == "reads" else None)
+                if name == "reads":
+                    self.assertEqual(received, [0x1000 + (i % 4) for i in range(n)])
+                else:
+                    for i, control in enumerate(controls):
+                        self.assertEqual((yield control), n - 4 + i)
+            return process
+
+        for process in [issue_reads, issue_writes, collect("writes", "write_response")]:
+            platform.add_process(process, "axi_lite")
+        platform.sim(csr_bank, (collect("reads", "read_data"), "axi_lite"))
+        return max(cycles.values())
+
+    def test_back_to_back(self):
+        simple = self.run_back_to_back(pipelined=False)
+        pipelined = self.run_back_to_back(pipelined=True)
+        print("back to back reads and writes: {} cycles simple, {} cycles pipelined".format(
+            simple, pipelined
+        ))
+        self.assertLess(pipelined, simple)
+
+    def test_back_to_back_pipelined_decoding(self):
+        self.run_back_to_back(pipelined=True, pipelined_decoding=True)
+
+
+class AxiFullPeripheralConnectorTest(unittest.TestCase):
+    def test_memory_bursts(self):
+        platform = ZynqSocPlatform(SimPlatform())
+        platform.burst_peripheral_connector = True
+        dut = SocMemory(width=32, depth=64)
+
+        def testbench():
+            axi = platform.axi_full_master
+            yield from axi_write_burst(axi, base, [i * 3 for i in range(16)], id=5)
+            yield from axi_write_burst(axi, base + 16 * 4, [i * 7 for i in range(16)], id=6)
+            self.assertEqual((yield from axi_read_burst(axi, base + 8 * 4, 16, id=7)),
+                             [i * 3 for i in range(8, 16)] + [i * 7 for i in range(8)])
+            self.assertEqual((yield from axi_read_burst(axi, base, 1)), [0])
+
+            # wrap bursts wrap at the 16 byte boundary of a 4 beat burst
+            yield from axi_write_burst(axi, base + 0x28, [1, 2, 3, 4], burst_type=AxiBurstType.WRAP)
+            self.assertEqual((yield from axi_read_burst(axi, base + 0x20, 4)), [3, 4, 1, 2])
+            self.assertEqual((yield from axi_read_burst(axi, base + 0x2c, 4, burst_type=AxiBurstType.WRAP)), [2, 3, 4, 1])
+            self.assertEqual((yield from axi_read_burst(axi, base + 0x30, 1)), [12 * 3])  # untouched
+
+        platform.sim(dut, (testbench, "axi_lite"))
+
+    def test_csr_bursts(self):
+        platform = ZynqSocPlatform(SimPlatform())
+        platform.burst_peripheral_connector = True
+        csr_bank = CsrBank()
+        csr_bank.reg("control", ControlSignal(32, address=Address(0x0, 0)))
+        csr_bank.reg("status", StatusSignal(32, address=Address(0x4, 0), reset=0x1234))
+        csr_bank.reg("behind_hole", StatusSignal(32, address=Address(0xc, 0), reset=0x5678))
+
+        def testbench():
+            axi = platform.axi_full_master
+            # a fixed burst writes the same register for every beat
+            yield from axi_write_burst(axi, base, [1, 2, 3], burst_type=AxiBurstType.FIXED)
+            self.assertEqual((yield from axi_read_burst(axi, base, 2, burst_type=AxiBurstType.FIXED)), [3, 3])
+
+            # every beat of a read burst has its own response
+            yield from write_to_stream(axi.read_address, payload=base, burst_len=3, burst_type=AxiBurstType.INCR)
+            responses = []
+            for _ in range(4):
+                payload, resp, last = yield from read_from_stream(axi.read_data, extract=("payload", "resp", "last"))
+                responses.append((payload if resp == AxiResponse.OKAY.value else None, resp, last))
+            self.assertEqual(responses, [
+                (3, AxiResponse.OKAY.value, 0),
+                (0x1234, AxiResponse.OKAY.value, 0),
+                (None, AxiResponse.SLVERR.value, 0),
+                (0x5678, AxiResponse.OKAY.value, 1),
+            ])
+
+            # a write burst has one response for all the beats
+            yield from write_to_stream(axi.write_address, payload=base, burst_len=1, burst_type=AxiBurstType.INCR)
+            yield from write_to_stream(axi.write_data, payload=4, last=0)
+            yield from write_to_stream(axi.write_data, payload=5, last=1)
+            self.assertEqual((yield from read_from_stream(axi.write_response, extract="resp")), AxiResponse.SLVERR.value)
+            self.assertEqual((yield from axi_read_burst(axi, base, 1)), [4])
+
+        platform.sim(csr_bank, (testbench, "axi_lite"))
+
+    def test_burst_speedup(self):
+        def run(burst, n=16):
+            platform = ZynqSocPlatform(SimPlatform())
+            platform.burst_peripheral_connector = burst
+            dut = SocMemory(width=32, depth=n)
+            cycles = {}
+
+            def testbench():
+                cycles["start"] = (yield cycle_counter)
+                if burst:
+                    yield from axi_read_burst(platform.axi_full_master, base, n)
+                else:
+                    for i in range(n):
+                        yield from axil_read(platform.axi_lite_master, base + i * 4)
+                cycles["end"] = (yield cycle_counter)
+
+            cycle_counter = Signal(32)
+            m = Module()
+            m.submodules.dut = dut
+            m.d.axi_lite += cycle_counter.eq(cycle_counter + 1)
+            platform.sim(m, (testbench, "axi_lite"))
+            return cycles["end"] - cycles["start"]
+
+        single, burst = run(burst=False), run(burst=True)
+        print("16 word read: {} cycles with single transactions, {} cycles as a burst".format(single, burst))
+        self.assertLess(burst, single)
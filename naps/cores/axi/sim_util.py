@@ -1,11 +1,14 @@
-from collections import defaultdict
+from collections import deque, defaultdict
 from typing import Dict
 
-from nmigen.sim import Passive
+import numpy as np
+from nmigen.hdl.ast import SignalDict
+from nmigen.sim import Passive, Settle
 from naps import SimPlatform, write_to_stream, read_from_stream
 from .axi_endpoint import AxiEndpoint, AxiResponse, AxiBurstType
 
-__all__ = ["axil_read", "axil_write", "answer_read_burst", "answer_write_burst", "axi_ram_sim_model"]
+__all__ = ["axil_read", "axil_write", "axi_read_burst", "axi_write_burst", "answer_read_burst", "answer_write_burst", "SparseMemory", "AxiSlaveModel",
+           "axi_ram_sim_model"]
 
 
 def axil_read(axi, addr, timeout=100):
@@ -17,11 +20,42 @@ def axil_read(axi, addr, timeout=100):
 
 def axil_write(axi, addr, data, timeout=100):
     yield from write_to_stream(axi.write_address, payload=addr)
-    yield from write_to_stream(axi.write_data, payload=data)
+    yield from write_to_stream(axi.write_data, payload=data, byte_strobe=(1 << axi.data_bytes) - 1)
     response = (yield from read_from_stream(axi.write_response, extract="resp", timeout=timeout))
     assert AxiResponse.OKAY.value == response
 
 
+def axi_read_burst(axi, addr, beats, id=0, burst_type=AxiBurstType.INCR, timeout=100):
+    yield from write_to_stream(
+        axi.read_address, payload=addr, burst_len=beats - 1, burst_type=burst_type,
+        beat_size_bytes=int(np.log2(axi.data_bytes)), id=id, timeout=timeout
+    )
+    values = []
+    for i in range(beats):
+        value, response, last, read_id = \
+            yield from read_from_stream(axi.read_data, extract=("payload", "resp", "last", "id"), timeout=timeout)
+        assert AxiResponse.OKAY.value == response
+        assert read_id == id
+        assert last == (i == beats - 1)
+        values.append(value)
+    return values
+
+
+def axi_write_burst(axi, addr, data, id=0, burst_type=AxiBurstType.INCR, timeout=100):
+    yield from write_to_stream(
+        axi.write_address, payload=addr, burst_len=len(data) - 1, burst_type=burst_type,
+        beat_size_bytes=int(np.log2(axi.data_bytes)), id=id, timeout=timeout
+    )
+    for i, value in enumerate(data):
+        yield from write_to_stream(
+            axi.write_data, payload=value, byte_strobe=(1 << axi.data_bytes) - 1, last=(i == len(data) - 1), id=id,
+            timeout=timeout
+        )
+    response, write_id = yield from read_from_stream(axi.write_response, extract=("resp", "id"), timeout=timeout)
+    assert AxiResponse.OKAY.value == response
+    assert write_id == id
+
+
 def answer_read_burst(axi: AxiEndpoint, memory: Dict[int, int], timeout=100):
     addr, burst_len, burst_type, beat_size_bytes = yield from read_from_stream(axi.read_address, ("payload", "burst_len", "burst_type", "beat_size_bytes"), timeout)
     assert 2 ** beat_size_bytes == axi.data_bytes
@@ -48,29 +82,286 @@ def answer_write_burst(axi: AxiEndpoint, timeout=100):
         if byte_strobe != 0:
             memory[addr + i * axi.data_bytes] = value
             accepted += 1
-    write_to_stream(axi.write_response, resp=AxiResponse.OKAY)
+    yield from write_to_stream(axi.write_response, resp=AxiResponse.OKAY, timeout=timeout)
     print("wrote", memory)
 
     return memory, accepted
 
 
-def axi_ram_sim_model(platform: SimPlatform, domain="sync"):
-    mem = defaultdict(int)
+class SparseMemory:
+    def __init__(self, page_size=4096):
+        """A byte addressed memory that is backed by numpy pages which are only allocated once they are written to."""
+        assert page_size & (page_size - 1) == 0, "the page size must be a power of two"
+        self.page_size = page_size
+        self.pages = {}
 
-    axi_writer_port = AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12)
-    axi_reader_port = AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12)
+    def _chunks(self, addr, length):
+        while length > 0:
+            page, offset = divmod(addr, self.page_size)
+            n = min(length, self.page_size - offset)
+            yield page, offset, n
+            addr += n
+            length -= n
 
-    def writer_port_process():
-        yield Passive()
-        while True:
-            memory, accepted = yield from answer_write_burst(axi_writer_port, timeout=-1)
-            mem.update(memory)
-    platform.add_process(writer_port_process, domain)
+    def read(self, addr, length):
+        """Read length bytes as a numpy uint8 array. Memory that was never written reads as 0."""
+        result = np.zeros(length, dtype=np.uint8)
+        position = 0
+        for page, offset, n in self._chunks(addr, length):
+            if page in self.pages:
+                result[position:position + n] = self.pages[page][offset:offset + n]
+            position += n
+        return result
+
+    def write(self, addr, data, mask=None):
+        """
+        Write bytes (or anything that numpy can view as bytes) to the memory.
+        :param mask: an optional boolean array with the same length as the data; only bytes with a set mask are written
+        """
+        data = np.frombuffer(np.ascontiguousarray(data).tobytes(), dtype=np.uint8)
+        position = 0
+        for page, offset, n in self._chunks(addr, len(data)):
+            if page not in self.pages:
+                self.pages[page] = np.zeros(self.page_size, dtype=np.uint8)
+            if mask is None:
+                self.pages[page][offset:offset + n] = data[position:position + n]
+            else:
+                chunk_mask = mask[position:position + n]
+                self.pages[page][offset:offset + n][chunk_mask] = data[position:position + n][chunk_mask]
+            position += n
+
+    def read_word(self, addr, n_bytes):
+        """Read a little endian word. This is the fast path for bus aligned accesses that do not cross a page."""
+        page, offset = divmod(addr, self.page_size)
+        if offset + n_bytes <= self.page_size:
+            if page not in self.pages:
+                return 0
+            return int.from_bytes(self.pages[page][offset:offset + n_bytes].tobytes(), "little")
+        return int.from_bytes(self.read(addr, n_bytes).tobytes(), "little")
+
+    def write_word(self, addr, value, n_bytes, byte_strobe=None):
+        """Write a little endian word. byte_strobe is an int with one bit per byte like the AXI write strobe."""
+        data = value.to_bytes(n_bytes, "little")
+        if byte_strobe is None or byte_strobe == (1 << n_bytes) - 1:
+            self.write(addr, data)
+        elif byte_strobe:
+            self.write(addr, data, mask=np.array([(byte_strobe >> i) & 1 for i in range(n_bytes)], dtype=bool))
+
+
+class _Burst:
+    def __init__(self, id, addr, burst_len, burst_type, beat_size_bytes, ready_at):
+        self.id = id
+        self.addr = addr
+        self.beats = burst_len + 1
+        self.burst_type = burst_type
+        self.size = 2 ** beat_size_bytes
+        self.ready_at = ready_at
+        self.beat = 0
+
+    def beat_address(self, i):
+        if self.burst_type == AxiBurstType.FIXED.value:
+            return self.addr
+        elif self.burst_type == AxiBurstType.WRAP.value:
+            total = self.size * self.beats
+            base = self.addr - self.addr % total
+            return base + (self.addr - base + i * self.size) % total
+        else:
+            aligned = self.addr - self.addr % self.size
+            return self.addr if i == 0 else aligned + i * self.size
+
+
+class AxiSlaveModel:
+    def __init__(self, platform: SimPlatform, axi: AxiEndpoint, domain="sync", memory: SparseMemory = None,
+                 read_latency=0, write_latency=0, max_outstanding=None, beats_per_cycle=1.0):
+        """
+        Simulates an AXI3 / AXI4 (or AXI lite) slave that is backed by a SparseMemory. All five channels are served
+        from a single simulation process so that reads and writes can overlap and multiple transactions can be in
+        flight at the same time. Bursts are answered in the order in which their addresses were accepted.
+
+        :param read_latency: the number of cycles between accepting a read address and presenting the first beat
+        :param write_latency: the number of cycles between the last write beat and presenting the write response
+        :param max_outstanding: the maximum number of unfinished transactions per ID and direction
+                                (None for no limit)
+        :param beats_per_cycle: the bandwidth cap of the memory as (read + write) beats per cycle. e.g. 0.5 means
+                                that only every second cycle a beat can be transferred.
+        """
+        self.axi = axi
+        self.memory = memory if memory is not None else SparseMemory()
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.max_outstanding = max_outstanding
+        self.beats_per_cycle = beats_per_cycle
+        self.frequency = platform.clocks.get(domain, (None,))[0]
+
+        self.cycles = 0
+        self.read_bursts = 0
+        self.write_bursts = 0
+        self.read_beats = 0
+        self.write_beats = 0
+        self.max_outstanding_reads = 0
+        self.max_outstanding_writes = 0
+
+        platform.add_process(self._process, domain)
+
+    def statistics(self):
+        """The achieved bandwidth and the transaction counts of the simulation so far."""
+        cycles = max(self.cycles, 1)
+        stats = {
+            "cycles": self.cycles,
+            "read_bursts": self.read_bursts,
+            "write_bursts": self.write_bursts,
+            "read_beats": self.read_beats,
+            "write_beats": self.write_beats,
+            "read_bytes_per_cycle": self.read_beats * self.axi.data_bytes / cycles,
+            "write_bytes_per_cycle": self.write_beats * self.axi.data_bytes / cycles,
+            "max_outstanding_reads": self.max_outstanding_reads,
+            "max_outstanding_writes": self.max_outstanding_writes,
+        }
+        if self.frequency is not None:
+            stats["read_bytes_per_second"] = stats["read_bytes_per_cycle"] * self.frequency
+            stats["write_bytes_per_second"] = stats["write_bytes_per_cycle"] * self.frequency
+        return stats
+
+    def _address_fields(self, address_stream):
+        if self.axi.is_lite:
+            return [address_stream.payload]
+        return [address_stream.id, address_stream.payload, address_stream.burst_len, address_stream.burst_type,
+                address_stream.beat_size_bytes]
 
-    def reader_port_process():
+    def _read_burst(self, address_stream, ready_at):
+        fields = []
+        for signal in self._address_fields(address_stream):
+            fields.append((yield signal))
+        if self.axi.is_lite:
+            return _Burst(0, fields[0], 0, AxiBurstType.INCR.value, self.axi.data_bytes.bit_length() - 1, ready_at)
+        return _Burst(*fields, ready_at=ready_at)
+
+    def _can_accept(self, address_stream, outstanding):
+        if self.max_outstanding is None:
+            return True
+        if not (yield address_stream.valid):
+            return True
+        transaction_id = 0 if self.axi.is_lite else (yield address_stream.id)
+        return outstanding[transaction_id] < self.max_outstanding
+
+    def _process(self):
         yield Passive()
+        axi = self.axi
+        lite = axi.is_lite
+        data_bytes = axi.data_bytes
+        memory = self.memory
+
+        reads = deque()  # accepted read bursts in the order in which they are answered
+        writes = deque()  # accepted write bursts that wait for (more) data
+        responses = deque()  # (cycle at which the response can be presented, id)
+        outstanding_reads = defaultdict(int)
+        outstanding_writes = defaultdict(int)
+        credit = 0.0
+
+        ar_ready = aw_ready = w_ready = r_valid = b_valid = False
+        outputs = SignalDict()
+
+        def set_output(signal, value):
+            # only emit the statements for outputs that actually change to keep the per cycle overhead low
+            if outputs.get(signal) != value:
+                outputs[signal] = value
+                return [signal.eq(value)]
+            return []
+
         while True:
-            yield from answer_read_burst(axi_reader_port, mem, timeout=-1)
-    platform.add_process(reader_port_process, domain)
+            if self.max_outstanding is not None:
+                # we need to see the ids of the requests of this cycle before deciding if we are ready
+                yield Settle()
+            ar_ready = yield from self._can_accept(axi.read_address, outstanding_reads)
+            aw_ready = yield from self._can_accept(axi.write_address, outstanding_writes)
+            credit = min(credit + self.beats_per_cycle, max(self.beats_per_cycle, 1.0))
+
+            statements = set_output(axi.read_address.ready, ar_ready) + set_output(axi.write_address.ready, aw_ready)
+
+            if not r_valid and reads and reads[0].ready_at <= self.cycles and credit >= 1:
+                credit -= 1
+                burst = reads[0]
+                addr = burst.beat_address(burst.beat)
+                r_valid = True
+                statements.append(axi.read_data.payload.eq(memory.read_word(addr - addr % data_bytes, data_bytes)))
+                statements += set_output(axi.read_data.resp, AxiResponse.OKAY.value)
+                if not lite:
+                    statements += set_output(axi.read_data.last, burst.beat == burst.beats - 1)
+                    statements += set_output(axi.read_data.id, burst.id)
+            statements += set_output(axi.read_data.valid, r_valid)
+
+            w_ready = bool(writes) and writes[0].ready_at <= self.cycles and credit >= 1
+            statements += set_output(axi.write_data.ready, w_ready)
+
+            if not b_valid and responses and responses[0][0] <= self.cycles:
+                b_valid = True
+                if not lite:
+                    statements += set_output(axi.write_response.id, responses[0][1])
+                statements += set_output(axi.write_response.resp, AxiResponse.OKAY.value)
+            statements += set_output(axi.write_response.valid, b_valid)
+
+            for statement in statements:
+                yield statement
+            yield
+            self.cycles += 1
+
+            if ar_ready and (yield axi.read_address.valid):
+                burst = yield from self._read_burst(axi.read_address, self.cycles + self.read_latency)
+                reads.append(burst)
+                outstanding_reads[burst.id] += 1
+                self.read_bursts += 1
+                self.max_outstanding_reads = max(self.max_outstanding_reads, sum(outstanding_reads.values()))
+
+            if r_valid and (yield axi.read_data.ready):
+                r_valid = False
+                self.read_beats += 1
+                burst = reads[0]
+                burst.beat += 1
+                if burst.beat == burst.beats:
+                    reads.popleft()
+                    outstanding_reads[burst.id] -= 1
+
+            if aw_ready and (yield axi.write_address.valid):
+                burst = yield from self._read_burst(axi.write_address, self.cycles)
+                writes.append(burst)
+                outstanding_writes[burst.id] += 1
+                self.write_bursts += 1
+                self.max_outstanding_writes = max(self.max_outstanding_writes, sum(outstanding_writes.values()))
+
+            if w_ready and (yield axi.write_data.valid):
+                credit -= 1
+                self.write_beats += 1
+                burst = writes[0]
+                addr = burst.beat_address(burst.beat)
+                value = yield axi.write_data.payload
+                byte_strobe = yield axi.write_data.byte_strobe
+                memory.write_word(addr - addr % data_bytes, value, data_bytes, byte_strobe)
+                burst.beat += 1
+                last = (yield axi.write_data.last) if not lite else True
+                if burst.beat == burst.beats:
+                    assert last, "the last beat of a write burst must have last set"
+                    writes.popleft()
+                    responses.append((self.cycles + self.write_latency, burst.id))
+                else:
+                    assert not last, "last was set before the end of the write burst"
+
+            if b_valid and (yield axi.write_response.ready):
+                b_valid = False
+                _, response_id = responses.popleft()
+                outstanding_writes[response_id] -= 1
+
+
+def axi_ram_sim_model(platform: SimPlatform, domain="sync", **kwargs):
+    """
+    Creates a write and a read AXI port that share one simulated memory.
+    All keyword arguments are passed to the AxiSlaveModel of both ports.
+    """
+    memory = SparseMemory()
+
+    axi_writer_port = AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12)
+    axi_reader_port = AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12)
+
+    AxiSlaveModel(platform, axi_writer_port, domain, memory, **kwargs)
+    AxiSlaveModel(platform, axi_reader_port, domain, memory, **kwargs)
 
     return axi_writer_port, axi_reader_port
@@ -0,0 +1,110 @@
+import unittest
+
+import numpy as np
+from nmigen import *
+
+from naps import SimPlatform, BasicStream, write_to_stream, read_from_stream
+from naps.stream.sim_util import StreamSource, StreamSink
+from .axi_endpoint import AxiEndpoint, AxiBurstType
+from .sim_util import SparseMemory, AxiSlaveModel, axil_read, axil_write
+from .stream_reader import AxiReader
+from .stream_writer import AxiWriter
+
+
+class SparseMemoryTest(unittest.TestCase):
+    def test_read_write(self):
+        memory = SparseMemory(page_size=16)
+        self.assertEqual(memory.read_word(1000, 8), 0)
+        memory.write(10, np.arange(20, dtype=np.uint8))
+        self.assertEqual(list(memory.read(8, 24)), [0, 0, *range(20), 0, 0])
+        self.assertEqual(len(memory.pages), 2)
+
+        memory.write_word(16, 0x1122334455667788, 8, byte_strobe=0b0000_0101)
+        self.assertEqual(memory.read_word(16, 4), 0x09660788)
+        memory.write_word(32, 0xAABBCCDD, 4)
+        self.assertEqual(memory.read_word(32, 4), 0xAABBCCDD)
+
+
+class AxiSlaveModelTest(unittest.TestCase):
+    def write_then_read(self, words=256, **kwargs):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        m = Module()
+
+        write_axi = AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12)
+        read_axi = AxiEndpoint(addr_bits=32, data_bits=64, lite=False, id_bits=12)
+        memory = SparseMemory()
+        write_model = AxiSlaveModel(platform, write_axi, memory=memory, **kwargs)
+        AxiSlaveModel(platform, read_axi, memory=memory, **kwargs)
+
+        write_address, write_data, read_address = BasicStream(32), BasicStream(64), BasicStream(32)
+        m.submodules.writer = AxiWriter(write_address, write_data, write_axi)
+        reader = m.submodules.reader = AxiReader(read_address, read_axi)
+
+        addresses = np.arange(words) * 8
+        data = addresses * 0x1_0001
+        write_address_source = StreamSource(platform, write_address)
+        write_data_source = StreamSource(platform, write_data)
+        read_address_source = StreamSource(platform, read_address)
+        sink = StreamSink(platform, reader.output)
+
+        def testbench():
+            write_address_source.write(addresses)
+            write_data_source.write(data)
+            yield from write_data_source.wait_done()
+            while write_model.write_beats < words:
+                yield
+            self.assertEqual(memory.read_word(8 * 7, 8), 7 * 8 * 0x1_0001)
+            read_address_source.write(addresses)
+            read = yield from sink.read(words, timeout=1000)
+            np.testing.assert_array_equal(read, data)
+
+        platform.add_process(testbench, "sync")
+        platform.sim(m, traces="none")
+        return write_model.statistics()
+
+    def test_write_then_read(self):
+        stats = self.write_then_read()
+        self.assertEqual(stats["write_beats"], 256)
+        self.assertGreater(stats["write_bytes_per_cycle"], 0)
+        self.assertEqual(stats["write_bytes_per_second"], stats["write_bytes_per_cycle"] * 100e6)
+
+    def test_latency_and_bandwidth_cap(self):
+        stats = self.write_then_read(read_latency=20, write_latency=10, max_outstanding=2, beats_per_cycle=0.5)
+        self.assertLessEqual(stats["write_bytes_per_cycle"], 0.5 * 8)
+        self.assertLessEqual(stats["max_outstanding_writes"], 2)
+
+    def test_wrap_burst(self):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        axi = AxiEndpoint(addr_bits=32, data_bits=32, lite=False, id_bits=4)
+        memory = SparseMemory()
+        memory.write(0, np.arange(16, dtype=np.uint32))
+        AxiSlaveModel(platform, axi, memory=memory, read_latency=3)
+
+        def testbench():
+            yield from write_to_stream(axi.read_address, payload=8, burst_len=3, burst_type=AxiBurstType.WRAP.value,
+                                       id=5)
+            beats = []
+            for _ in range(4):
+                beats.append((yield from read_from_stream(axi.read_data, ("payload", "id", "last"))))
+            self.assertEqual(beats, [(2, 5, 0), (3, 5, 0), (0, 5, 0), (1, 5, 1)])
+
+        m = Module()
+        m.domains.sync = ClockDomain()
+        platform.sim(m, testbench, traces="none")
+
+    def test_lite(self):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        axi = AxiEndpoint(addr_bits=32, data_bits=32, lite=True)
+        model = AxiSlaveModel(platform, axi)
+
+        def testbench():
+            yield from axil_write(axi, 0x100, 0xDEADBEEF)
+            self.assertEqual((yield from axil_read(axi, 0x100)), 0xDEADBEEF)
+            self.assertEqual(model.memory.read_word(0x100, 4), 0xDEADBEEF)
+
+        m = Module()
+        m.domains.sync = ClockDomain()
+        platform.sim(m, testbench, traces="none")
@@ -83,7 +83,8 @@ class AxiReaderBurster(Elaboratable):
         with m.Else():
             with m.If(self.input.valid):
                 write_address_burst()
-                with m.If(self.output.ready):
+                # without a pending burst we must not wait for the ready of the slave (it may wait for our valid)
+                with m.If(self.output.ready | (burst_ctr == 0)):
                     m.d.comb += self.input.ready.eq(1)
                     m.d.sync += last_address.eq(self.input.payload)
                     m.d.sync += burst_start.eq(self.input.payload)
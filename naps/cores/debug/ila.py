@@ -132,31 +132,80 @@ class Ila(Elaboratable):
 
 
     @driver_method
-    def get_values(self):
+    def get_capture(self):
+        """
+        reads the whole trace in one block and decodes it into a numpy structured array with one field per probe
+        (in chronological order). probes of up to 64 bits are uint64 fields, wider probes are python ints.
+        """
+        import numpy as np
         assert (not self.running) and (not self.initial_), "ila didnt trigger yet"
-        r = list(range(self.trace_length))
-        addresses = r[self.write_ptr:] + r[:self.write_ptr]
-        for address in addresses:
-            value = self.mem[address]
-            current_offset = 0
-            current_row = []
-            for name, (size, _) in self.probes:
-                current_row.append((value >> current_offset) & (2 ** size - 1))
-                current_offset += size
-            yield current_row
+        words = np.roll(self.mem.read_words(), -self.write_ptr, axis=0)
+
+        capture = np.zeros(self.trace_length, dtype=[(name, np.uint64 if size <= 64 else object) for name, (size, _) in self.probes])
+        offset = 0
+        for name, (size, _) in self.probes:
+            first, shift = divmod(offset, 32)
+            n_words = (shift + size + 31) // 32
+            if size <= 64:
+                # a probe of up to 64 bit spans at most three words. bits above 64 fall off the uint64 and are masked anyway
+                value = words[:, first].astype(np.uint64) >> np.uint64(shift)
+                for i in range(1, n_words):
+                    value |= words[:, first + i].astype(np.uint64) << np.uint64(32 * i - shift)
+                capture[name] = value & np.uint64(2 ** size - 1)
+            else:
+                value = np.zeros(self.trace_length, dtype=object)
+                for i in range(n_words):
+                    value |= words[:, first + i].astype(object) << (32 * i)
+                capture[name] = (value >> shift) & (2 ** size - 1)
+            offset += size
+        return capture
+
+    @driver_method
+    def get_values(self):
+        for row in self.get_capture().tolist():
+            yield list(row)
 
     @driver_method
-    def write_vcd(self, path="/tmp/ila.vcd"):
+    def write_vcd(self, path=None, format="vcd"):
+        """
+        writes the capture to a waveform file. format is "vcd" or "fst" (converted with vcd2fst from gtkwave like
+        the simulation traces; this needs the naps package to be importable)
+        """
+        import numpy as np
         from pathlib import Path
-        path = Path(path)
-        print(f"writing vcd to {path.absolute()}")
+        if format not in ("vcd", "fst"):
+            raise ValueError(f"unknown trace format {format!r}, use 'vcd' or 'fst'")
+        path = Path(path if path is not None else f"/tmp/ila.{format}")
+        print(f"writing {format} to {path.absolute()}")
+        vcd_path = path if format == "vcd" else path.with_name(path.name + ".vcd")
         from vcd import VCDWriter
-        with open(path, "w") as f:
+        capture = self.get_capture()
+
+        # only the samples in which a probe changes are emitted. the changes of all probes are merged by time.
+        events = []
+        for i, (name, (size, decoder)) in enumerate(self.probes):
+            column = capture[name]
+            changes = np.flatnonzero(np.concatenate([[True], column[1:] != column[:-1]]))
+            events.append(np.stack([changes, np.full(len(changes), i)], axis=1))
+        events = np.concatenate(events)
+        events = events[np.argsort(events[:, 0], kind="stable")].tolist()
+
+        with open(vcd_path, "w") as f:
             with VCDWriter(f) as writer:
                 vcd_vars = [(writer.register_var('ila_signals', name, 'reg' if decoder is None else 'string', size=size), decoder) for name, (size, decoder) in self.probes]
                 clk = writer.register_var('ila_signals', 'clk', 'reg', size=1)
-                for timestamp, values in enumerate(self.get_values()):
+                columns = [capture[name].tolist() for name, _ in self.probes]
+                event = 0
+                for timestamp in range(self.trace_length):
                     writer.change(clk, timestamp * 2, 1)
-                    for (var, decoder), value in zip(vcd_vars, values):
+                    while event < len(events) and events[event][0] == timestamp:
+                        probe_index = events[event][1]
+                        var, decoder = vcd_vars[probe_index]
+                        value = columns[probe_index][timestamp]
                         writer.change(var, timestamp * 2, value if decoder is None else decoder.get(value, str(value)))
+                        event += 1
                     writer.change(clk, timestamp * 2 + 1, 0)
+
+        if format == "fst":
+            from naps.util.sim_trace import vcd_to_fst
+            vcd_to_fst(vcd_path, path)
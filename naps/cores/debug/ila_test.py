@@ -40,3 +40,61 @@ class IlaTest(unittest.TestCase):
 
         platform.add_sim_clock('sync', 10e6)
         platform.sim(Top())
+
+    def test_capture(self):
+        platform = SimSocPlatform(SimPlatform())
+
+        class Top(Elaboratable):
+            def __init__(self):
+                self.up_counter = StatusSignal(16)
+                self.wide_counter = StatusSignal(40, reset=2 ** 35)
+                self.huge_counter = StatusSignal(70, reset=2 ** 68)
+
+            def elaborate(self, platform):
+                m = Module()
+                m.d.sync += self.up_counter.eq(self.up_counter + 1)
+                m.d.sync += self.wide_counter.eq(self.wide_counter + 1)
+                m.d.sync += self.huge_counter.eq(self.huge_counter + 1)
+
+                add_ila(platform, trace_length=100)
+                # the probes straddle the word boundaries of the trace memory
+                probe(m, self.up_counter)
+                probe(m, self.wide_counter)
+                probe(m, self.huge_counter)
+                trigger(m, self.up_counter > 200)
+                return m
+
+        def driver(design):
+            import tempfile
+            from pathlib import Path
+            from shutil import which
+            design.ila.arm()
+            yield from do_nothing(1000)
+            capture = design.ila.get_capture()
+            assert capture.dtype.names == ("up_counter", "wide_counter", "huge_counter")
+            up = capture["up_counter"].astype(int)
+            assert list(up) == list(range(up[0], up[0] + 100)), up
+            assert list(capture["wide_counter"] - capture["up_counter"]) == [2 ** 35] * 100
+            assert list(capture["huge_counter"] - capture["up_counter"].astype(object)) == [2 ** 68] * 100
+            assert list(design.ila.get_values())[3] == [up[3], up[3] + 2 ** 35, up[3] + 2 ** 68]
+
+            with tempfile.TemporaryDirectory() as tmp:
+                design.ila.write_vcd(Path(tmp) / "ila.vcd")
+                vcd = (Path(tmp) / "ila.vcd").read_text()
+            assert "$var reg 40" in vcd and "$var reg 70" in vcd
+            assert "b{:b} ".format(up[99] + 2 ** 68) in vcd
+
+            with tempfile.TemporaryDirectory() as tmp:
+                if which("vcd2fst"):
+                    design.ila.write_vcd(Path(tmp) / "ila.fst", format="fst")
+                    assert (Path(tmp) / "ila.fst").exists() and not (Path(tmp) / "ila.fst.vcd").exists()
+                else:
+                    try:
+                        design.ila.write_vcd(Path(tmp) / "ila.fst", format="fst")
+                        assert False, "writing fst without vcd2fst should fail"
+                    except FileNotFoundError:
+                        pass
+        platform.add_driver(driver)
+
+        platform.add_sim_clock('sync', 10e6)
+        platform.sim(Top())
@@ -61,8 +61,7 @@ class ConsolePacketSource(Elaboratable):
                 break
             sleep(0.1)
         assert self.done
-        for i, word in enumerate(packet):
-            self.memory[i] = word
+        self.memory[:len(packet)] = packet
         self.packet_length = len(packet) - 1
         self.reset = not self.reset
 
@@ -116,7 +115,7 @@ class ConsolePacketSink(Elaboratable):
         if not self.packet_done:
             return None
 
-        to_return = [self.memory[i] for i in range(self.write_pointer)]
+        to_return = self.memory[:self.write_pointer].tolist()
         self.reset = not self.reset
         return to_return
 
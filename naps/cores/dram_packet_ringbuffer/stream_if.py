@@ -1,4 +1,4 @@
-from nmigen import Elaboratable, Module, Signal, Array
+from nmigen import Elaboratable, Module, Signal, Array, Const
 
 from naps.cores import AxiReader, AxiWriter, if_none_get_zynq_hp_port, StreamInfo, LastWrapper, StreamTee
 from naps import PacketizedStream, BasicStream, stream_transformer, StatusSignal
@@ -91,14 +91,26 @@ class DramPacketRingbufferStreamReader(Elaboratable):
         m.submodules.address_stream_info = StreamInfo(address_stream)
 
         address_offset = Signal.like(axi.read_address.payload)
-
-        with m.If(address_offset < writer.buffer_level_list[self.current_read_buffer]):
+        # we only ever read buffers that the writer has finished. buffers_seen is the value of writer.buffers_written
+        # when we started the current buffer, so we know when there is a new one.
+        # writers that do not count their buffers (like the DramPacketRingbufferCpuWriter of a framebuffer) are read
+        # over and over again.
+        reading = Signal()
+        if hasattr(writer, "buffers_written"):
+            buffers_seen = Signal.like(writer.buffers_written)
+            new_buffer = writer.buffers_written != buffers_seen
+        else:
+            buffers_seen = None
+            new_buffer = Const(1)
+
+        with m.If(reading & (address_offset < writer.buffer_level_list[self.current_read_buffer])):
             m.d.comb += address_stream.valid.eq(1)
             m.d.comb += address_stream.payload.eq(address_offset + writer.buffer_base_list[self.current_read_buffer])
             m.d.comb += address_stream.last.eq(address_offset + axi.data_bytes >= writer.buffer_level_list[self.current_read_buffer])
             with m.If(address_stream.ready):
                 m.d.sync += address_offset.eq(address_offset + axi.data_bytes)
-        with m.Else():
+        with m.Elif(new_buffer):
+            # start with the newest finished buffer (older ones that we did not get to are skipped)
             next_buffer = Signal.like(self.current_read_buffer)
             with m.If(writer.current_write_buffer == 0):
                 m.d.comb += next_buffer.eq(writer.n_buffers - 1)
@@ -106,6 +118,11 @@ class DramPacketRingbufferStreamReader(Elaboratable):
                 m.d.comb += next_buffer.eq(writer.current_write_buffer - 1)
             m.d.sync += self.current_read_buffer.eq(next_buffer)
             m.d.sync += address_offset.eq(0)
+            if buffers_seen is not None:
+                m.d.sync += buffers_seen.eq(writer.buffers_written)
+            m.d.sync += reading.eq(1)
+        with m.Else():
+            m.d.sync += reading.eq(0)
 
         reader = m.submodules.axi_reader = LastWrapper(address_stream, lambda i: AxiReader(i, axi=axi, axi_data_width=len(self.output.payload)), last_fifo_depth=10, last_rle_bits=32)
         m.d.comb += self.output.connect_upstream(reader.output)
@@ -25,13 +25,26 @@ class JTAGPeripheralConnector(Elaboratable):
             jtag = self.jtag
 
         address_range = self.peripheral.range()
-        state = Signal(range(10))
+        state = Signal(range(13))
 
         addr = Signal(32)
         data = Signal(32)
         status = Signal()
 
         read_write_done = Signal()
+        do_read = Signal()
+        do_write = Signal()
+
+        # burst state
+        write_burst = Signal()
+        burst_len = Signal(16)
+        remaining = Signal(17)  # the number of words that still have to be started
+        slot_bit = Signal(range(33))
+        pending = Signal()  # an access was started (it might already be done)
+        first = Signal()  # we are in the first slot of a burst
+        failed = Signal()
+        shift_out = Signal(33)
+        shift_in = Signal(32)
 
         def read_write_done_callback(error):
             m.d.sync += status.eq(error)
@@ -46,6 +59,20 @@ class JTAGPeripheralConnector(Elaboratable):
         # WRITE:
         # <0>*<1>(ADDRESS[32])<1>(DATA[32])
         #                                             <1>(STATUS_BIT[1])
+        #
+        # Bursts are signaled by setting bit 0 of the (otherwise word aligned) address. They access N = LEN + 1
+        # consecutive words (the address is incremented by 4 for every word) in fixed length slots of 33 bits.
+        # The access of a word happens while the slot before it is shifted. An OK bit of 1 means that the access
+        # finished in time and was successful. A word that did not finish in time still finishes on the bus but is
+        # reported as failed. After the first failed word (too slow or error) no further words are started and all
+        # following words are reported as failed. The first OK bit is always 1 and can be used to find the tdo latency.
+        # Shifting a 0 as the last bit of a slot aborts the burst.
+        # BURST READ:
+        # <0>*<1>(ADDRESS[32] | 1)<0>(LEN[16])<1>[33]                  <1>[33]                 ... <1>[33]
+        #                                      (0[32])<1>              (DATA_0[32])(OK_0[1])   ... (DATA_N-1[32])(OK_N-1[1])
+        # BURST WRITE:
+        # <0>*<1>(ADDRESS[32] | 1)<1>(LEN[16])(DATA_0[32])<1>  ... (DATA_N-1[32])<1>            <1>[33]
+        #                                      (0[32])<1>          (0[32])(OK_N-2[1])  (0[32])(OK_N-1[1])
         with m.FSM():
             def next_on_jtag_shift(next_state, use_tdo_shift=False):
                 with m.If(jtag.shift_tdo if use_tdo_shift else jtag.shift_tdi):
@@ -74,7 +101,11 @@ class JTAGPeripheralConnector(Elaboratable):
             with m.State("RW_CMD"):  # we receive one bit that indicates if we want to read (0) or write (1)
                 m.d.sync += data.eq(0)
                 m.d.comb += state.eq(3)
-                with m.If(jtag.tdi):
+                with m.If(addr[0]):
+                    m.d.sync += addr[0].eq(0)
+                    m.d.sync += write_burst.eq(jtag.tdi)
+                    next_on_jtag_shift("BURST_LEN0")
+                with m.Elif(jtag.tdi):
                     next_on_jtag_shift("WRITE0")
                 with m.Else():
                     next_on_jtag_shift("READ_WAIT")
@@ -86,7 +117,7 @@ class JTAGPeripheralConnector(Elaboratable):
                     m.d.comb += jtag.tdo.eq(1)
                     next_on_jtag_shift("READ0")
                 with m.Else():
-                    self.peripheral.handle_read(m, addr - address_range.start, data, read_write_done_callback)
+                    m.d.comb += do_read.eq(1)
                 with m.If(~jtag.tdi):  # we are requested to abort the waiting
                     next_on_jtag_shift("IDLE0")
             for i in range(32):
@@ -117,7 +148,7 @@ class JTAGPeripheralConnector(Elaboratable):
                     m.d.comb += jtag.tdo.eq(1)
                     next_on_jtag_shift("WRITE_STATUS")
                 with m.Else():
-                    self.peripheral.handle_write(m, addr - address_range.start, data, read_write_done_callback)
+                    m.d.comb += do_write.eq(1)
                 with m.If(~jtag.tdi):  # we are requested to abort the waiting
                     next_on_jtag_shift("IDLE0")
             with m.State("WRITE_STATUS"):
@@ -125,6 +156,85 @@ class JTAGPeripheralConnector(Elaboratable):
                 m.d.comb += jtag.tdo.eq(status)
                 next_on_jtag_shift("IDLE0")
 
+            # burst states
+            for i in range(16):
+                with m.State("BURST_LEN{}".format(i)):
+                    m.d.comb += state.eq(10)
+                    m.d.sync += burst_len[i].eq(jtag.tdi)
+                    if i < 15:
+                        next_on_jtag_shift("BURST_LEN{}".format(i + 1))
+                    else:
+                        with m.If(jtag.shift_tdi):
+                            m.d.sync += remaining.eq(Cat(burst_len[:15], jtag.tdi) + 1)
+                            m.d.sync += slot_bit.eq(0)
+                            m.d.sync += failed.eq(0)
+                            m.d.sync += first.eq(1)
+                            m.d.sync += shift_out.eq(1 << 32)
+                            with m.If(write_burst):
+                                m.d.sync += pending.eq(0)
+                                m.next = "BURST_WRITE"
+                            with m.Else():  # the first read already happens during the first slot
+                                m.d.sync += pending.eq(1)
+                                m.next = "BURST_READ"
+
+            def slot_end():
+                with m.If(jtag.shift_tdi):
+                    m.d.sync += slot_bit.eq(slot_bit + 1)
+                    with m.If(slot_bit == 32):
+                        m.d.sync += slot_bit.eq(0)
+                return jtag.shift_tdi & (slot_bit == 32)
+
+            running = pending & ~read_write_done
+
+            def start_next_access(increment_address):
+                with m.If(running | failed | (pending & status)):
+                    m.d.sync += failed.eq(1)  # we let the running access finish but do not start new ones
+                with m.Else():
+                    m.d.sync += pending.eq(1)
+                    m.d.sync += read_write_done.eq(0)
+                    with m.If(increment_address):
+                        m.d.sync += addr.eq(addr + 4)
+
+            access_ok = pending & read_write_done & ~status & ~failed
+
+            with m.State("BURST_READ"):
+                m.d.comb += state.eq(11)
+                m.d.comb += do_read.eq(running)
+                m.d.comb += jtag.tdo.eq(shift_out[0])
+                with m.If(jtag.shift_tdo):
+                    m.d.sync += shift_out.eq(shift_out >> 1)
+                with m.If(slot_end()):
+                    with m.If(~jtag.tdi | (remaining == 0)):
+                        m.next = "IDLE0"
+                    with m.Else():
+                        m.d.sync += shift_out.eq(Cat(data, access_ok))
+                        m.d.sync += remaining.eq(remaining - 1)
+                        with m.If(remaining > 1):
+                            start_next_access(increment_address=1)
+
+            with m.State("BURST_WRITE"):
+                m.d.comb += state.eq(12)
+                m.d.comb += do_write.eq(running)
+                with m.If(slot_bit == 32):
+                    m.d.comb += jtag.tdo.eq(first | access_ok)
+                with m.If(jtag.shift_tdi):
+                    m.d.sync += shift_in.eq(Cat(shift_in[1:], jtag.tdi))
+                with m.If(slot_end()):
+                    with m.If(~jtag.tdi | (remaining == 0)):
+                        m.next = "IDLE0"
+                    with m.Else():
+                        m.d.sync += remaining.eq(remaining - 1)
+                        m.d.sync += first.eq(0)
+                        start_next_access(increment_address=~first)
+                        with m.If(~running):
+                            m.d.sync += data.eq(shift_in)
+
+        # the peripheral is only instantiated once for the single and the burst states
+        with m.If(do_read):
+            self.peripheral.handle_read(m, addr - address_range.start, data, read_write_done_callback)
+        with m.If(do_write):
+            self.peripheral.handle_write(m, addr - address_range.start, data, read_write_done_callback)
+
         if self.jtag_domain != "sync":
             return DomainRenamer(self.jtag_domain)(m)
         else:
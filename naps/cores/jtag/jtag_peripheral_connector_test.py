@@ -1,6 +1,7 @@
 import unittest
 from nmigen import *
 from naps import Response, SimPlatform
+from naps.soc.platform.jtag.memory_accessor_openocd import JTAGAccessor
 from naps.vendor import JTAG
 from .jtag_peripheral_connector import JTAGPeripheralConnector
 
@@ -27,7 +28,9 @@ class DummyPeripheral(Elaboratable):
         return m
 
     def handle_read(self, m, addr, data, read_done):
-        with m.If(addr < 1024):
+        with m.If(addr == 900):  # a hole to test errors in the middle of bursts
+            read_done(Response.ERR)
+        with m.Elif(addr < 1024):
             m.d.sync += self.read_ctr.eq(self.read_ctr + 1)
             m.d.sync += self.read_port.addr.eq(addr)
             with m.If(self.read_ctr == 5):
@@ -38,7 +41,9 @@ class DummyPeripheral(Elaboratable):
             read_done(Response.ERR)
 
     def handle_write(self, m, addr, data, write_done):
-        with m.If(addr < 1024):
+        with m.If(addr == 900):
+            write_done(Response.ERR)
+        with m.Elif(addr < 1024):
             m.d.sync += self.write_ctr.eq(self.write_ctr + 1)
             m.d.sync += self.write_port.addr.eq(addr)
             with m.If(self.write_ctr == 5):
@@ -51,9 +56,7 @@ class DummyPeripheral(Elaboratable):
 
 
 class TestJTAGPeripheralConnectorFSM(unittest.TestCase):
-    def check_read_write(self, tdi_delay=0, tdo_delay=0):
-        platform = SimPlatform()
-
+    def make_dut(self, tdi_delay, tdo_delay):
         jtag_device = JTAG()
         m = Module()
         test_peripheral = m.submodules.test_peripheral = DummyPeripheral()
@@ -74,6 +77,11 @@ class TestJTAGPeripheralConnectorFSM(unittest.TestCase):
             tdo_delay_chain = [jtag_testbench.tdo] + [Signal() for _ in range(tdo_delay - 1)] + [jtag_device.tdo]
             for src, dst in zip(tdo_delay_chain[1:], tdo_delay_chain[:-1]):
                 m.d.sync += dst.eq(src)
+        return m, jtag_testbench
+
+    def check_read_write(self, tdi_delay=0, tdo_delay=0):
+        platform = SimPlatform()
+        m, jtag_testbench = self.make_dut(tdi_delay, tdo_delay)
 
         result = 0
 
@@ -181,3 +189,62 @@ class TestJTAGPeripheralConnectorFSM(unittest.TestCase):
 
     def test_read_transaction_delay(self):
         self.check_read_write(tdi_delay=10, tdo_delay=10)
+
+    def check_burst(self, tdi_delay=0, tdo_delay=0):
+        platform = SimPlatform()
+        m, jtag_testbench = self.make_dut(tdi_delay, tdo_delay)
+
+        def burst(addr, n, values=None):
+            # uses the same encoding as the driver but shifts everything in one go
+            for _ in range(10):
+                yield
+            bits = []
+            yield jtag_testbench.shift_tdi.eq(1)
+            for length, value in JTAGAccessor._burst_fields(addr, n, values):
+                for i in range(length):
+                    yield jtag_testbench.tdi.eq((value >> i) & 1)
+                    bits.append((yield jtag_testbench.tdo))
+                    yield
+            yield jtag_testbench.shift_tdi.eq(0)
+            return JTAGAccessor._parse_burst(bits, n)
+
+        def testbench():
+            values = [0x1234_0000 + i for i in range(20)]
+            _, n_ok = yield from burst(400, 20, values)
+            self.assertEqual(n_ok, 20)
+            self.assertEqual((yield from burst(400, 20)), (values, 20))
+            self.assertEqual((yield from burst(404, 1)), ([values[1]], 1))
+
+            # the words after the end of the peripheral fail
+            data, n_ok = yield from burst(1016, 4)
+            self.assertEqual((data, n_ok), ([1016, 1020], 2))
+            _, n_ok = yield from burst(1020, 3, [1, 2, 3])
+            self.assertEqual(n_ok, 1)
+
+            # no words are accessed after an error
+            _, n_ok = yield from burst(896, 3, [1, 2, 3])
+            self.assertEqual(n_ok, 1)
+            self.assertEqual((yield from burst(904, 1)), ([904], 1))
+            self.assertEqual((yield from burst(892, 4)), ([892, 1], 2))
+
+            # a burst can be aborted by shifting zeros
+            yield jtag_testbench.shift_tdi.eq(1)
+            for i in range(51 + 40):
+                yield jtag_testbench.tdi.eq(i in (1, 2))
+                yield
+            yield jtag_testbench.tdi.eq(0)
+            for _ in range(96):
+                yield
+            self.assertEqual((yield from burst(400, 2)), (values[:2], 2))
+
+        platform.add_sim_clock("sync", 100e6)
+        platform.sim(m, testbench)
+
+    def test_burst(self):
+        self.check_burst()
+
+    def test_burst_delay(self):
+        self.check_burst(tdi_delay=10, tdo_delay=10)
+
+    def test_burst_lattice_delay(self):
+        self.check_burst(tdi_delay=1, tdo_delay=0)
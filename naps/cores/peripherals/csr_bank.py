@@ -1,7 +1,11 @@
 # TODO: implement atomic access (and before think about it)
 
+from collections import defaultdict
+
 from nmigen import *
 from nmigen import Signal
+from nmigen.utils import log2_int
+
 from naps.soc import MemoryMap, Response, Peripheral
 from naps.soc.csr_types import StatusSignal, ControlSignal, EventReg, _Csr
 
@@ -9,61 +13,142 @@ __all__ = ["CsrBank"]
 
 
 class CsrBank(Elaboratable):
-    def __init__(self):
+    def __init__(self, pipelined_read=False):
+        """
+        A Peripheral that maps a number of ControlSignals, StatusSignals and EventRegs into the address space.
+        :param pipelined_read: put a register stage behind the read mux. this costs one cycle of read latency but
+                               shortens the critical path for big banks.
+        """
         self.memorymap = MemoryMap()
+        self.pipelined_read = pipelined_read
 
     def reg(self, name: str, signal: _Csr):
         assert isinstance(signal, _Csr)
         writable = not isinstance(signal, StatusSignal)
         self.memorymap.allocate(name, writable, bits=len(signal), address=signal._address, obj=signal)
 
+    def words(self):
+        """
+        Calculate which parts of which registers end up in which bus word.
+        :return: a dict of word index -> list of (row, word_range, signal_range)
+        """
+        word_bits = self.memorymap.bus_word_width
+        words = defaultdict(list)
+        for row in self.memorymap.direct_children:
+            start = row.address.address * 8 + row.address.bit_offset
+            stop = start + row.address.bit_len
+            for word in range(start // word_bits, (stop - 1) // word_bits + 1):
+                word_start = word * word_bits
+                low, high = max(start, word_start), min(stop, word_start + word_bits)
+                words[word].append((row, range(low - word_start, high - word_start), range(low - start, high - start)))
+        return dict(words)
+
     def elaborate(self, platform):
-        handled = Signal()
+        words = self.words()
+        word_bits = self.memorymap.bus_word_width
+        word_bytes = self.memorymap.bus_word_width_bytes
+        n_words = max(words.keys(), default=-1) + 1
+
+        # words that contain EventRegs are handled by the EventRegs themselves. all other words are plain registers
+        # that are read through one mux and written through one address decoder.
+        event_words = [word for word, parts in words.items() if any(isinstance(row.obj, EventReg) for row, _, _ in parts)]
+        plain_words = [word for word in words if word not in event_words]
+
+        def read_word(word):
+            # registers that share a word are packed into a single read data word
+            parts, position = [], 0
+            for row, word_range, signal_range in sorted(words[word], key=lambda part: part[1].start):
+                parts.append(Const(0, word_range.start - position))
+                parts.append(row.obj[signal_range.start:signal_range.stop])
+                position = word_range.stop
+            return Cat(*parts, Const(0, word_bits - position))
+
+        read_words = Array(read_word(word) if word in plain_words else Const(0, word_bits) for word in range(n_words))
+        readable_mask = Const(sum(1 << word for word in plain_words), max(n_words, 1))
+        writable_mask = Const(sum(
+            1 << word for word in plain_words
+            if any(isinstance(row.obj, ControlSignal) and row.writable for row, _, _ in words[word])
+        ), max(n_words, 1))
+
+        def decode(m, addr):
+            index = Signal(range(max(n_words, 2)))
+            valid = Signal()
+            m.d.comb += index.eq(addr[log2_int(word_bytes):])
+            m.d.comb += valid.eq((addr[:log2_int(word_bytes)] == 0) & (addr[log2_int(word_bytes):] < n_words))
+            return index, valid
+
+        def handle_event_word(m, word, data, done, write):
+            for row, word_range, signal_range in words[word]:
+                data_slice = data[word_range.start:word_range.stop]
+                if isinstance(row.obj, EventReg):
+                    (row.obj.handle_write if write else row.obj.handle_read)(m, data_slice, done)
+                elif write and isinstance(row.obj, ControlSignal) and row.writable:
+                    m.d.sync += row.obj[signal_range.start:signal_range.stop].eq(data_slice)
+                    done(Response.OK)
+                elif not write:
+                    m.d.sync += data_slice.eq(row.obj[signal_range.start:signal_range.stop])
+                    done(Response.OK)
 
         def handle_read(m, addr, data, read_done):
-            for iter_addr in range(0, self.memorymap.byte_len + 1, self.memorymap.bus_word_width_bytes):
-                with m.If(iter_addr == addr):
-                    for row in self.memorymap.direct_children:
-                        bits_of_word = row.address.bits_of_word(iter_addr)
-                        if bits_of_word:
-                            word_range, signal_range = bits_of_word
-                            if isinstance(row.obj, (ControlSignal, StatusSignal)):
-                                m.d.sync += data[word_range.start:word_range.stop].eq(
-                                    row.obj[signal_range.start:signal_range.stop]
-                                )
-                                read_done(Response.OK)
-                                m.d.comb += handled.eq(1)
-                            elif isinstance(row.obj, EventReg):
-                                row.obj.handle_read(m, data[word_range.start:word_range.stop], read_done)
-                                m.d.comb += handled.eq(1)
-                            else:
-                                raise NotImplementedError()
-            with m.If(~handled):
+            if n_words == 0:
                 read_done(Response.ERR)
+                return
+            index, valid = decode(m, addr)
+            readable = Signal()
+            read_data = Signal(word_bits)
+            m.d.comb += readable.eq(valid & readable_mask.bit_select(index, 1))
+            m.d.comb += read_data.eq(read_words[index])
+
+            if self.pipelined_read:
+                # the mux output is registered unconditionally; the result is used in the cycle after the first
+                # cycle in which handle_read is active. the connectors only ever call handle_read for one address
+                # in consecutive cycles.
+                active, active_last = Signal(), Signal()
+                readable_last, read_data_last = Signal(), Signal(word_bits)
+                m.d.comb += active.eq(1)
+                stage = Module()
+                stage.d.sync += active_last.eq(active)
+                stage.d.sync += readable_last.eq(readable)
+                stage.d.sync += read_data_last.eq(read_data)
+                m.submodules += stage
+                readable, read_data = active_last & readable_last, read_data_last
+
+            with m.If(readable):
+                m.d.sync += data.eq(read_data)
+                read_done(Response.OK)
+            for word in event_words:
+                with m.Elif(addr == word * word_bytes):
+                    handle_event_word(m, word, data, read_done, write=False)
+            if self.pipelined_read:
+                with m.Elif(active_last):
+                    read_done(Response.ERR)
+            else:
+                with m.Else():
+                    read_done(Response.ERR)
 
         def handle_write(m, addr, data, write_done):
-            handled = Signal()
-            for iter_addr in range(0, self.memorymap.byte_len + 1, self.memorymap.bus_word_width_bytes):
-                with m.If(iter_addr == addr):
-                    for row in self.memorymap.direct_children:
-                        bits_of_word = row.address.bits_of_word(iter_addr)
-                        if bits_of_word and row.writable:
-                            word_range, signal_range = bits_of_word
-                            if isinstance(row.obj, ControlSignal):
-                                m.d.sync += row.obj[signal_range.start:signal_range.stop].eq(
-                                    data[word_range.start:word_range.stop]
-                                )
-                                write_done(Response.OK)
-                                m.d.comb += handled.eq(1)
-                            elif isinstance(row.obj, StatusSignal):
-                                write_done(Response.OK)
-                                m.d.comb += handled.eq(1)
-                            elif isinstance(row.obj, EventReg):
-                                row.obj.handle_write(m, data[word_range.start:word_range.stop], write_done)
-                                m.d.comb += handled.eq(1)
-                            else:
-                                raise NotImplementedError()
-            with m.If(~handled):
+            if n_words == 0:
+                write_done(Response.ERR)
+                return
+            index, valid = decode(m, addr)
+            select = Signal(n_words)
+            m.d.comb += select.eq(Mux(valid, Const(1, n_words) << index, 0))
+            for word in plain_words:
+                rows = [(row, word_range, signal_range) for row, word_range, signal_range in words[word]
+                        if isinstance(row.obj, ControlSignal) and row.writable]
+                if rows:
+                    with m.If(select[word]):
+                        for row, word_range, signal_range in rows:
+                            m.d.sync += row.obj[signal_range.start:signal_range.stop].eq(
+                                data[word_range.start:word_range.stop]
+                            )
+
+            with m.If(valid & writable_mask.bit_select(index, 1)):
+                write_done(Response.OK)
+            for word in event_words:
+                with m.Elif(select[word]):
+                    handle_event_word(m, word, data, write_done, write=True)
+            with m.Else():
                 write_done(Response.ERR)
 
         m = Module()
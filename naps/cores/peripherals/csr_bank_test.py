@@ -0,0 +1,63 @@
+import unittest
+
+from naps import SimPlatform, ZynqSocPlatform, CsrBank, ControlSignal, StatusSignal, write_to_stream, read_from_stream
+from naps.cores.axi import axil_read, axil_write, AxiResponse
+from naps.soc.memorymap import Address
+
+
+def read_with_response(axi, addr):
+    yield from write_to_stream(axi.read_address, payload=addr)
+    return (yield from read_from_stream(axi.read_data, extract=("payload", "resp"), timeout=100))
+
+
+def write_with_response(axi, addr, data):
+    yield from write_to_stream(axi.write_address, payload=addr)
+    yield from write_to_stream(axi.write_data, payload=data, byte_strobe=0xf)
+    return (yield from read_from_stream(axi.write_response, extract="resp", timeout=100))
+
+
+class CsrBankTest(unittest.TestCase):
+    def check_layout(self, pipelined_read):
+        platform = ZynqSocPlatform(SimPlatform())
+        csr_bank = CsrBank(pipelined_read=pipelined_read)
+        low = ControlSignal(4, address=Address(0x0, 0))
+        high = ControlSignal(8, address=Address(0x0, 8))
+        status = StatusSignal(16, address=Address(0x4, 4), reset=0xbeef)
+        wide = ControlSignal(40, address=Address(0xc, 0))
+        for name, signal in [("low", low), ("high", high), ("status", status), ("wide", wide)]:
+            csr_bank.reg(name, signal)
+
+        def testbench():
+            axi = platform.axi_lite_master
+            base = 0x4000_0000
+
+            # registers that share a word are read and written together; unused bits read as zero
+            yield from axil_write(axi, base + 0x0, 0xffff_ffff)
+            self.assertEqual((yield low), 0xf)
+            self.assertEqual((yield high), 0xff)
+            self.assertEqual((yield from axil_read(axi, base + 0x0)), 0xff0f)
+            yield from axil_write(axi, base + 0x0, 0x0000_a005)
+            self.assertEqual((yield from axil_read(axi, base + 0x0)), 0xa005)
+
+            self.assertEqual((yield from axil_read(axi, base + 0x4)), 0xbeef << 4)
+            self.assertEqual((yield from write_with_response(axi, base + 0x4, 0)), AxiResponse.SLVERR.value)
+
+            # a register that spans two words
+            yield from axil_write(axi, base + 0xc, 0x8765_4321)
+            yield from axil_write(axi, base + 0x10, 0xab)
+            self.assertEqual((yield wide), 0xab_8765_4321)
+            self.assertEqual((yield from axil_read(axi, base + 0x10)), 0xab)
+
+            # there is nothing at 0x8
+            _, response = yield from read_with_response(axi, base + 0x8)
+            self.assertEqual(response, AxiResponse.SLVERR.value)
+            self.assertEqual((yield from write_with_response(axi, base + 0x8, 0)), AxiResponse.SLVERR.value)
+            self.assertEqual((yield from axil_read(axi, base + 0xc)), 0x8765_4321)
+
+        platform.sim(csr_bank, (testbench, "axi_lite"))
+
+    def test_layout(self):
+        self.check_layout(pipelined_read=False)
+
+    def test_layout_pipelined_read(self):
+        self.check_layout(pipelined_read=True)
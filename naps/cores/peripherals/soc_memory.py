@@ -138,6 +138,19 @@ class SocMemory(Elaboratable):
 
     @driver_method
     def __getitem__(self, item):
+        if isinstance(item, slice):
+            # slices are read as one block (which is then strided if needed)
+            r = range(*item.indices(self.depth))
+            if len(r) == 0:
+                return self.read_block(0, 0)
+            low = min(r[0], r[-1])
+            block = self.read_block(low, abs(r[-1] - r[0]) + 1)
+            return block if r.step == 1 else block[r[0] - low::r.step]
+
+        if item < 0:
+            item += self.depth
+        if not 0 <= item < self.depth:
+            raise IndexError("SocMemory index out of range")
         base_address = self.memory.address - self._memory_accessor.base + 4*item * self.split_stages
         value = 0
         for i in range(self.split_stages):
@@ -147,7 +160,86 @@ class SocMemory(Elaboratable):
 
     @driver_method
     def __setitem__(self, item, value):
+        if isinstance(item, slice):
+            r = range(*item.indices(self.depth))
+            if isinstance(value, int):
+                value = [value] * len(r)
+            assert len(value) == len(r), "cannot assign {} values to a slice of length {}".format(len(value), len(r))
+            if r.step == 1:
+                if len(r) > 0:
+                    self.write_block(r.start, value)
+            else:
+                for i, v in zip(r, value):
+                    self[i] = int(v)
+            return
+
+        if item < 0:
+            item += self.depth
+        if not 0 <= item < self.depth:
+            raise IndexError("SocMemory index out of range")
         base_address = self.memory.address - self._memory_accessor.base + 4*item * self.split_stages
         for i in range(self.split_stages):
             write = (value >> (32 * i)) & 0xFFFFFFFF
             self._memory_accessor.write(base_address + 4*i, write)
+
+    # we can not define __iter__ or __len__ here because nmigen would try to iterate over the gateware object.
+    # iterating over the memory in the driver falls back to __getitem__ (one access per entry).
+    @driver_method
+    def iter_blocks(self, block_size=1024):
+        """iterates over the whole memory in numpy arrays of block_size entries"""
+        for start in range(0, self.depth, block_size):
+            yield self.read_block(start, min(block_size, self.depth - start))
+
+    @driver_method
+    def __array__(self, dtype=None):
+        array = self.read_block()
+        return array if dtype is None else array.astype(dtype)
+
+    @driver_method
+    def read_words(self, start=0, n=None):
+        """reads n (or all remaining) consecutive entries starting at start as an (n, split_stages) array of 32 bit words"""
+        import numpy as np
+        if n is None:
+            n = self.depth - start
+        accessor = self._memory_accessor
+        base_address = self.memory.address - accessor.base + 4*start * self.split_stages
+        if hasattr(accessor, "read_block"):
+            words = accessor.read_block(base_address, n * self.split_stages)
+        else:  # accessors without block support are read word by word
+            words = np.array([accessor.read(base_address + 4*i) for i in range(n * self.split_stages)], dtype=np.uint32)
+        return words.reshape(n, self.split_stages)
+
+    @driver_method
+    def read_block(self, start=0, n=None):
+        """reads n (or all remaining) consecutive entries starting at start into a numpy array"""
+        import numpy as np
+        words = self.read_words(start, n)
+        if self.split_stages == 1:
+            return words[:, 0]
+        if self.split_stages == 2:
+            return words[:, 0].astype(np.uint64) | (words[:, 1].astype(np.uint64) << np.uint64(32))
+        # entries that are wider than 64 bit do not fit into the numpy integer types
+        values = np.zeros(len(words), dtype=object)
+        for i in range(self.split_stages):
+            values |= words[:, i].astype(object) << (32 * i)
+        return values
+
+    @driver_method
+    def write_block(self, start, values):
+        """writes the values to consecutive entries starting at start"""
+        import numpy as np
+        base_address = self.memory.address - self._memory_accessor.base + 4*start * self.split_stages
+        if self.split_stages == 1:
+            words = np.asarray(values, dtype=np.uint32)
+        elif self.split_stages == 2 and isinstance(values, np.ndarray) and values.dtype.kind in "ui":
+            values = values.astype(np.uint64)
+            words = np.stack([values & np.uint64(0xFFFFFFFF), values >> np.uint64(32)], axis=1).astype(np.uint32).ravel()
+        else:
+            words = np.array([
+                (int(value) >> (32 * i)) & 0xFFFFFFFF for value in values for i in range(self.split_stages)
+            ], dtype=np.uint32)
+        if hasattr(self._memory_accessor, "write_block"):
+            self._memory_accessor.write_block(base_address, words)
+        else:
+            for i, word in enumerate(words):
+                self._memory_accessor.write(base_address + 4*i, int(word))
@@ -1,5 +1,7 @@
 import unittest
 
+import numpy as np
+
 from naps import SimPlatform, SocMemory, axil_read, axil_write, do_nothing, SimSocPlatform
 from naps.soc.platform.zynq import ZynqSocPlatform
 
@@ -35,3 +37,77 @@ class SocMemoryTest(unittest.TestCase):
         platform.add_driver(driver)
 
         platform.sim(dut)
+
+    def check_blocks(self, width):
+        platform = SimSocPlatform(SimPlatform())
+
+        dut = SocMemory(width=width, depth=32)
+        values = [(i * 0x1234_5678_9abc_def1) % (2 ** width) for i in range(32)]
+
+        def driver(design):
+            design.write_block(4, values[4:20])
+            design[2] = values[2]
+            design[3] = values[3]
+            yield from do_nothing(10)
+            self.assertEqual(design[19], values[19])
+            self.assertEqual(design.read_block(2, 18).tolist(), values[2:20])
+            self.assertEqual(len(design.read_block()), 32)
+
+            # accessors that only implement read() and write() work, too
+            class WordAccessor:
+                def __init__(self, accessor):
+                    self.base, self.read, self.write = accessor.base, accessor.read, accessor.write
+
+            design._memory_accessor = WordAccessor(design._memory_accessor)
+            design.write_block(20, values[20:24])
+            self.assertEqual(design.read_block(18, 6).tolist(), values[18:24])
+        platform.add_driver(driver)
+
+        platform.sim(dut)
+
+    def test_blocks(self):
+        self.check_blocks(width=24)
+
+    def test_blocks_64_bit(self):
+        self.check_blocks(width=64)
+
+    def test_blocks_wide(self):
+        self.check_blocks(width=96)
+
+    def check_slices(self, width):
+        platform = SimSocPlatform(SimPlatform())
+
+        depth = 16
+        dut = SocMemory(width=width, depth=depth)
+        values = [(i * 0x1234_5678_9abc_def1) % (2 ** width) for i in range(depth)]
+
+        def driver(design):
+            design[:] = values
+            yield from do_nothing(10)
+            self.assertEqual(design[-1], values[-1])
+            self.assertEqual(design[2:7].tolist(), values[2:7])
+            self.assertEqual(design[12:3:-4].tolist(), values[12:3:-4])
+            self.assertEqual(design[5:5].tolist(), [])
+            self.assertEqual(list(design), values)  # falls back to __getitem__
+            self.assertEqual(np.asarray(design).tolist(), values)
+
+            design[1:8:3] = [1, 2, 3]
+            design[10:] = 7
+            expected = list(values)
+            expected[1:8:3] = [1, 2, 3]
+            expected[10:] = [7] * 6
+            self.assertEqual(design[:].tolist(), expected)
+            self.assertEqual([block.tolist() for block in design.iter_blocks(block_size=6)],
+                             [expected[0:6], expected[6:12], expected[12:16]])
+            with self.assertRaises(IndexError):
+                design[depth]
+        platform.add_driver(driver)
+
+        platform.sim(dut)
+
+    def test_slices(self):
+        self.check_slices(width=32)
+
+    def test_slices_wide(self):
+        self.check_slices(width=64)
+        self.check_slices(width=96)
@@ -0,0 +1,209 @@
+# a benchmark suite for the simulation throughput (simulated cycles per second) and the gateware efficiency (words per
+# cycle) of the stream cores. run with `python -m naps.cores.stream.sim_benchmark --help`
+import argparse
+import json
+import sys
+from time import perf_counter
+
+import numpy as np
+from nmigen import *
+
+from naps import SimPlatform, BasicStream, do_nothing
+from naps.stream.sim_util import StreamSource, StreamSink, always_ready, random_ready, bursty_ready
+from .debug import StreamInfo
+
+__all__ = ["PROFILES", "BENCHMARKS", "benchmark_stream_core", "run_benchmarks", "compare_to_baseline"]
+
+
+# the standard backpressure profiles as (source profile, sink profile) factories
+PROFILES = {
+    "full_throughput": lambda: (always_ready(), always_ready()),
+    "random": lambda: (random_ready(0.7, seed=0), random_ready(0.7, seed=1)),
+    "bursty": lambda: (bursty_ready(16, 4), bursty_ready(8, 8)),
+}
+
+
+class _Transformer(Elaboratable):
+    def __init__(self, input: BasicStream):
+        self.input = input
+        self.output = input.clone(name="transformer_output")
+
+    def elaborate(self, platform):
+        from naps.stream import stream_transformer
+        m = Module()
+        stream_transformer(self.input, self.output, m, latency=1)
+        with m.If(self.input.ready & self.input.valid):
+            m.d.sync += self.output.payload.eq(self.input.payload + 1)
+        return m
+
+
+def _stream_transformer(words):
+    input = BasicStream(32)
+    return _Transformer(input), {"payload": np.arange(words) & 0xFFFF_FFFF}
+
+
+def _gearbox(words):
+    from naps.cores.stream import StreamGearbox
+    input = BasicStream(24)
+    return StreamGearbox(input, 16), {"payload": np.arange(words) & 0xFF_FFFF}
+
+
+def _bit_stuffer(words):
+    from naps.cores.compression import BitStuffer, VariableWidthStream
+    input = VariableWidthStream(32)
+    widths = (np.arange(words) * 7) % 31 + 1
+    last = np.zeros(words, dtype=np.int64)
+    last[-1] = 1
+    return BitStuffer(input, 32), {"payload": (1 << widths) - 1, "current_width": widths, "last": last}
+
+
+def _image_convoluter(words):
+    from naps.cores.video import ImageConvoluter, ImageStream
+    width = 32
+    height = max(words // width, 3)
+    input = ImageStream(8)
+
+    def box_blur(x, y, image):
+        return sum(image[x + dx, y + dy] for dx in (-1, 0, 1) for dy in (-1, 0, 1)) // 9
+
+    x, y = np.meshgrid(np.arange(width), np.arange(height))
+    return ImageConvoluter(input, box_blur, width, height), {
+        "payload": ((x * y) & 0xFF).flatten(),
+        "line_last": (x == width - 1).flatten(),
+        "frame_last": ((x == width - 1) & (y == height - 1)).flatten(),
+    }
+
+
+# every benchmark is a function that gets the number of input words and returns the core and its input data
+BENCHMARKS = {
+    "stream_transformer": _stream_transformer,
+    "stream_gearbox": _gearbox,
+    "bit_stuffer": _bit_stuffer,
+    "image_convoluter": _image_convoluter,
+}
+
+
+def benchmark_stream_core(dut, input_data, profile="full_throughput", engine=None, drain_cycles=64, name="benchmark"):
+    """
+    Feed input_data into dut.input while draining dut.output and measure how fast the simulation and the core are.
+
+    The words per cycle are measured from the first input transfer to the last output transfer, so the idle cycles
+    before the data arrives and while waiting for the core to drain do not count.
+
+    :return: a dict with the simulated cycles per wall clock second and the words per cycle on both sides of the core
+    """
+    platform = SimPlatform(name)
+    platform.add_sim_clock("sync", 100e6)
+
+    m = Module()
+    m.submodules.dut = dut
+    input_info = m.submodules.input_info = StreamInfo(dut.input)
+    output_info = m.submodules.output_info = StreamInfo(dut.output)
+
+    # the cycles in which the first input word and the last output word are transferred
+    started = Signal()
+    first_input_cycle = Signal(32)
+    last_output_cycle = Signal(32)
+    with m.If(dut.input.valid & dut.input.ready & ~started):
+        m.d.sync += started.eq(1)
+        m.d.sync += first_input_cycle.eq(input_info.reference_counter)
+    with m.If(dut.output.valid & dut.output.ready):
+        m.d.sync += last_output_cycle.eq(output_info.reference_counter)
+
+    source_profile, sink_profile = PROFILES[profile]()
+    source = StreamSource(platform, dut.input, profile=source_profile)
+    StreamSink(platform, dut.output, profile=sink_profile)
+
+    counters = {}
+
+    def testbench():
+        # we only measure the time of the simulation itself and not of the elaboration (or compilation)
+        start = perf_counter()
+        source.write(input_data)
+        yield from source.wait_done()
+        yield from do_nothing(drain_cycles)
+        for name, info in [("input", input_info), ("output", output_info)]:
+            counters[name] = (yield info.successful_transactions_counter)
+        counters["simulated_cycles"] = (yield output_info.reference_counter)
+        counters["cycles"] = (yield last_output_cycle) - (yield first_input_cycle) + 1
+        counters["wall_time"] = perf_counter() - start
+
+    platform.add_process(testbench, "sync")
+    platform.sim(m, traces="none", engine=engine)
+    wall_time = counters["wall_time"]
+
+    return {
+        "cycles": counters["cycles"],
+        "wall_time": wall_time,
+        "simulated_cycles": counters["simulated_cycles"],
+        "cycles_per_second": counters["simulated_cycles"] / wall_time,
+        "input_words_per_cycle": counters["input"] / counters["cycles"],
+        "output_words_per_cycle": counters["output"] / counters["cycles"],
+    }
+
+
+def run_benchmarks(names=None, profiles=None, words=2048, engine=None):
+    results = {}
+    for name in (names or BENCHMARKS.keys()):
+        for profile in (profiles or PROFILES.keys()):
+            dut, input_data = BENCHMARKS[name](words)
+            key = "{}/{}".format(name, profile)
+            results[key] = benchmark_stream_core(dut, input_data, profile, engine, name=key.replace("/", "__"))
+    return results
+
+
+def compare_to_baseline(results, baseline, speed_tolerance=0.2, efficiency_tolerance=0.01):
+    """
+    Compare benchmark results to a stored baseline.
+
+    :param speed_tolerance: the relative loss of simulated cycles per second that is still accepted.
+                            the wall clock time is noisy so this should be rather generous.
+    :param efficiency_tolerance: the relative loss of words per cycle that is still accepted.
+    :return: a list of human readable regressions
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        reference = baseline[key]
+        checks = [("cycles_per_second", speed_tolerance), ("input_words_per_cycle", efficiency_tolerance),
+                  ("output_words_per_cycle", efficiency_tolerance)]
+        for metric, tolerance in checks:
+            if result[metric] < reference[metric] * (1 - tolerance):
+                regressions.append("{} {}: {:.4g} (baseline {:.4g})".format(key, metric, result[metric],
+                                                                            reference[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the simulation of the stream cores")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS.keys()), help="the benchmarks to run")
+    parser.add_argument("--profiles", nargs="*", choices=list(PROFILES.keys()), help="the backpressure profiles")
+    parser.add_argument("--words", type=int, default=2048, help="the number of input words per benchmark")
+    parser.add_argument("--engine", help="the simulation engine to use")
+    parser.add_argument("-o", "--output", help="write the results as json to this file")
+    parser.add_argument("-b", "--baseline", help="compare the results to this json file")
+    parser.add_argument("--speed-tolerance", type=float, default=0.2)
+    parser.add_argument("--efficiency-tolerance", type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.profiles, args.words, args.engine)
+    for key, result in results.items():
+        print("{:40} {:10.0f} cycles/s {:6.3f} in words/cycle {:6.3f} out words/cycle".format(
+            key, result["cycles_per_second"], result["input_words_per_cycle"], result["output_words_per_cycle"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.speed_tolerance, args.efficiency_tolerance)
+        for regression in regressions:
+            print("REGRESSION: {}".format(regression))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
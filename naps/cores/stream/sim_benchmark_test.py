@@ -0,0 +1,26 @@
+import unittest
+
+from .sim_benchmark import BENCHMARKS, run_benchmarks, compare_to_baseline, benchmark_stream_core
+
+
+class SimBenchmarkTest(unittest.TestCase):
+    def test_gearbox_benchmark(self):
+        results = run_benchmarks(["stream_gearbox"], ["full_throughput", "random"], words=64)
+        self.assertEqual(set(results.keys()), {"stream_gearbox/full_throughput", "stream_gearbox/random"})
+        full = results["stream_gearbox/full_throughput"]
+        # 24 bit in, 16 bit out
+        self.assertAlmostEqual(full["output_words_per_cycle"] / full["input_words_per_cycle"], 1.5)
+        self.assertGreater(full["input_words_per_cycle"], results["stream_gearbox/random"]["input_words_per_cycle"])
+
+        self.assertEqual(compare_to_baseline(results, results), [])
+        faster_baseline = {k: {**v, "output_words_per_cycle": v["output_words_per_cycle"] * 2}
+                           for k, v in results.items()}
+        self.assertEqual(len(compare_to_baseline(results, faster_baseline)), 2)
+
+    def test_idle_cycles_are_not_counted(self):
+        results = [benchmark_stream_core(*BENCHMARKS["stream_transformer"](32), drain_cycles=drain_cycles)
+                   for drain_cycles in (16, 256)]
+        self.assertEqual(results[0]["cycles"], results[1]["cycles"])
+        # the transformer takes one word per cycle and has a latency of one cycle
+        self.assertEqual(results[0]["cycles"], 33)
+        self.assertGreater(results[1]["simulated_cycles"], results[0]["simulated_cycles"])
@@ -1,37 +1,58 @@
 from random import Random
-from naps import write_to_stream, read_from_stream, do_nothing
+
+from naps import do_nothing
 
 __all__ = ["write_frame_to_stream", "read_frame_from_stream", "to_8bit_rgb", "crop"]
 
 
 def write_frame_to_stream(stream, frame, timeout=100, pause=False):
+    # this is a flattened version of write_to_stream() / wait_for() without nested generators per pixel
     random = Random(0)
     for y, line in enumerate(frame):
+        frame_last_line = y == (len(frame) - 1)
         for x, px in enumerate(line):
             if (random.random() < 0.3) and pause:
                 yield from do_nothing()
-            yield from write_to_stream(
-                stream, payload=int(px),
-                timeout=timeout,
-                line_last=(x == (len(line) - 1)),
-                frame_last=(y == (len(frame) - 1)) & (x == (len(line) - 1)),
-            )
+            line_last = x == (len(line) - 1)
+            yield stream.payload.eq(int(px))
+            yield stream.line_last.eq(line_last)
+            yield stream.frame_last.eq(frame_last_line and line_last)
+            yield stream.valid.eq(1)
+            waited = 0
+            while True:
+                yield
+                if (yield stream.ready):
+                    break
+                waited += 1
+                if timeout != -1 and waited >= timeout:
+                    raise TimeoutError("{} did not become '1' within {} cycles".format(stream.ready, timeout))
+            yield stream.valid.eq(0)
         if (random.random() < 0.3) and pause:
             yield from do_nothing()
 
 
 def read_frame_from_stream(stream, timeout=100, pause=False):
+    # this is a flattened version of read_from_stream() / wait_for() without nested generators per pixel
     random = Random(1)
     frame = [[]]
     while True:
         if (random.random() < 0.3) and pause:
+            yield stream.ready.eq(0)
             yield from do_nothing()
-        px, line_last, frame_last = (yield from read_from_stream(stream, timeout=timeout,
-                                                                 extract=("payload", "line_last", "frame_last")))
-        frame[-1].append(px)
-        if frame_last:
+        yield stream.ready.eq(1)
+        waited = 0
+        while True:
+            yield
+            if (yield stream.valid):
+                break
+            waited += 1
+            if timeout != -1 and waited >= timeout:
+                raise TimeoutError("{} did not become '1' within {} cycles".format(stream.valid, timeout))
+        frame[-1].append((yield stream.payload))
+        if (yield stream.frame_last):
+            yield stream.ready.eq(0)
             return frame
-        if line_last:
+        if (yield stream.line_last):
             frame.append([])
 
 
@@ -10,4 +10,5 @@ from .pydriver import *
 from .devicetree_overlay import *
 from .soc_platform import *
 from .platform import *
+from .build_cache import *
 from .cli import *
@@ -0,0 +1,157 @@
+# a content addressed cache for finished gateware builds. builds are keyed by a hash of the files that are handed to
+# the vendor toolchain (rtlil / verilog, constraints, build scripts) and the toolchain itself so that switching
+# between a few configurations of a design does not need a full vendor toolchain run every time.
+import hashlib
+import os
+import re
+import shutil
+from pathlib import Path
+from time import time
+
+from nmigen.build.run import BuildPlan
+
+from ..util.env import naps_getenv
+
+__all__ = ["BuildCache", "build_plan_hash"]
+
+
+_SRC_ATTRIBUTE_PATTERNS = [
+    re.compile(rb'^\s*attribute \\src "[^"]*"\n', re.MULTILINE),  # rtlil
+    re.compile(rb'\(\* src = "[^"]*" \*\)\s*'),  # verilog
+]
+
+
+def _strip_src_attributes(content: bytes):
+    # src attributes change with every unrelated edit of the python code (line numbers) but do not change the result
+    for pattern in _SRC_ATTRIBUTE_PATTERNS:
+        content = pattern.sub(b"", content)
+    return content
+
+
+def _toolchain_fingerprint(platform):
+    fingerprint = [type(platform).__name__, str(getattr(platform, "toolchain", None))]
+    for tool in getattr(platform, "required_tools", []):
+        path = shutil.which(os.environ.get(tool.upper().replace("-", "_"), tool))
+        if path is not None:
+            stat = os.stat(path)
+            fingerprint.append("{}={}@{}".format(tool, os.path.realpath(path), stat.st_mtime_ns))
+        else:
+            fingerprint.append("{}=missing".format(tool))
+    for env_var in ("_toolchain_env_var", "_deprecated_toolchain_env_var"):
+        name = getattr(platform, env_var, None)
+        if name is not None:
+            fingerprint.append("{}={}".format(name, os.environ.get(name)))
+    return "\n".join(fingerprint)
+
+
+def build_plan_hash(build_plan: BuildPlan, platform=None):
+    """A stable hash of everything that goes into the vendor toolchain for the given build plan."""
+    digest = hashlib.sha256()
+    for filename in sorted(build_plan.files):
+        content = build_plan.files[filename]
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        digest.update(filename.encode("utf-8") + b"\0")
+        digest.update(hashlib.sha256(_strip_src_attributes(content)).digest())
+    if platform is not None:
+        digest.update(_toolchain_fingerprint(platform).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _tree_size(path: Path):
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file() and not f.is_symlink())
+
+
+def _copy_tree(source, destination):
+    # hardlinks make restoring large build trees instant; the build directories are always deleted before rebuilding
+    # so nothing writes into the linked files
+    def link_or_copy(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    shutil.copytree(source, destination, symlinks=True, copy_function=link_or_copy)
+
+
+class BuildCache:
+    KEY_FILE = ".build_cache_key"
+
+    def __init__(self, path=None, max_size=None, max_entries=None):
+        """
+        Holds several finished gateware build trees and evicts the least recently used ones.
+
+        :param path: the cache directory. defaults to $NAPS_BUILD_CACHE or build/.cache
+        :param max_size: the maximum total size of the cache in bytes. defaults to $NAPS_BUILD_CACHE_SIZE or 20 GiB
+        :param max_entries: the maximum number of cached builds. defaults to $NAPS_BUILD_CACHE_ENTRIES or 8
+        """
+        self.path = Path(path if path is not None else naps_getenv("BUILD_CACHE", "build/.cache"))
+        self.max_size = max_size if max_size is not None else int(naps_getenv("BUILD_CACHE_SIZE", 20 * 1024 ** 3))
+        self.max_entries = max_entries if max_entries is not None else int(naps_getenv("BUILD_CACHE_ENTRIES", 8))
+
+    def _entry(self, key):
+        return self.path / key
+
+    def _touch(self, key):
+        os.utime(self._entry(key) / self.KEY_FILE, (time(), time()))
+
+    def restore(self, key, target_dir):
+        """Put the cached build with the given key into target_dir. Returns False if there is no such build."""
+        target_dir = Path(target_dir)
+        key_file = target_dir / self.KEY_FILE
+        if key_file.exists() and key_file.read_text() == key:
+            # the build directory already contains this build
+            if self._entry(key).exists():
+                self._touch(key)
+            return True
+
+        entry = self._entry(key)
+        if not (entry / self.KEY_FILE).exists():
+            return False
+        if target_dir.exists():
+            shutil.rmtree(target_dir)
+        target_dir.parent.mkdir(parents=True, exist_ok=True)
+        _copy_tree(entry, target_dir)
+        self._touch(key)
+        return True
+
+    def store(self, key, source_dir):
+        """Add a successfully finished build to the cache and evict old entries if the cache got too big."""
+        source_dir = Path(source_dir)
+        (source_dir / self.KEY_FILE).write_text(key)
+        entry = self._entry(key)
+        if entry.exists():
+            shutil.rmtree(entry)
+        self.path.mkdir(parents=True, exist_ok=True)
+        # we copy to a temporary directory first so that a cache entry is never seen half written
+        temporary = self.path / "{}.tmp{}".format(key, os.getpid())
+        if temporary.exists():
+            shutil.rmtree(temporary)
+        _copy_tree(source_dir, temporary)
+        try:
+            os.replace(temporary, entry)
+        except OSError:
+            # another build (e.g. of a parallel build matrix) stored the same key in the meantime
+            shutil.rmtree(temporary)
+        self._touch(key)
+        self.evict()
+
+    def entries(self):
+        """All cached builds as a list of (key, last use time, size) from the most to the least recently used."""
+        entries = []
+        if not self.path.exists():
+            return entries
+        for entry in self.path.iterdir():
+            key_file = entry / self.KEY_FILE
+            if entry.is_dir() and key_file.exists():
+                entries.append((entry.name, key_file.stat().st_mtime, _tree_size(entry)))
+        return sorted(entries, key=lambda e: e[1], reverse=True)
+
+    def evict(self):
+        total_size = 0
+        for i, (key, last_used, size) in enumerate(self.entries()):
+            total_size += size
+            # we always keep the most recently used build even if it is bigger than the whole cache
+            if i > 0 and (i >= self.max_entries or total_size > self.max_size):
+                print("evicting cached build {}".format(key))
+                shutil.rmtree(self._entry(key), ignore_errors=True)
+                total_size -= size
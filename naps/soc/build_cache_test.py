@@ -0,0 +1,61 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from nmigen.build.run import BuildPlan
+
+from .build_cache import BuildCache, build_plan_hash
+
+
+def make_plan(verilog):
+    plan = BuildPlan("top")
+    plan.add_file("top.v", verilog)
+    plan.add_file("top.xdc", "set_property PACKAGE_PIN A1 [get_ports clk]")
+    return plan
+
+
+def fake_build(directory, content):
+    directory = Path(directory)
+    directory.mkdir(parents=True)
+    (directory / "top.bit").write_bytes(content)
+
+
+class BuildCacheTest(unittest.TestCase):
+    def test_hash_ignores_src_attributes(self):
+        a = make_plan('(* src = "a.py:1" *)\nmodule top(); endmodule')
+        b = make_plan('(* src = "a.py:42" *)\nmodule top(); endmodule')
+        c = make_plan('(* src = "a.py:1" *)\nmodule top(input clk); endmodule')
+        self.assertEqual(build_plan_hash(a), build_plan_hash(b))
+        self.assertNotEqual(build_plan_hash(a), build_plan_hash(c))
+
+    def test_store_and_restore(self):
+        with TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            cache = BuildCache(tmp / "cache")
+            fake_build(tmp / "gateware", b"first")
+            cache.store("first", tmp / "gateware")
+
+            self.assertFalse(cache.restore("second", tmp / "gateware"))
+            (tmp / "gateware").rename(tmp / "old")
+            fake_build(tmp / "gateware", b"second")
+            cache.store("second", tmp / "gateware")
+
+            self.assertTrue(cache.restore("first", tmp / "gateware"))
+            self.assertEqual((tmp / "gateware" / "top.bit").read_bytes(), b"first")
+            self.assertTrue(cache.restore("second", tmp / "gateware"))
+            self.assertEqual((tmp / "gateware" / "top.bit").read_bytes(), b"second")
+
+    def test_lru_eviction(self):
+        with TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            cache = BuildCache(tmp / "cache", max_entries=2)
+            for key in ["a", "b", "c"]:
+                fake_build(tmp / key, key.encode())
+                cache.store(key, tmp / key)
+                if key == "b":
+                    cache.restore("a", tmp / "a")  # a is now used more recently than b
+            self.assertEqual(sorted(key for key, _, _ in cache.entries()), ["a", "c"])
+
+            cache = BuildCache(tmp / "cache", max_size=1)
+            cache.evict()
+            self.assertEqual([key for key, _, _ in cache.entries()], ["c"])
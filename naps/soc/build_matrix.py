@@ -0,0 +1,123 @@
+# runs the elaboration (and optionally the build) of many applet x device x soc platform combinations in parallel.
+# every target runs in its own python process because elaboration patches global state (see tracing_elaborate).
+# run with `python -m naps.soc.build_matrix --help`
+import argparse
+import os
+import subprocess
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from glob import glob
+from pathlib import Path
+from tempfile import mkdtemp
+from time import time
+
+__all__ = ["BuildTarget", "BuildResult", "discover_targets", "run_target", "run_matrix", "format_summary"]
+
+
+class BuildTarget(namedtuple("BuildTarget", ["file", "device", "soc"])):
+    @property
+    def name(self):
+        return "{}_{}_{}".format(Path(self.file).stem, self.device, self.soc)
+
+
+BuildResult = namedtuple("BuildResult", ["target", "ok", "duration", "log_file"])
+
+
+def _list_targets(file):
+    output = subprocess.check_output([sys.executable, file, "--list_targets"], stderr=subprocess.PIPE)
+    return [
+        BuildTarget(file, *line.split()[1:]) for line in output.decode("utf-8").splitlines()
+        if line.startswith("target ")
+    ]
+
+
+def discover_targets(files, jobs=None):
+    """Ask every applet file for its device x soc platform combinations."""
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+        return [target for targets in executor.map(_list_targets, files) for target in targets]
+
+
+def _new_log_dir():
+    return Path(mkdtemp(prefix="naps_matrix_logs_"))
+
+
+def run_target(target: BuildTarget, actions=("-e",), log_dir=None):
+    """Run a single target and write its output to `log_dir` (a fresh temporary directory if None)."""
+    log_dir = _new_log_dir() if log_dir is None else Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_file = log_dir / "{}.log".format(target.name)
+    command = [sys.executable, target.file, *actions, "-d", target.device, "-s", target.soc]
+    start = time()
+    with open(log_file, "w") as log:
+        log.write("running '{}'\n".format(" ".join(command)))
+        log.flush()
+        returncode = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+    return BuildResult(target, returncode == 0, time() - start, log_file)
+
+
+def run_matrix(targets, actions=("-e",), jobs=None, log_dir=None, on_result=None):
+    """
+    Run all targets with at most `jobs` of them at the same time. Builds share the content addressed build cache.
+
+    :param actions: the cli flags that are passed to every target (e.g. ("-b",) for building)
+    :param log_dir: the directory for the logs of the targets (a fresh temporary directory per run if None)
+    :param on_result: called with every BuildResult as soon as its target finished
+    :return: the BuildResults in the order of the targets
+    """
+    log_dir = _new_log_dir() if log_dir is None else log_dir
+    results = {}
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+        futures = {executor.submit(run_target, target, actions, log_dir): target for target in targets}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if on_result is not None:
+                on_result(result)
+    return [results[target] for target in targets]
+
+
+def format_summary(results, wall_time=None):
+    lines = ["{:60} {:>8} {:>10}".format("target", "status", "time")]
+    for result in sorted(results, key=lambda r: -r.duration):
+        lines.append("{:60} {:>8} {:>9.1f}s".format(result.target.name, "ok" if result.ok else "FAILED", result.duration))
+    failed = sum(not result.ok for result in results)
+    summary = "{} targets, {} failed, {:.1f}s total target time".format(
+        len(results), failed, sum(result.duration for result in results))
+    if wall_time is not None:
+        summary += ", {:.1f}s wall time".format(wall_time)
+    lines.append(summary)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="elaborate or build many applets in parallel")
+    parser.add_argument("files", nargs="*", help="the applet files (defaults to all applets in ./applets)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="the number of targets to run in parallel")
+    parser.add_argument("-b", "--build", action="store_true", help="build the gateware instead of only elaborating")
+    parser.add_argument("-d", "--device", nargs="*", help="only run targets for these devices")
+    parser.add_argument("-s", "--soc", nargs="*", help="only run targets for these soc platforms")
+    parser.add_argument("--log_dir", default=None, help="where to put the logs (defaults to a new temporary directory)")
+    args = parser.parse_args(argv)
+
+    files = args.files or sorted(f for f in glob("applets/*.py") if not f.endswith("builds_test.py"))
+    targets = [
+        target for target in discover_targets(files, args.jobs)
+        if (not args.device or target.device in args.device) and (not args.soc or target.soc in args.soc)
+    ]
+
+    log_dir = _new_log_dir() if args.log_dir is None else Path(args.log_dir)
+    print("writing logs to {}".format(log_dir))
+    start = time()
+    results = run_matrix(
+        targets, ("-b",) if args.build else ("-e",), args.jobs, log_dir,
+        on_result=lambda r: print("{} {} ({:.1f}s)".format("ok    " if r.ok else "FAILED", r.target.name, r.duration))
+    )
+    print()
+    print(format_summary(results, time() - start))
+    if not all(result.ok for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
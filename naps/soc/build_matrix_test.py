@@ -0,0 +1,41 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from time import time
+
+from .build_matrix import discover_targets, run_matrix, format_summary
+
+# a stand-in for an applet that speaks the same command line protocol as cli()
+FAKE_APPLET = dedent("""
+    import sys, time
+    if "--list_targets" in sys.argv:
+        print("target A None")
+        print("target B None")
+        print("### timing summary")
+    else:
+        device = sys.argv[sys.argv.index("-d") + 1]
+        time.sleep(0.5)
+        print("elaborating", device)
+        sys.exit(1 if device == "B" else 0)
+""")
+
+
+class BuildMatrixTest(unittest.TestCase):
+    def test_matrix(self):
+        with TemporaryDirectory() as tmp:
+            applet = Path(tmp) / "applet.py"
+            applet.write_text(FAKE_APPLET)
+
+            targets = discover_targets([str(applet)])
+            self.assertEqual([(t.device, t.soc) for t in targets], [("A", "None"), ("B", "None")])
+
+            start = time()
+            results = run_matrix(targets * 2, jobs=4, log_dir=Path(tmp) / "logs")
+            self.assertLess(time() - start, 1.5)
+
+            self.assertEqual([result.ok for result in results], [True, False, True, False])
+            self.assertIn("elaborating A", results[0].log_file.read_text())
+            summary = format_summary(results)
+            self.assertIn("applet_B_None", summary)
+            self.assertIn("4 targets, 2 failed", summary)
@@ -3,7 +3,6 @@ import inspect
 import sys
 from pathlib import Path
 from shutil import rmtree
-from textwrap import indent
 
 from nmigen import Fragment
 from nmigen.build.run import LocalBuildProducts, BuildPlan
@@ -11,49 +10,67 @@ from nmigen.build.run import LocalBuildProducts, BuildPlan
 __all__ = ["cli"]
 
 from . import FatbitstreamContext
+from .build_cache import BuildCache, build_plan_hash
+from .build_matrix import BuildTarget, run_matrix, format_summary
+from .out_of_context import OutOfContextRecorder, build_out_of_context
 from .soc_platform import soc_platform_name
+from .tracing_elaborate import fragment_get_with_elaboratable_trace
 from ..util import timer
+from ..util.profiler import current_profiler, start_profiling, profile_backends
 
 
-def fragment_repr(original: Fragment):
-    attrs_str = "\n"
-    for attr in ['ports', 'drivers', 'statements', 'attrs', 'generated', 'flatten']:
-        attrs_str += f"{attr}={repr(getattr(original, attr))},\n"
+def cli(top_class, runs_on, possible_socs=(None,), out_of_context=()):
+    """
+    The command line interface of an applet.
 
-    domains_str = "\n"
-    for name, domain in original.domains.items():
-        # TODO: this is not really sound because domains could be non local
-        domains_str += f"{name}: {domain.name}\n"
-    attrs_str += f"domains={{{indent(domains_str, '  ')}}},\n"
-
-    children_str = "\n"
-    for child, name in original.subfragments:
-        children_str += f"[{name}, {fragment_repr(child)}]\n"
-    attrs_str += f"children=[{indent(children_str, '  ')}],\n"
-
-    return f"Fragment({indent(attrs_str, '  ')})"
-
-
-def cli(top_class, runs_on, possible_socs=(None,)):
+    :param out_of_context: elaboratable classes (or their names) that are synthesized out of context and reused as
+                           netlists as long as they do not change (only for -b). can be extended with --ooc.
+    """
     parser = argparse.ArgumentParser()
     parser.add_argument('-e', '--elaborate', help='Elaborates the experiment', action="store_true")
     parser.add_argument('-b', '--build', help='builds the gateware & assembles a fatbitstream; implies -e', action="store_true")
     parser.add_argument('--force_cache', help='forces caching of the gateware even if it changed', action="store_true")
+    parser.add_argument('--no_cache', help='always run the vendor toolchain and do not use the build cache', action="store_true")
     parser.add_argument('-p', '--program', help='programs the board; programs the last build if used without -b', action="store_true")
     parser.add_argument('-r', '--run', help='run the pydriver shell after programming', action="store_true")
+    parser.add_argument('--all_targets', help='elaborate (or build with -b) all device & soc combinations in parallel', action="store_true")
+    parser.add_argument('-j', '--jobs', help='the number of parallel jobs for --all_targets', type=int, default=None)
+    parser.add_argument('--ooc', help='names of elaboratable classes to synthesize out of context (and cache as netlists)', nargs="*", default=[])
+    parser.add_argument('--list_targets', help='list all device & soc combinations', action="store_true")
+    parser.add_argument('--profile', help='write a json timing tree of the elaboration, the soc hooks and the rtlil / verilog generation to this file', default=None)
 
     platform_choices = {plat.__name__.replace("Platform", ""): plat for plat in runs_on}
     default = list(platform_choices.keys())[0] if len(platform_choices) == 1 else None
-    parser.add_argument('-d', '--device', help='specify the device to build for', choices=platform_choices.keys(), default=default, required=default is None)
+    parser.add_argument('-d', '--device', help='specify the device to build for', choices=platform_choices.keys(), default=default)
 
     default = None
     if len(possible_socs) == 1:
         default = soc_platform_name(possible_socs[0])
 
-    parser.add_argument('-s', '--soc', help='specifies the soc platform to build for', choices=list(map(soc_platform_name, possible_socs)), default=default, required=default is None)
+    parser.add_argument('-s', '--soc', help='specifies the soc platform to build for', choices=list(map(soc_platform_name, possible_socs)), default=default)
 
     args = parser.parse_args()
 
+    caller_file = Path(inspect.stack()[1].filename)
+    if args.list_targets:
+        for device in platform_choices.keys():
+            for soc in possible_socs:
+                print("target {} {}".format(device, soc_platform_name(soc)))
+        return
+    if args.all_targets:
+        targets = [
+            BuildTarget(str(caller_file), device, soc_platform_name(soc))
+            for device in platform_choices.keys() for soc in possible_socs
+        ]
+        results = run_matrix(targets, ("-b",) if args.build else ("-e",), args.jobs)
+        print(format_summary(results))
+        if not all(result.ok for result in results):
+            exit(1)
+        return
+    if args.device is None or args.soc is None:
+        parser.error("the following arguments are required: {}".format(
+            ", ".join(flag for flag, value in [("-d/--device", args.device), ("-s/--soc", args.soc)] if value is None)))
+
     hardware_platform = platform_choices[args.device]
     if args.soc != 'None':
         for soc in possible_socs:
@@ -65,12 +82,9 @@ def cli(top_class, runs_on, possible_socs=(None,)):
         platform = hardware_platform()
     top_class = top_class
 
-    caller_file = Path(inspect.stack()[1].filename)
     name = caller_file.stem
     build_dir = "build" / Path(f"{name}_{args.device}_{args.soc}")
     gateware_build_dir = build_dir / "gateware"
-    cache_key_path = build_dir / "cache_key.txt"
-    cache_key_old_path = build_dir / "cache_key_old.txt"
     fatbitstream_name = build_dir / f"{name}.zip"
 
     if not (args.program or args.build or args.elaborate or args.run):
@@ -78,53 +92,56 @@ def cli(top_class, runs_on, possible_socs=(None,)):
         parser.print_help(sys.stderr)
         exit(-1)
 
+    if args.profile is not None:
+        start_profiling()
+
     if args.elaborate or args.build:
         timer.start_task("elaboration")
-        if args.soc != 'None':
-            elaborated = platform.prepare_soc(top_class())
-        else:
-            elaborated = Fragment.get(top_class(), platform)
+        with OutOfContextRecorder([*out_of_context, *args.ooc]) as out_of_context_recorder:
+            if args.soc != 'None':
+                elaborated = platform.prepare_soc(top_class())
+            elif current_profiler() is not None:
+                # the tracing elaborate wrappers are what records the elaborate() timings
+                elaborated, _ = fragment_get_with_elaboratable_trace(top_class(), platform, name="top")
+            else:
+                elaborated = Fragment.get(top_class(), platform)
+        out_of_context_paths = out_of_context_recorder.hierarchy_paths(elaborated)
 
     timer.end_task()
 
     if args.build:
-        needs_rebuild = True
-        elaborated_repr = fragment_repr(elaborated)
-        if cache_key_path.exists():
-            old_repr = cache_key_path.read_text()
-            if args.force_cache:
-                print("not rebuilding gateware because of --force_cache")
-                needs_rebuild = False
-            else:
-                if old_repr == elaborated_repr:
-                    print("gateware build is up to date")
-                    needs_rebuild = False
-                else:
-                    print("gateware changed. rebuilding...")
+        if args.force_cache and gateware_build_dir.exists():
+            print("not rebuilding gateware because of --force_cache")
         else:
-            print("no previous build. rebuilding...")
+            timer.start_task("platform.prepare (including rtlil generation & yosys verilog generation)")
+            with profile_backends():
+                if out_of_context_paths:
+                    print("using out of context netlists for {}".format(", ".join(out_of_context_paths)))
+                    build_plan = build_out_of_context(platform, elaborated, name, out_of_context_paths)
+                else:
+                    build_plan: BuildPlan = platform.build(
+                        elaborated,
+                        name=name,
+                        do_build=False,
+                    )
+
+            build_cache = BuildCache()
+            cache_key = build_plan_hash(build_plan, platform)
+            if not args.no_cache and build_cache.restore(cache_key, gateware_build_dir):
+                print("gateware build is up to date (cache key {})".format(cache_key[:16]))
+            else:
+                print("no matching cached build. rebuilding...")
+                if gateware_build_dir.exists():
+                    rmtree(gateware_build_dir)
 
-        if needs_rebuild:
-            if gateware_build_dir.exists():
-                rmtree(gateware_build_dir)
+                # build the gateware
+                timer.start_task("vendor toolchain build")
+                build_plan.execute_local(gateware_build_dir)
 
-            timer.start_task("platform.prepare (including rtlil generation & yosys verilog generation)")
-            build_plan: BuildPlan = platform.build(
-                elaborated,
-                name=name,
-                do_build=False,
-            )
-
-            # build the gateware
-            timer.start_task("vendor toolchain build")
-            build_products = build_plan.execute_local(gateware_build_dir)
-
-            # we write the pickle file in the end also as a marking that the build was successful
-            if cache_key_path.exists():
-                cache_key_old_path.write_text(old_repr)
-            cache_key_path.write_text(elaborated_repr)
-        else:
-            build_products = LocalBuildProducts(gateware_build_dir)
+                # only successful builds end up in the cache
+                if not args.no_cache:
+                    build_cache.store(cache_key, gateware_build_dir)
+        build_products = LocalBuildProducts(gateware_build_dir)
 
         # we always rebuild the fatbitstream
         with open(fatbitstream_name, "wb") as f:
@@ -134,6 +151,11 @@ def cli(top_class, runs_on, possible_socs=(None,)):
 
     timer.end_task()
 
+    if args.profile is not None:
+        current_profiler().write_json(args.profile)
+        current_profiler().print_summary()
+        print("wrote elaboration profile to {}".format(args.profile))
+
     if args.program or args.run:
         if not args.run:
             timer.start_task("program")
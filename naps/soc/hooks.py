@@ -1,8 +1,7 @@
-from functools import reduce
 from textwrap import indent
+from types import FunctionType
 
 from nmigen import *
-from nmigen.hdl.ast import SignalSet
 
 from .csr_types import _Csr, ControlSignal, StatusSignal, EventReg
 from .memorymap import MemoryMap
@@ -11,33 +10,76 @@ from .tracing_elaborate import ElaboratableSames
 from ..util.py_serialize import is_py_serializable
 
 
+def _is_interesting_member(name, value):
+    return isinstance(value, (_Csr, DriverItem)) or (not name.startswith("_") and is_py_serializable(value))
+
+
+_class_members_cache = {}
+
+
+def _class_members(cls):
+    """
+    Splits the class attributes into the ones that are interesting on their own and the descriptors (e.g. properties)
+    that have to be evaluated for every instance. methods are never interesting and are skipped.
+    """
+    if cls not in _class_members_cache:
+        static, dynamic = {}, []
+        for name in dir(cls):
+            owner = next((klass for klass in cls.__mro__ if name in klass.__dict__), None)
+            if owner is object:
+                continue
+            raw = owner.__dict__[name] if owner is not None else getattr(cls, name)
+            if isinstance(raw, (FunctionType, staticmethod, classmethod)):
+                continue
+            elif hasattr(raw, "__get__"):
+                dynamic.append(name)
+            else:
+                value = getattr(cls, name)
+                if _is_interesting_member(name, value):
+                    static[name] = value
+        _class_members_cache[cls] = static, dynamic
+    return _class_members_cache[cls]
+
+
+def _members(obj):
+    """The attributes of obj that can hold csrs or driver items as (name, value) tuples in the order of dir(obj)."""
+    static, dynamic = _class_members(type(obj))
+    instance_dict = getattr(obj, "__dict__", {})
+    members = {name: value for name, value in static.items() if name not in instance_dict}
+    members.update((name, value) for name, value in instance_dict.items() if _is_interesting_member(name, value))
+    for name in dynamic:
+        value = getattr(obj, name)
+        if _is_interesting_member(name, value):
+            members[name] = value
+    return sorted(members.items(), key=lambda member: member[0])
+
+
 def csr_and_driver_item_hook(platform, top_fragment: Fragment, sames: ElaboratableSames):
     from naps.cores.peripherals.csr_bank import CsrBank
-    already_done = []
+    already_done = set()  # the ids of all the signals that are already placed in some csr bank
 
     def inner(fragment):
         elaboratable = sames.get_elaboratable(fragment)
         if elaboratable:
-            class_members = [(s, getattr(elaboratable, s)) for s in dir(elaboratable)]
+            class_members = _members(elaboratable)
             csr_signals = [(name, member) for name, member in class_members if isinstance(member, _Csr)]
-            fragment_signals = reduce(lambda a, b: a | b, fragment.drivers.values(), SignalSet())
-            csr_signals += [
-                (signal.name, signal) for signal in fragment_signals
-                if isinstance(signal, _Csr)
-                   and signal.name != "$signal"
-                   and not any(signal is cmp_signal for name, cmp_signal in csr_signals)
-            ]
-
-            new_csr_signals = [(name, signal) for name, signal in csr_signals if not any(signal is done for done in already_done)]
-            old_csr_signals = [(name, signal) for name, signal in csr_signals if any(signal is done for done in already_done)]
+            seen = {id(signal) for name, signal in csr_signals}
+            for signals in fragment.drivers.values():
+                for signal in signals:
+                    if isinstance(signal, _Csr) and signal.name != "$signal" and id(signal) not in seen:
+                        seen.add(id(signal))
+                        csr_signals.append((signal.name, signal))
+
+            new_csr_signals = [(name, signal) for name, signal in csr_signals if id(signal) not in already_done]
+            old_csr_signals = [(name, signal) for name, signal in csr_signals if id(signal) in already_done]
             for name, signal in new_csr_signals:
-                already_done.append(signal)
+                already_done.add(id(signal))
 
             mmap = fragment.memorymap = MemoryMap()
 
             if new_csr_signals:
                 m = Module()
-                csr_bank = m.submodules.csr_bank = CsrBank()
+                csr_bank = m.submodules.csr_bank = CsrBank(pipelined_read=platform.pipelined_csr_read)
                 for name, signal in new_csr_signals:
                     if isinstance(signal, (ControlSignal, StatusSignal, EventReg)):
                         csr_bank.reg(name, signal)
@@ -49,15 +91,10 @@ def csr_and_driver_item_hook(platform, top_fragment: Fragment, sames: Elaboratab
             for name, signal in old_csr_signals:
                 mmap.add_alias(name, signal)
 
-            driver_items = [
-                (name, getattr(elaboratable, name))
-                for name in dir(elaboratable)
-                if isinstance(getattr(elaboratable, name), DriverItem)
-            ]
+            driver_items = [(name, member) for name, member in class_members if isinstance(member, DriverItem)]
             driver_items += [
-                (name, DriverData(getattr(elaboratable, name)))
-                for name in dir(elaboratable)
-                if is_py_serializable(getattr(elaboratable, name)) and not name.startswith("_")
+                (name, DriverData(member)) for name, member in class_members
+                if is_py_serializable(member) and not name.startswith("_")
             ]
             for name, driver_item in driver_items:
                 fragment.memorymap.add_driver_item(name, driver_item)
@@ -94,6 +131,7 @@ def address_assignment_hook(platform, top_fragment: Fragment, sames: Elaboratabl
 
     assert platform.base_address is not None
     top_memorymap.place_at = platform.base_address
+    top_memorymap.freeze()
 
     print("memorymap:\n" + "\n".join(
         "    {}: {!r}".format(".".join(k), v) for k, v in top_memorymap.flattened.items()))
@@ -133,13 +171,12 @@ def peripherals_collect_hook(platform, top_fragment: Fragment, sames: Elaboratab
     ranges = [(peripheral.range(), peripheral) for peripheral in platform.peripherals
               if not peripheral.memorymap.is_empty and not peripheral.memorymap.was_inlined]
 
-    def range_overlapping(x, y):
-        if x.start == x.stop or y.start == y.stop:
-            return False
-        return ((x.start < y.stop and x.stop > y.start) or
-                (x.stop > y.start and y.stop > x.start))
-
-    for a, peripheral_a in ranges:
-        for b, peripheral_b in ranges:
-            if a is not b and range_overlapping(a, b):
-                raise AssertionError("{!r} overlaps with {!r}".format(peripheral_a, peripheral_b))
+    # sweep over the ranges sorted by their start; a range overlaps with an earlier one iff it starts before the end
+    # of the earlier range that reaches the furthest
+    ranges = sorted(((r, peripheral) for r, peripheral in ranges if r.start != r.stop), key=lambda x: (x[0].start, x[0].stop))
+    furthest = None
+    for r, peripheral in ranges:
+        if furthest is not None and r.start < furthest[0].stop:
+            raise AssertionError("{!r} overlaps with {!r}".format(furthest[1], peripheral))
+        if furthest is None or r.stop > furthest[0].stop:
+            furthest = (r, peripheral)
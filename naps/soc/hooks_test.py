@@ -0,0 +1,73 @@
+import unittest
+from types import SimpleNamespace
+
+from nmigen import *
+
+from .csr_types import ControlSignal, StatusSignal, _Csr
+from .hooks import _members, peripherals_collect_hook
+from .pydriver.driver_items import driver_method, DriverItem
+from ..util.py_serialize import is_py_serializable
+
+
+class Base(Elaboratable):
+    class_constant = 42
+    _private_constant = 1
+
+    def __init__(self):
+        self.control = ControlSignal(8)
+        self._status = StatusSignal(8)
+        self.data = [1, 2, 3]
+        self.not_serializable = Signal()
+
+    @property
+    def derived(self):
+        return self.class_constant + 1
+
+    @driver_method
+    def do_something(self):
+        pass
+
+    @driver_method
+    def __getitem__(self, item):
+        pass
+
+    def elaborate(self, platform):
+        return Module()
+
+
+class Derived(Base):
+    class_constant = 43
+
+
+class MembersTest(unittest.TestCase):
+    def test_same_as_dir(self):
+        for obj in [Base(), Derived()]:
+            # this is what the hook used to look at
+            expected = [
+                (name, getattr(obj, name)) for name in dir(obj)
+                if isinstance(getattr(obj, name), (_Csr, DriverItem))
+                or (is_py_serializable(getattr(obj, name)) and not name.startswith("_"))
+            ]
+            self.assertEqual(_members(obj), expected)
+            self.assertEqual([name for name, value in _members(obj)],
+                             ["__getitem__", "_status", "class_constant", "control", "data", "derived", "do_something"])
+        self.assertEqual(dict(_members(Derived()))["derived"], 44)
+
+
+class PeripheralOverlapTest(unittest.TestCase):
+    def collect(self, *ranges):
+        def peripheral(r):
+            memorymap = SimpleNamespace(is_empty=False, was_inlined=False)
+            return SimpleNamespace(range=lambda: r, memorymap=memorymap)
+        modules = {i: SimpleNamespace(peripheral=peripheral(r)) for i, r in enumerate(ranges)}
+        fragments = [SimpleNamespace(subfragments=[], i=i) for i in modules]
+        top = SimpleNamespace(subfragments=[(f, None) for f in fragments], i=None)
+        sames = SimpleNamespace(get_module=lambda fragment: modules.get(fragment.i))
+        peripherals_collect_hook(SimpleNamespace(), top, sames)
+
+    def test_overlap(self):
+        self.collect(range(0, 4), range(8, 16), range(4, 8), range(16, 16), range(32, 64))
+        with self.assertRaises(AssertionError):
+            self.collect(range(0, 4), range(8, 16), range(12, 13))
+        with self.assertRaises(AssertionError):
+            self.collect(range(0, 32), range(8, 16), range(20, 24))
@@ -1,6 +1,7 @@
 # TODO: add tests (a lot of them)
 
 import re
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
 from math import ceil
 from typing import List
@@ -9,7 +10,7 @@ from nmigen._unused import MustUse
 
 from .pydriver.driver_items import DriverItem
 
-__all__ = ["Address", "MemoryMap"]
+__all__ = ["Address", "MemoryMap", "MemoryMapIndex"]
 
 
 class Address:
@@ -67,10 +68,10 @@ class Address:
     def collides(self, other_address):
         if (self.bit_len is None) or (other_address.bit_len is None):
             raise ValueError("collision detection is impossible with addresses that dont have a length specified")
-        self_start = self.address * 8
+        self_start = self.address * 8 + self.bit_offset
         self_stop = self_start + self.bit_len
 
-        other_start = other_address.address * 8
+        other_start = other_address.address * 8 + other_address.bit_offset
         other_stop = other_start + other_address.bit_len
 
         if self_start <= other_start:
@@ -119,6 +120,9 @@ class Address:
         """
         return range(self.address, self.address + ceil((self.bit_offset + self.bit_len) / 8))
 
+    def copy(self):
+        return Address(self.address, self.bit_offset, self.bit_len, self.bus_word_width)
+
 
 @dataclass
 class MemoryMapRow:
@@ -153,6 +157,19 @@ class MemoryMap(MustUse):
         self.frozen = False
         self._MustUse__warning = UnusedMemoryMap
 
+        # bookkeeping to make the lookups O(1) instead of linear scans over the entries
+        self._subranges: List[MemoryMapRow] = []
+        self._direct_children: List[MemoryMapRow] = []
+        self._rows_by_name = {}
+        self._rows_by_obj_id = {}
+        self._real_size = 0
+        self._direct_children_real_size = 0
+        # the (collision detection) bit ranges of all entries sorted by their start
+        self._interval_starts = []
+        self._interval_stops = []
+        # only present on frozen toplevel memorymaps
+        self._index = None
+
     def __repr__(self):
         return "<Memorymap top={} byte_len={} at {}>".format(self.is_top, self.byte_len, hex(id(self)))
 
@@ -178,7 +195,9 @@ class MemoryMap(MustUse):
         if self.is_top:
             return ()
         elif self._parent is not None:
-            my_row: MemoryMapRow = next(row for row in self._parent.subranges if row.obj == self)
+            my_row: MemoryMapRow = self._parent._rows_by_obj_id.get(id(self))
+            if my_row is None:
+                raise ValueError("self was inlined into its parent and therefore has no own path")
             return (*self._parent.path, my_row.name)
         else:
             raise ValueError("self is not the toplevel memorymap and is not assigned to one")
@@ -193,11 +212,15 @@ class MemoryMap(MustUse):
 
     @property
     def subranges(self):
-        return [row for row in self.entries if isinstance(row.obj, MemoryMap)]
+        return list(self._subranges)
 
     @property
     def direct_children(self):
-        return [row for row in self.entries if not isinstance(row.obj, MemoryMap)]
+        return list(self._direct_children)
+
+    def _round_to_words(self, real_size):
+        # automatically round up to the next word with self.access_with
+        return int(ceil(real_size / self.bus_word_width_bytes) * self.bus_word_width_bytes)
 
     @property
     def byte_len(self) -> int:
@@ -205,14 +228,7 @@ class MemoryMap(MustUse):
         Calculate the size (based on the resource with the highest address part) of the memorymap
         :return: the size of the memorymap in bytes (aligned to the bus word width)
         """
-        if not self.entries:
-            return 0
-        real_size = max(
-            row.address.address + ceil((row.address.bit_offset + row.address.bit_len) / 8)
-            for row in self.entries
-        )
-        # automatically round up to the next word with self.access_with
-        return int(ceil(real_size / self.bus_word_width_bytes) * self.bus_word_width_bytes)
+        return self._round_to_words(self._real_size)
 
     @property
     def direct_children_byte_len(self):
@@ -220,14 +236,7 @@ class MemoryMap(MustUse):
         Calculate the size (based on the _normal_ resource with the highest address part) of the memorymap
         :return: the size of the memorymap in bytes (aligned to the bus word width)
         """
-        if not self.direct_children:
-            return 0
-        real_size = max(
-            row.address.address + ceil((row.address.bit_offset + row.address.bit_len) / 8)
-            for row in self.direct_children
-        )
-        # automatically round up to the next word with self.access_with
-        return int(ceil(real_size / self.bus_word_width_bytes) * self.bus_word_width_bytes)
+        return self._round_to_words(self._direct_children_real_size)
 
     @property
     def absolute_range_of_direct_children(self):
@@ -243,9 +252,13 @@ class MemoryMap(MustUse):
             if self._parent and self._inlined_offset:
                 return self._parent.own_offset.translate(self._inlined_offset)
             elif self._parent:
-                own_row_candidates = [row for row in self._parent.subranges if row.obj == self]
-                assert len(own_row_candidates) == 1
-                return self._parent.own_offset.translate(own_row_candidates[0].address)
+                top = self.top_memorymap
+                indexed = top._index.offset_of(self) if top._index is not None else None
+                if indexed is not None:
+                    return indexed
+                own_row = self._parent._rows_by_obj_id.get(id(self))
+                assert own_row is not None
+                return self._parent.own_offset.translate(own_row.address)
             else:
                 raise ValueError("the location of the memorymap cant be determined. "
                                  "self is not the toplevel memorymap and is not assigned to one")
@@ -261,9 +274,19 @@ class MemoryMap(MustUse):
         :param check_address: the address to check.
         :return: A boolean indicating if the address is free
         """
-        for row in self.entries:
-            if check_address.collides(row.address):
-                return False
+        if not self.entries:
+            return True
+        if check_address.bit_len is None:
+            raise ValueError("collision detection is impossible with addresses that dont have a length specified")
+        # the entries never collide with each other so their sorted bit ranges do not overlap and we only need to
+        # look at the neighbours of the checked range
+        start = check_address.address * 8 + check_address.bit_offset
+        stop = start + check_address.bit_len
+        i = bisect_right(self._interval_starts, start)
+        if i > 0 and self._interval_stops[i - 1] > start:
+            return False
+        if i < len(self._interval_starts) and self._interval_starts[i] < stop:
+            return False
         return True
 
     def allocate(self, name, writable, bits=None, address=None, obj=None):
@@ -278,7 +301,7 @@ class MemoryMap(MustUse):
         :return: the address of the resource
         """
         assert not self.frozen
-        assert not any(row.name == name for row in self.entries), name
+        assert name not in self._rows_by_name, name
         assert bits is not None or address is not None
         if address:
             assert ((bits is None) or (
@@ -290,7 +313,23 @@ class MemoryMap(MustUse):
         assert address.bit_len
         if not self.is_free(address):
             raise ValueError("address {!r} is not free".format(address, bits))
-        self.entries.append(MemoryMapRow(name, address, writable, obj))
+        row = MemoryMapRow(name, address, writable, obj)
+        self.entries.append(row)
+
+        self._rows_by_name[name] = row
+        self._rows_by_obj_id.setdefault(id(obj), row)
+        self._rows_by_obj_id[id(row)] = row
+        real_size = address.address + ceil((address.bit_offset + address.bit_len) / 8)
+        self._real_size = max(self._real_size, real_size)
+        if isinstance(obj, MemoryMap):
+            self._subranges.append(row)
+        else:
+            self._direct_children.append(row)
+            self._direct_children_real_size = max(self._direct_children_real_size, real_size)
+        start = address.address * 8 + address.bit_offset
+        i = bisect_left(self._interval_starts, start)
+        self._interval_starts.insert(i, start)
+        self._interval_stops.insert(i, start + address.bit_len)
         return address
 
     def add_alias(self, name, obj):
@@ -334,6 +373,24 @@ class MemoryMap(MustUse):
         else:  # add the memorymap as a regular resource. this is later interpreted as hierarchical memorymaps
             return self.allocate(name, True, bits=subrange.byte_len * 8, address=place_at, obj=subrange._added_to(self))
 
+    def freeze(self):
+        """
+        Freeze the toplevel memorymap after all resources were allocated and the location was set.
+        This precomputes the absolute addresses of all resources so that lookups take constant time.
+        """
+        assert self.is_top
+        self.frozen = True
+        self._index = MemoryMapIndex(self)
+        return self._index
+
+    @property
+    def index(self):
+        """The MemoryMapIndex of the (frozen) toplevel memorymap"""
+        top = self.top_memorymap
+        if top._index is None:
+            raise ValueError("the toplevel memorymap needs to be frozen before it can be indexed")
+        return top._index
+
     def find_recursive(self, obj, go_up=False):
         """
         Searches recursively for the given object and returns the associated address.
@@ -345,10 +402,13 @@ class MemoryMap(MustUse):
 
         if go_up:
             return self.top_memorymap.find_recursive(obj, go_up=False)
+        if self._index is not None:
+            return self._index.find(obj)
 
-        for row in self.direct_children:
-            if row.obj is obj or row is obj:
-                return self.own_offset.translate(row.address)
+        # memorymaps are never direct children so a subrange row can not be a match
+        row = self._rows_by_obj_id.get(id(obj))
+        if row is not None and not isinstance(row.obj, MemoryMap):
+            return self.own_offset.translate(row.address)
 
         for row in self.subranges:
             sub_result = row.obj.find_recursive(obj)
@@ -360,13 +420,100 @@ class MemoryMap(MustUse):
     @property
     def flattened(self):
         to_return = {}
-        for row in self.direct_children:
-            to_return[(*self.path, row.name)] = self.find_recursive(row, go_up=True)
-        for name, obj in self.aliases.items():
-            to_return[(*self.path, name)] = self.find_recursive(obj, go_up=True)
-        for name, method in self.driver_items.items():
-            to_return[(*self.path, name)] = method
-        for row in self.subranges:
-            to_return.update(row.obj.flattened)
-
+        top = self.top_memorymap
+        index = top._index
+
+        def find(obj):
+            nonlocal index
+            if index is None:
+                index = MemoryMapIndex(top)
+            return index.find(obj)
+
+        # a single walk over the hierarchy in which the offsets are passed down instead of being looked up again
+        def visit(mmap, path, offset):
+            for row in mmap._direct_children:
+                to_return[(*path, row.name)] = offset.translate(row.address)
+            for name, obj in mmap.aliases.items():
+                to_return[(*path, name)] = find(obj)
+            for name, method in mmap.driver_items.items():
+                to_return[(*path, name)] = method
+            for row in mmap._subranges:
+                visit(row.obj, (*path, row.name), offset.translate(row.address))
+
+        visit(self, self.path, self.own_offset)
         return to_return
+
+
+class MemoryMapIndex:
+    def __init__(self, top: MemoryMap):
+        """
+        The absolute addresses of all the resources of a toplevel memorymap. Allows to look up resources by object,
+        by path or by address.
+        :param top: the toplevel memorymap. it must not be changed after the index was built.
+        """
+        self.top = top
+        self._by_obj_id = {}  # id(obj) -> (obj, absolute address)
+        self._by_path = {}  # path -> (row, absolute address)
+        self._offsets = {}  # id(memorymap) -> (memorymap, own offset)
+
+        intervals = []
+
+        # the visiting order is the same as the search order of MemoryMap.find_recursive() so that objects that are
+        # present more than once resolve to the same address
+        def visit(mmap, path, offset):
+            self._offsets[id(mmap)] = (mmap, offset)
+            for row in mmap._direct_children:
+                address = offset.translate(row.address)
+                self._by_obj_id.setdefault(id(row.obj), (row.obj, address))
+                self._by_obj_id.setdefault(id(row), (row, address))
+                self._by_path[(*path, row.name)] = (row, address)
+                start = address.address * 8 + address.bit_offset
+                intervals.append((start, start + address.bit_len, (*path, row.name)))
+            for row in mmap._subranges:
+                visit(row.obj, (*path, row.name), offset.translate(row.address))
+
+        visit(top, (), top.own_offset)
+        intervals.sort()
+        self._interval_starts = [start for start, stop, path in intervals]
+        self._interval_stops = [stop for start, stop, path in intervals]
+        self._interval_paths = [path for start, stop, path in intervals]
+
+    def find(self, obj):
+        """The absolute address of the given object (or MemoryMapRow) or None if it is not part of the memorymap"""
+        entry = self._by_obj_id.get(id(obj))
+        return entry[1].copy() if entry is not None else None
+
+    def offset_of(self, memorymap: MemoryMap):
+        """The absolute address of a (non inlined) sub memorymap or None if it is not part of the memorymap"""
+        entry = self._offsets.get(id(memorymap))
+        return entry[1].copy() if entry is not None else None
+
+    def address_of(self, path):
+        """The absolute address of the resource with the given path (a tuple of names or a dotted string)"""
+        if isinstance(path, str):
+            path = tuple(path.split("."))
+        return self._by_path[tuple(path)][1].copy()
+
+    def row_of(self, path):
+        if isinstance(path, str):
+            path = tuple(path.split("."))
+        return self._by_path[tuple(path)][0]
+
+    def at(self, address, byte_len=1):
+        """
+        The paths of all resources that (partially) occupy the given byte range ordered by their address.
+        :param address: the absolute byte address
+        :param byte_len: the length of the range in bytes
+        """
+        start = address * 8
+        stop = start + byte_len * 8
+        # resources do not overlap, so the stops are sorted as well
+        i = bisect_right(self._interval_stops, start)
+        found = []
+        while i < len(self._interval_starts) and self._interval_starts[i] < stop:
+            found.append(self._interval_paths[i])
+            i += 1
+        return found
+
+    def __len__(self):
+        return len(self._by_path)
@@ -0,0 +1,87 @@
+import unittest
+from time import time
+
+from nmigen import *
+
+from .memorymap import Address, MemoryMap
+
+
+def build_hierarchy():
+    top = MemoryMap(top=True)
+    signals = {name: Signal(bits, name=name) for name, bits in [("a", 8), ("b", 32), ("c", 3), ("d", 16), ("e", 1)]}
+
+    leaf = MemoryMap()
+    leaf.allocate("a", writable=True, bits=8, obj=signals["a"])
+    leaf.allocate("b", writable=False, bits=32, obj=signals["b"])
+
+    inlined = MemoryMap()
+    inlined.allocate("c", writable=True, bits=3, obj=signals["c"])
+
+    middle = MemoryMap()
+    middle.allocate("d", writable=True, bits=16, obj=signals["d"])
+    middle.allocate_subrange(inlined, name=None)
+    middle.allocate_subrange(leaf, name="leaf")
+    middle.add_alias("alias_of_a", signals["a"])
+
+    top.allocate("e", writable=True, bits=1, obj=signals["e"])
+    top.allocate_subrange(middle, name="middle")
+    top.place_at = Address(0x4000_0000, 0, 0)
+    return top, middle, leaf, inlined, signals
+
+
+class MemoryMapTest(unittest.TestCase):
+    def test_addresses(self):
+        top, middle, leaf, inlined, signals = build_hierarchy()
+        unfrozen = {k: repr(v) for k, v in top.flattened.items()}
+        self.assertEqual(unfrozen, {
+            ("e",): "0x40000000[0:1]",
+            ("middle", "d"): "0x40000004[0:16]",
+            ("middle", "c"): "0x40000008[0:3]",
+            ("middle", "alias_of_a"): "0x4000000C[0:8]",
+            ("middle", "leaf", "a"): "0x4000000C[0:8]",
+            ("middle", "leaf", "b"): "0x40000010[0:32]",
+        })
+        self.assertEqual(leaf.path, ("middle", "leaf"))
+        self.assertEqual(leaf.own_offset.address, 0x4000000C)
+        self.assertEqual(inlined.own_offset.address, 0x40000008)
+
+        index = top.freeze()
+        self.assertEqual({k: repr(v) for k, v in top.flattened.items()}, unfrozen)
+        self.assertEqual({k: repr(v) for k, v in middle.flattened.items()},
+                         {k: v for k, v in unfrozen.items() if k[0] == "middle"})
+        self.assertEqual(leaf.own_offset.address, 0x4000000C)
+        self.assertEqual(inlined.own_offset.address, 0x40000008)
+        for signal in signals.values():
+            self.assertEqual(repr(top.find_recursive(signal)), repr(leaf.find_recursive(signal, go_up=True)))
+        self.assertIsNone(top.find_recursive(Signal()))
+
+        self.assertEqual(index.address_of("middle.leaf.b").address, 0x40000010)
+        self.assertEqual(index.at(0x40000010), [("middle", "leaf", "b")])
+        self.assertEqual(index.at(0x40000001), [])
+        self.assertEqual(index.at(0x40000004, 12), [("middle", "d"), ("middle", "c"), ("middle", "leaf", "a")])
+
+    def test_collisions(self):
+        mmap = MemoryMap()
+        mmap.allocate("a", writable=True, address=Address(0x8, 0, 32))
+        mmap.allocate("b", writable=True, address=Address(0x0, 0, 8))
+        self.assertFalse(mmap.is_free(Address(0x4, 0, 64)))
+        self.assertFalse(mmap.is_free(Address(0x0, 0, 1)))
+        self.assertTrue(mmap.is_free(Address(0x4, 0, 32)))
+        self.assertTrue(mmap.is_free(Address(0xC, 0, 32)))
+        with self.assertRaises(ValueError):
+            mmap.allocate("c", writable=True, address=Address(0x8, 0, 8))
+        self.assertEqual(mmap.byte_len, 0xC)
+
+    def test_many_registers(self):
+        start = time()
+        top = MemoryMap(top=True)
+        for i in range(200):
+            mmap = MemoryMap()
+            for j in range(50):
+                mmap.allocate("reg{}".format(j), writable=True, bits=32, obj=Signal(32))
+                mmap.add_alias("alias{}".format(j), mmap.entries[0].obj)
+            top.allocate_subrange(mmap, name="map{}".format(i))
+        top.place_at = Address(0, 0, 0)
+        top.freeze()
+        self.assertEqual(len(top.flattened), 200 * 100)
+        self.assertLess(time() - start, 5)
@@ -0,0 +1,204 @@
+# an opt in flow that synthesizes selected parts of a design out of context (as separate netlists) and reuses these
+# netlists as long as the rtl of the part does not change. the top level design then only contains black boxes for
+# these parts which are linked against the cached netlists by the vendor toolchain. this makes the edit-build-test
+# cycle scale with the size of the change rather than with the size of the design.
+# currently only the xilinx vivado toolchain is supported.
+import hashlib
+import re
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+
+from nmigen import *
+from nmigen._toolchain.yosys import find_yosys
+from nmigen.back import rtlil
+from nmigen.build.run import BuildPlan
+
+from .build_cache import BuildCache, _strip_src_attributes, _toolchain_fingerprint
+from ..util.env import naps_getenv
+
+__all__ = ["OutOfContextRecorder", "hierarchy_modules", "split_out_of_context", "build_out_of_context"]
+
+
+def _all_subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _all_subclasses(subclass)
+
+
+class OutOfContextRecorder:
+    def __init__(self, classes):
+        """
+        Records the fragments that the given elaboratable classes elaborate to while the recorder is active.
+
+        :param classes: elaboratable classes or their names
+        """
+        names = {cls for cls in classes if isinstance(cls, str)}
+        self.classes = {cls for cls in classes if not isinstance(cls, str)}
+        self.classes |= {cls for cls in _all_subclasses(Elaboratable) if cls.__name__ in names}
+        unknown = names - {cls.__name__ for cls in self.classes}
+        if unknown:
+            raise ValueError("unknown elaboratable classes for out of context synthesis: {}".format(", ".join(unknown)))
+        self.fragments = []
+        self._originals = {}
+
+    def _record(self, obj):
+        if isinstance(obj, Fragment):
+            self.fragments.append(obj)
+            return obj
+
+        real_elaborate = obj.elaborate
+
+        def elaborate(platform):
+            return self._record(real_elaborate(platform))
+        obj.elaborate = elaborate
+        return obj
+
+    def __enter__(self):
+        for cls in self.classes:
+            original = cls.elaborate
+            self._originals[cls] = cls.__dict__.get("elaborate")
+
+            def generate_wrapper(original):
+                def elaborate(elaboratable, platform):
+                    return self._record(original(elaboratable, platform))
+                return elaborate
+            cls.elaborate = generate_wrapper(original)
+        return self
+
+    def __exit__(self, *args):
+        for cls, original in self._originals.items():
+            if original is None:
+                del cls.elaborate
+            else:
+                cls.elaborate = original
+        self._originals = {}
+
+    def hierarchy_paths(self, top_fragment: Fragment, top_name="top"):
+        """The dotted hierarchy paths (as used by the rtlil backend) of all recorded fragments."""
+        recorded = {id(fragment) for fragment in self.fragments}
+        paths = []
+
+        def walk(fragment, path):
+            if id(fragment) in recorded:
+                paths.append(path)
+                return  # nested out of context parts are synthesized together with their parent
+            anonymous = 0
+            for subfragment, name in fragment.subfragments:
+                if name is None:
+                    name = "U$${}".format(anonymous)  # this is how the rtlil backend names anonymous modules
+                    anonymous += 1
+                walk(subfragment, "{}.{}".format(path, name))
+
+        walk(top_fragment, top_name)
+        return paths
+
+
+_HIERARCHY_PATTERN = re.compile(
+    r'^attribute \\(?:amaranth|nmigen)\.hierarchy "([^"]*)"\n(?:attribute .*\n)*module (\S+)$', re.MULTILINE
+)
+
+
+def hierarchy_modules(rtlil_text):
+    """Map the dotted hierarchy paths of an rtlil design to the names of the modules that implement them."""
+    return {path: module for path, module in _HIERARCHY_PATTERN.findall(rtlil_text)}
+
+
+def _to_verilog(rtlil_text, commands):
+    # this mirrors what the nmigen verilog backend does but allows us to select the modules that are written
+    script = [
+        "read_rtlil <<rtlil\n{}\nrtlil".format(rtlil_text),
+        *commands,
+        "proc -nomux",
+        "memory_collect",
+        "attrmap -remove generator -remove top -remove src -remove amaranth.hierarchy -remove nmigen.hierarchy",
+        "attrmap -modattr -remove generator -remove top -remove src -remove amaranth.hierarchy -remove nmigen.hierarchy",
+        "write_verilog -norename",
+    ]
+    yosys = find_yosys(lambda ver: ver >= (0, 10))
+    return yosys.run(["-q", "-"], "\n".join(script), ignore_warnings=True)
+
+
+def split_out_of_context(rtlil_text, top_module, modules):
+    """
+    Split a design into the top level (with black boxes for the given modules) and one verilog file per module.
+    :return: the top level verilog and a dict of module name -> verilog of that module and its submodules
+    """
+    top = _to_verilog(rtlil_text, ["blackbox {}".format(" ".join(modules)), "hierarchy -top {}".format(top_module)])
+    parts = {module: _to_verilog(rtlil_text, ["hierarchy -top {}".format(module)]) for module in modules}
+    return top, parts
+
+
+def _filename(module):
+    return re.sub(r"[^A-Za-z0-9_]", "_", module.lstrip("\\"))
+
+
+def _synthesize_vivado(platform, module, verilog, build_dir):
+    filename = _filename(module)
+    plan = BuildPlan(script="build_{}".format(filename))
+    plan.add_file("{}.v".format(filename), verilog)
+    plan.add_file("{}.tcl".format(filename), dedent("""
+        set_part {part}
+        read_verilog {filename}.v
+        synth_design -top {{{module}}} -mode out_of_context {opts}
+        write_edif -force {filename}.edf
+    """).format(part=platform._part, filename=filename, module=module.lstrip("\\"),
+                opts=naps_getenv("OOC_SYNTH_DESIGN_OPTS", "")))
+    plan.add_file("build_{}.sh".format(filename), dedent("""
+        set -e
+        [ -n "${env_var}" ] && . "${env_var}"
+        ${{VIVADO:-vivado}} -mode batch -log {filename}.log -source {filename}.tcl
+    """).format(env_var=platform._toolchain_env_var, filename=filename))
+    products = plan.execute_local(build_dir)
+    return products.get("{}.edf".format(filename))
+
+
+def _netlist(platform, module, verilog, cache: BuildCache):
+    key = hashlib.sha256(
+        _strip_src_attributes(verilog.encode("utf-8")) + _toolchain_fingerprint(platform).encode("utf-8")
+        + platform._part.encode("utf-8")
+    ).hexdigest()
+    with TemporaryDirectory() as tmp:
+        directory = Path(tmp) / "netlist"
+        if cache.restore(key, directory):
+            print("reusing out of context netlist for {} ({})".format(module, key[:16]))
+        else:
+            print("synthesizing {} out of context".format(module))
+            netlist = _synthesize_vivado(platform, module, verilog, Path(tmp) / "build")
+            directory.mkdir()
+            (directory / "netlist.edf").write_bytes(netlist)
+            cache.store(key, directory)
+        return (directory / "netlist.edf").read_bytes()
+
+
+def build_out_of_context(platform, elaborated, name, hierarchy_paths, cache: BuildCache = None, **kwargs):
+    """
+    Like `platform.build(elaborated, name, do_build=False)` but the parts of the design at the given hierarchy paths
+    are synthesized out of context (or taken from the netlist cache) and linked into the top level build.
+    Timing constraints that reference nets inside of the out of context parts are not supported.
+    """
+    if getattr(platform, "toolchain", None) != "Vivado":
+        raise NotImplementedError("out of context synthesis is only supported for the vivado toolchain")
+    if cache is None:
+        default = BuildCache()
+        cache = BuildCache(default.path / "netlists", max_entries=int(naps_getenv("OOC_CACHE_ENTRIES", 64)))
+
+    fragment = platform.prepare(elaborated, name)
+    rtlil_text, _ = rtlil.convert_fragment(fragment, name)
+    modules_by_path = hierarchy_modules(rtlil_text)
+    missing = [path for path in hierarchy_paths if path not in modules_by_path]
+    if missing:
+        raise KeyError("could not find the modules for {} in the design".format(", ".join(missing)))
+    modules = [modules_by_path[path] for path in hierarchy_paths]
+
+    top_verilog, parts = split_out_of_context(rtlil_text, modules_by_path[name], modules)
+    netlists = {module: _netlist(platform, module, verilog, cache) for module, verilog in parts.items()}
+
+    read_netlists = "\n".join("read_edif {}.edf".format(_filename(module)) for module in netlists)
+    script_after_read = kwargs.pop("script_after_read", "")
+    plan = platform.toolchain_prepare(fragment, name, script_after_read=read_netlists + "\n" + script_after_read,
+                                      **kwargs)
+    plan.files["{}.v".format(name)] = top_verilog
+    for module, netlist in netlists.items():
+        plan.add_file("{}.edf".format(_filename(module)), netlist)
+    return plan
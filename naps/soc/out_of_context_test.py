@@ -0,0 +1,60 @@
+import unittest
+
+from nmigen import *
+from nmigen.back import rtlil
+
+from .out_of_context import OutOfContextRecorder, hierarchy_modules, split_out_of_context
+
+
+class Incrementer(Elaboratable):
+    def __init__(self):
+        self.input = Signal(8)
+        self.output = Signal(8)
+
+    def elaborate(self, platform):
+        m = Module()
+        m.d.sync += self.output.eq(self.input + 1)
+        return m
+
+
+class Top(Elaboratable):
+    def __init__(self):
+        self.input = Signal(8)
+        self.output = Signal(8)
+
+    def elaborate(self, platform):
+        m = Module()
+        first = m.submodules.first = Incrementer()
+        second = Incrementer()
+        m.submodules += second
+        m.d.comb += first.input.eq(self.input)
+        m.d.comb += second.input.eq(first.output)
+        m.d.comb += self.output.eq(second.output)
+        return m
+
+
+class OutOfContextTest(unittest.TestCase):
+    def test_recorder(self):
+        top = Top()
+        with OutOfContextRecorder(["Incrementer"]) as recorder:
+            fragment = Fragment.get(top, None)
+        self.assertIs(Incrementer.elaborate, Incrementer.__dict__["elaborate"])  # the patch is undone
+        self.assertEqual(recorder.hierarchy_paths(fragment), ["top.first", "top.U$$0"])
+
+        with self.assertRaises(ValueError):
+            OutOfContextRecorder(["DoesNotExist"])
+
+    def test_split(self):
+        top = Top()
+        with OutOfContextRecorder([Incrementer]) as recorder:
+            fragment = Fragment.get(top, None)
+        paths = recorder.hierarchy_paths(fragment)
+        rtlil_text, _ = rtlil.convert_fragment(fragment.prepare(ports=[top.input, top.output]), "top")
+        modules = hierarchy_modules(rtlil_text)
+        self.assertEqual(set(modules.keys()), {"top", *paths})
+
+        top_verilog, parts = split_out_of_context(rtlil_text, modules["top"], [modules[path] for path in paths])
+        self.assertIn("first first", top_verilog)  # the instance is still there
+        self.assertNotIn("module first", top_verilog)  # but its definition is not
+        self.assertIn("module first", parts[modules["top.first"]])
+        self.assertIn("+ 1'h1", parts[modules["top.first"]])
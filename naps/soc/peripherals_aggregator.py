@@ -1,3 +1,5 @@
+from nmigen import *
+
 from .peripheral import Response
 from naps.util.nmigen_misc import iterator_with_if_elif
 
@@ -5,11 +7,20 @@ __all__ = ["PeripheralsAggregator"]
 
 
 class PeripheralsAggregator:
-    def __init__(self):
+    def __init__(self, tree_decoder=True, pipeline_stages=0):
         """
         A helper class that behaves like a Peripheral but proxies its read/write request to downstream peripherals
         based on their memorymap.
+
+        :param tree_decoder: decode the address with a balanced tree of comparisons instead of a priority chain over
+                             all the address ranges.
+        :param pipeline_stages: the number of register stages between the address decoder and the downstream
+                                peripherals. every stage adds one cycle of latency to every access.
+                                requires the tree decoder.
         """
+        assert tree_decoder or pipeline_stages == 0, "pipelining is only supported with the tree decoder"
+        self.tree_decoder = tree_decoder
+        self.pipeline_stages = pipeline_stages
         self.downstream_peripherals = []
 
     def add_peripheral(self, peripheral):
@@ -23,32 +34,96 @@ class PeripheralsAggregator:
             max(p.range().stop for p in self.downstream_peripherals)
         )
 
-    def handle_read(self, m, addr, data, read_done_callback):
-        for cond, peripheral in iterator_with_if_elif(self.downstream_peripherals, m):
+    def _translated_ranges(self):
+        start = self.range().start
+        translated = []
+        for peripheral in self.downstream_peripherals:
             address_range = peripheral.memorymap.absolute_range_of_direct_children.range()
-            translated_address_range = range(
-                address_range.start - self.range().start,
-                address_range.stop - self.range().start,
-            )
-            with cond((addr >= translated_address_range.start) & (addr < translated_address_range.stop)):
-                peripheral.handle_read(m, addr - translated_address_range.start, data, read_done_callback)
-        if self.downstream_peripherals:
+            translated.append((range(address_range.start - start, address_range.stop - start), peripheral))
+        return translated
+
+    def _decode(self, m, addr, ranges):
+        """
+        Builds a balanced tree of comparisons that finds the index of the addressed peripheral in the (sorted,
+        non overlapping) ranges. len(ranges) means that no peripheral is addressed.
+        """
+        select = Signal(range(len(ranges) + 1))
+
+        def tree(low, high):
+            # every address that reaches this subtree is >= ranges[low].start, so only the ends need to be checked
+            if high - low == 1:
+                with m.If(addr < ranges[low][0].stop):
+                    m.d.comb += select.eq(low)
+                with m.Else():
+                    m.d.comb += select.eq(len(ranges))
+            else:
+                middle = (low + high) // 2
+                with m.If(addr < ranges[middle][0].start):
+                    tree(low, middle)
+                with m.Else():
+                    tree(middle, high)
+
+        # the aggregator range also covers empty peripherals, so addresses below the first range can reach us
+        with m.If(addr < ranges[0][0].start):
+            m.d.comb += select.eq(len(ranges))
+        with m.Else():
+            tree(0, len(ranges))
+        return select
+
+    def _pipeline(self, m, select):
+        """
+        Delays the decoded select signal by the configured number of stages. Returns the delayed select signal and
+        a signal that is high iff the access was active for all the stages (and the delayed select is thus valid).
+        """
+        if self.pipeline_stages == 0:
+            return select, Const(1)
+
+        active = Signal()
+        m.d.comb += active.eq(1)
+        stages = Module()
+        valid, delayed = active, select
+        for i in range(self.pipeline_stages):
+            next_valid, next_delayed = Signal(name="valid_{}".format(i)), Signal.like(select, name="select_{}".format(i))
+            # the registers are in a separate module so that they are clocked independently of the context in which
+            # the connector calls us
+            stages.d.sync += next_valid.eq(valid & active)
+            stages.d.sync += next_delayed.eq(delayed)
+            valid, delayed = next_valid, next_delayed
+        m.submodules += stages
+        return delayed, valid
+
+    def _handle(self, m, addr, data, done_callback, handle):
+        if not self.downstream_peripherals:
+            done_callback(Response.ERR)
+            return
+
+        if not self.tree_decoder:
+            for cond, (address_range, peripheral) in iterator_with_if_elif(self._translated_ranges(), m):
+                with cond((addr >= address_range.start) & (addr < address_range.stop)):
+                    handle(peripheral)(m, addr - address_range.start, data, done_callback)
             with m.Else():
-                read_done_callback(Response.ERR)
-        else:
-            read_done_callback(Response.ERR)
+                done_callback(Response.ERR)
+            return
+
+        ranges = sorted(
+            ((address_range, peripheral) for address_range, peripheral in self._translated_ranges()
+             if address_range.start < address_range.stop),
+            key=lambda x: x[0].start
+        )
+        if not ranges:
+            done_callback(Response.ERR)
+            return
+        select, valid = self._pipeline(m, self._decode(m, addr, ranges))
+        with m.If(valid):
+            with m.Switch(select):
+                for i, (address_range, peripheral) in enumerate(ranges):
+                    with m.Case(i):
+                        handle(peripheral)(m, addr - address_range.start, data, done_callback)
+                with m.Default():
+                    done_callback(Response.ERR)
+
+    def handle_read(self, m, addr, data, read_done_callback):
+        self._handle(m, addr, data, read_done_callback, lambda peripheral: peripheral.handle_read)
 
     def handle_write(self, m, addr, data, write_done_callback):
-        for cond, peripheral in iterator_with_if_elif(self.downstream_peripherals, m):
-            address_range = peripheral.memorymap.absolute_range_of_direct_children.range()
-            translated_address_range = range(
-                address_range.start - self.range().start,
-                address_range.stop - self.range().start,
-            )
-            with cond((addr >= translated_address_range.start) & (addr < translated_address_range.stop)):
-                peripheral.handle_write(m, addr - translated_address_range.start, data, write_done_callback)
-        if self.downstream_peripherals:
-            with m.Else():
-                write_done_callback(Response.ERR)
-        else:
-            write_done_callback(Response.ERR)
+        self._handle(m, addr, data, write_done_callback, lambda peripheral: peripheral.handle_write)
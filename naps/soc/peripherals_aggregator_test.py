@@ -0,0 +1,106 @@
+import unittest
+from types import SimpleNamespace
+
+from nmigen import *
+
+from naps import SimPlatform, ZynqSocPlatform, CsrBank, ControlSignal, write_to_stream, read_from_stream
+from naps.cores.axi import axil_read, axil_write, AxiResponse
+from .memorymap import Address
+from .peripheral import Response
+from .peripherals_aggregator import PeripheralsAggregator
+
+
+class ManyBanks(Elaboratable):
+    def __init__(self, n, sizes):
+        self.banks = []
+        for i in range(n):
+            bank = CsrBank()
+            signals = [ControlSignal(32) for _ in range(sizes[i % len(sizes)])]
+            if i == 1:
+                # leave a hole in front of the registers of the second bank
+                signals[0] = ControlSignal(32, address=Address(0x8, 0))
+            for j, signal in enumerate(signals):
+                bank.reg("reg{}".format(j), signal)
+            self.banks.append((bank, signals))
+
+    def elaborate(self, platform):
+        m = Module()
+        for i, (bank, _) in enumerate(self.banks):
+            m.submodules["bank{}".format(i)] = bank
+        return m
+
+
+class PeripheralsAggregatorTest(unittest.TestCase):
+    def check_aggregator(self, n=7, pipeline_stages=0):
+        platform = ZynqSocPlatform(SimPlatform())
+        platform.peripherals_decoder_pipeline_stages = pipeline_stages
+        dut = ManyBanks(n, sizes=[1, 3, 2])
+
+        def testbench():
+            axi = platform.axi_lite_master
+            index = dut.banks[0][0].memorymap.top_memorymap.index
+            addresses = []
+            for i, (_, signals) in enumerate(dut.banks):
+                for j, signal in enumerate(signals):
+                    address = index.find(signal).address
+                    addresses.append(address)
+                    yield from axil_write(axi, address, (i << 8) | j)
+                    self.assertEqual((yield signal), (i << 8) | j)
+            for i, (_, signals) in enumerate(dut.banks):
+                for j, signal in enumerate(signals):
+                    self.assertEqual((yield from axil_read(axi, index.find(signal).address)), (i << 8) | j)
+
+            # the holes between the peripherals answer with an error
+            holes = [address for address in range(min(addresses), max(addresses), 4) if not index.at(address, 4)]
+            self.assertEqual(bool(holes), n > 1)
+            for address in holes[:3]:
+                yield from write_to_stream(axi.read_address, payload=address)
+                _, response = yield from read_from_stream(axi.read_data, extract=("payload", "resp"), timeout=100)
+                self.assertEqual(response, AxiResponse.SLVERR.value)
+
+        platform.sim(dut, (testbench, "axi_lite"))
+
+    def test_tree_decoder(self):
+        self.check_aggregator()
+
+    def test_single_peripheral(self):
+        self.check_aggregator(n=1)
+
+    def test_pipelined_tree_decoder(self):
+        self.check_aggregator(pipeline_stages=2)
+
+    def test_below_first_peripheral(self):
+        # an empty peripheral placed below the others widens the range of the aggregator but is not decoded
+        def fake_peripheral(address_range, hit):
+            def handle_read(m, addr, data, read_done_callback):
+                m.d.comb += hit.eq(1)
+                read_done_callback(Response.OK)
+            return SimpleNamespace(
+                range=lambda: address_range, handle_read=handle_read, handle_write=None,
+                memorymap=SimpleNamespace(absolute_range_of_direct_children=SimpleNamespace(range=lambda: address_range)),
+            )
+
+        hits = [Signal(name="hit{}".format(i)) for i in range(2)]
+        aggregator = PeripheralsAggregator()
+        aggregator.downstream_peripherals = [fake_peripheral(range(0x0, 0x0), hits[0]),
+                                             fake_peripheral(range(0x100, 0x110), hits[1])]
+        m = Module()
+        m.domains.sync = ClockDomain()
+        addr, data, error = Signal(16), Signal(32), Signal()
+        aggregator.handle_read(m, addr, data, lambda response: m.d.comb.__iadd__(error.eq(response == Response.ERR)))
+
+        def testbench():
+            for address, hit, expect_error in ((0x10, None, 1), (0x104, hits[1], 0), (0x110, None, 1)):
+                yield addr.eq(address)
+                yield
+                self.assertEqual((yield error), expect_error)
+                for h in hits:
+                    self.assertEqual((yield h), int(h is hit))
+
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+        platform.sim(m, testbench, traces="none")
+
+    def test_chain_needs_no_pipeline(self):
+        with self.assertRaises(AssertionError):
+            PeripheralsAggregator(tree_decoder=False, pipeline_stages=1)
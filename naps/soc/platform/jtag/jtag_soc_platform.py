@@ -23,7 +23,7 @@ class JTAGSocPlatform(SocPlatform):
         def peripherals_connect_hook(platform, top_fragment: Fragment, sames):
             from naps import JTAGPeripheralConnector
             if platform.peripherals:
-                aggregator = PeripheralsAggregator()
+                aggregator = PeripheralsAggregator(pipeline_stages=platform.peripherals_decoder_pipeline_stages)
                 for peripheral in platform.peripherals:
                     aggregator.add_peripheral(peripheral)
 
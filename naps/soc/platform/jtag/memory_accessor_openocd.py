@@ -1,5 +1,11 @@
 class JTAGAccessor:
     base = 0
+    max_burst_len = 2 ** 16
+    # the openocd telnet server has a limited line length. we split our scans so that the commands stay below it.
+    max_line_length = 4000
+    # the number of bits a single word access may take before a further scan is needed to wait for it
+    wait_window = 64
+    single_preamble_len = 40
 
     def __init__(self, addr="127.0.0.1", port=4444, timeout=1024, debug=False, spawn_server=True, tap_name="dut.tap"):
         import socket
@@ -20,93 +26,242 @@ class JTAGAccessor:
         self.timeout = timeout
         self.debug = debug
         self.spawn_server = spawn_server
+        self._buffer = b""
 
-        # skip some strange random shit
-        self._readline(decode=False)
+        # skip the banner of the telnet server
+        self._read_reply()
         self._irscan(0x32)
-        for i in range(3):
-            self._shift_word(0)
+        self._shift([(32, 0)] * 3)  # brings the connector to a defined state
 
     def __del__(self):
         if hasattr(self, "spawn_server") and self.spawn_server:
             self._writeline("shutdown")
 
+    # single words are accessed with the single word protocol which waits for the access to finish. this way every
+    # access hits the bus exactly once which matters for registers with side effects (strobes, EventRegs, fifos, ...).
+    # the wait is not polled bit by bit: every access is shifted in one go together with a window of wait bits and
+    # the reply is found by the first 1 on tdo.
     def read(self, addr):
-        self._shift_bit(0)  # wakeup
-        self._shift_bit(1)  # wakeup
-        self._shift_word(addr)  # address
-        self._shift_bit(0)  # read
-
-        # read wait
-        timeout = self.timeout
-        for t in range(timeout):
-            if self._shift_bit(1) == 1:
-                break
-            if t == timeout - 1:
-                raise TimeoutError()
+        return self._read_single(addr)
+
+    def write(self, addr, value):
+        self._write_single(addr, value)
 
-        data = self._shift_word(0)
-        if self._shift_bit(0) != 0:  # read status
-            raise TransactionNotSuccessfulException()
+    def read_many(self, addrs):
+        """
+        reads the addresses one after another (in order) in a single scan sequence. every word gets a wait window of
+        `timeout` bits; if a word does not finish in it, a TimeoutError is raised (after the following words were
+        accessed).
+        """
+        return self._singles([(addr, None) for addr in addrs], self.timeout)
 
-        return data
+    def write_many(self, addrs, values):
+        """writes the values to the addresses one after another (in order) in a single scan sequence (see read_many)"""
+        addrs, values = list(addrs), list(values)
+        assert len(addrs) == len(values)
+        self._singles(list(zip(addrs, values)), self.timeout)
 
-    def write(self, addr, value):
-        self._shift_bit(0)  # wakeup
-        self._shift_bit(1)  # wakeup
-        self._shift_word(addr)  # address
-        self._shift_bit(1)  # write
-        self._shift_word(value)
-
-        # write wait
-        timeout = self.timeout
-        for t in range(timeout):
-            if self._shift_bit(1) == 1:
-                break
-            if t == timeout - 1:
+    def read_burst(self, addr, n):
+        """
+        reads n consecutive words starting at addr with as few roundtrips to openocd as possible. this uses the burst
+        protocol and is only meant for side effect free memory: a word that misses its slot in a burst is read again
+        with the single word protocol (which raises if the word is an error).
+        """
+        return self._burst(addr, n)
+
+    def write_burst(self, addr, values):
+        """writes the values to consecutive words starting at addr. like read_burst this is only meant for memory."""
+        values = list(values)
+        self._burst(addr, len(values), values)
+
+    def _burst(self, addr, n, values=None):
+        result = []
+        done = 0
+        while done < n:
+            runs = [(i, min(self.max_burst_len, n - i)) for i in range(done, n, self.max_burst_len)]
+            fields, run_lengths = [], []
+            for run_start, run_n in runs:
+                run_values = values[run_start:run_start + run_n] if values is not None else None
+                run_fields = self._burst_fields(addr + 4 * run_start, run_n, run_values)
+                fields += run_fields
+                run_lengths.append(sum(length for length, _ in run_fields))
+            bits = self._shift(fields)
+
+            offset = 0
+            for (run_start, run_n), length in zip(runs, run_lengths):
+                data, n_ok = self._parse_burst(bits[offset:offset + length], run_n)
+                offset += length
+                result += data[:n_ok]
+                done += n_ok
+                if n_ok < run_n:
+                    # the hardware stops at the first failed word. we retry it on its own and continue with new
+                    # bursts after it. if not even the first word made it, the memory is too slow for bursts.
+                    for i in range(run_start + n_ok, run_start + run_n if n_ok == 0 else run_start + n_ok + 1):
+                        if values is None:
+                            result.append(self._read_single(addr + 4 * i))
+                        else:
+                            self._write_single(addr + 4 * i, values[i])
+                        done += 1
+                    break
+        return result
+
+    def read_block(self, addr, n_words):
+        import numpy as np
+        return np.array(self.read_burst(addr, n_words), dtype=np.uint32)
+
+    def write_block(self, addr, array):
+        self.write_burst(addr, [int(value) for value in array])
+
+    @staticmethod
+    def _burst_fields(addr, n, values=None):
+        # see the JTAGPeripheralConnector for a description of the protocol
+        assert 0 < n <= JTAGAccessor.max_burst_len
+        fields = [(1, 0), (1, 1), (32, addr | 1), (1, int(values is not None)), (16, n - 1)]
+        for i in range(n + 1):
+            word = values[i] if values is not None and i < n else 0xffffffff
+            fields += [(32, word), (1, 1)]
+        fields.append((32, 0xffffffff))  # gives room for the tdi and tdo latency
+        return fields
+
+    @staticmethod
+    def _parse_burst(bits, n):
+        """
+        returns the read words and the number of words that were successful before the first failure. for writes the
+        ok bit of a word comes with the following slot which lines up with the same positions.
+        """
+        header_len = 2 + 32 + 1 + 16
+        try:
+            marker = bits.index(1, header_len + 32)
+        except ValueError:
+            return [], 0
+        data = []
+        for i in range(n):
+            slot = bits[marker + 1 + 33 * i:marker + 1 + 33 * (i + 1)]
+            if len(slot) < 33 or slot[32] != 1:
+                return data, i
+            data.append(sum(bit << j for j, bit in enumerate(slot[:32])))
+        return data, n
+
+    def _read_single(self, addr):
+        return self._singles([(addr, None)], self.wait_window)[0]
+
+    def _write_single(self, addr, value):
+        self._singles([(addr, value)], self.wait_window)
+
+    @classmethod
+    def _single_fields(cls, addr, value, window):
+        # see the JTAGPeripheralConnector for a description of the protocol. the zeros in front bring the connector to
+        # IDLE1 from wherever the previous access left it. they are longer than a reply, so a reply that runs into them
+        # ends before the next access starts.
+        fields = [(cls.single_preamble_len, 0), (1, 1), (32, addr), (1, int(value is not None))]
+        if value is not None:
+            fields.append((32, value))
+        fields.append((window, 2 ** window - 1))
+        fields.append((33 + 32, 2 ** (33 + 32) - 1))  # the reply and some room for the tdi and tdo latency
+        return fields
+
+    def _singles(self, accesses, window):
+        """
+        shifts all the (addr, value or None for reads) accesses with the single word protocol in one scan sequence.
+        a reply only counts if it starts before the next access (which aborts the wait) is shifted.
+        """
+        if not accesses:
+            return []
+        fields, offsets = [], [0]
+        for addr, value in accesses:
+            access_fields = self._single_fields(addr, value, window)
+            fields += access_fields
+            offsets.append(offsets[-1] + sum(length for length, _ in access_fields))
+        bits = self._shift(fields)
+
+        result = []
+        for i, (addr, value) in enumerate(accesses):
+            write = value is not None
+            reply_start = offsets[i] + self.single_preamble_len + 34 + (32 if write else 0)
+            reply_len = 1 if write else 33
+            if i == len(accesses) - 1:
+                # nothing comes after the last access, so it can simply be waited for a bit longer
+                bits = self._wait_for_reply(bits, reply_start, reply_len, window)
+                reply_end = len(bits)
+            else:
+                reply_end = offsets[i + 1]
+            try:
+                marker = bits.index(1, reply_start, reply_end)
+            except ValueError:
                 raise TimeoutError()
-        if self._shift_bit(0) != 0:  # write status
-            raise TransactionNotSuccessfulException()
+            reply = bits[marker + 1:marker + 1 + reply_len]
+            if reply[-1] != 0:  # status
+                raise TransactionNotSuccessfulException()
+            if not write:
+                result.append(sum(bit << j for j, bit in enumerate(reply[:32])))
+        return result
 
-    def _writeline(self, message):
-        message += "\n"
-        self.s.send(message.encode('utf-8'))
+    def _wait_for_reply(self, bits, reply_start, reply_len, waited):
+        while True:
+            try:
+                marker = bits.index(1, reply_start)
+                if len(bits) >= marker + 1 + reply_len:
+                    return bits
+            except ValueError:
+                if waited >= self.timeout:
+                    raise TimeoutError()
+            bits = bits + self._shift([(33, 2 ** 33 - 1)])
+            waited += 33
+
+    def _shift(self, fields):
+        """
+        shifts all the (length, value) fields and returns the captured bits (lsb first). the fields are split into
+        as many drscan commands as needed which are all sent at once before the replies are read.
+        """
+        lines, line = [], "drscan {}".format(self.tap_name)
+        for length, value in fields:
+            field = " {} {}".format(length, hex(value))
+            if len(line) + len(field) > self.max_line_length:
+                lines.append(line)
+                line = "drscan {}".format(self.tap_name)
+            line += field
+        lines.append(line)
 
-    def _readline(self, decode=True):
-        buf = b""
+        self._writeline("\n".join(lines))
+        captured = []
+        for _ in lines:
+            captured += self._read_reply().split()
 
-        while buf[-2:] != b'> ':
-            buf += self.s.recv(1)
+        bits = []
+        for (length, _), value in zip(fields, captured):
+            value = int(value, 16)
+            bits += [(value >> i) & 1 for i in range(length)]
+        return bits
 
-        if decode and self.debug:
-            print(buf.decode('utf-8'))
+    def _writeline(self, message):
+        message += "\n"
+        self.s.sendall(message.encode('utf-8'))
 
-        buf = buf.rsplit(b'\r\n', 2)[1][1:]
+    def _read_reply(self):
+        """reads everything until the next prompt and returns the output of the command (without the echo)"""
+        while b"> " not in self._buffer:
+            chunk = self.s.recv(4096)
+            if not chunk:
+                raise ConnectionError("openocd closed the connection")
+            self._buffer += chunk
+        reply, self._buffer = self._buffer.split(b"> ", 1)
 
-        if decode:
-            buf = buf.decode('utf-8')
+        if self.debug:
+            print(reply.decode('utf-8'))
 
-        return buf
+        lines = reply.decode('utf-8').split("\n")[1:]  # the first line is the echo of the command
+        return " ".join(line.strip("\x00\r\t ") for line in lines).strip()
 
     def _writecmd(self, cmd):
         self._writeline(cmd)
-        ret = self._readline()
+        ret = self._read_reply()
         if self.debug:
             print(cmd, "->", ret)
         return ret
 
-    def _shift_word(self, write):
-        return int(self._drscan(32, write), 16)
-
-    def _shift_bit(self, write):
-        return int(self._drscan(1, write), 16)
-
     def _irscan(self, instruction):
         return self._writecmd('irscan {} {}'.format(self.tap_name, instruction))
 
-    def _drscan(self, len, value):
-        return self._writecmd('drscan {} {} {}'.format(self.tap_name, len, value))
-
 
 MemoryAccessor = JTAGAccessor
 
@@ -0,0 +1,291 @@
+import socket
+import threading
+import unittest
+
+import numpy as np
+
+from .memory_accessor_openocd import JTAGAccessor, TransactionNotSuccessfulException
+
+
+class ConnectorModel:
+    """A bit level model of the shift protocol of the JTAGPeripheralConnector with a memory behind it"""
+
+    def __init__(self, words=1024, latency=3):
+        self.memory = [0] * words
+        self.latency = latency  # the number of jtag clock cycles every access takes
+        self.accesses = 0
+        self.written = []  # the addresses of all writes in the order in which they happened
+
+        self.state = "IDLE0"
+        self.bit = 0
+        self.addr = 0
+        self.data = 0
+        self.write = False
+        self.burst_len = 0
+
+        self.countdown = 0  # the remaining cycles of the running access
+        self.pending = False
+        self.error = False
+        self.remaining = 0
+        self.failed = False
+        self.first = False
+        self.shift_in = 0
+        self.shift_out = 0
+
+    def _start_access(self):
+        self.accesses += 1
+        self.pending = True
+        self.countdown = self.latency
+        self.error = not (0 <= self.addr // 4 < len(self.memory))
+        if not self.error and self.write:
+            self.memory[self.addr // 4] = self.data
+            self.written.append(self.addr)
+
+    def _running(self):
+        return self.pending and self.countdown > 0
+
+    def _result(self):
+        return 0 if self.error else self.memory[self.addr // 4]
+
+    def shift(self, tdi):
+        tdo = 0
+        state = self.state
+        if self._running():
+            self.countdown -= 1
+
+        if state == "IDLE0":
+            if not tdi:
+                self.state = "IDLE1"
+        elif state == "IDLE1":
+            if tdi:
+                self.state, self.bit, self.addr = "ADDR", 0, 0
+        elif state == "ADDR":
+            self.addr |= tdi << self.bit
+            self.bit += 1
+            if self.bit == 32:
+                self.state = "RW_CMD"
+        elif state == "RW_CMD":
+            self.write, self.bit, self.data = bool(tdi), 0, 0
+            if self.addr & 1:
+                self.addr &= ~1
+                self.state, self.burst_len = "BURST_LEN", 0
+            elif tdi:
+                self.state = "WRITE"
+            else:
+                self._start_access()
+                self.state = "WAIT"
+        elif state == "WRITE":
+            self.data |= tdi << self.bit
+            self.bit += 1
+            if self.bit == 32:
+                self._start_access()
+                self.state = "WAIT"
+        elif state == "WAIT":
+            if not self._running():
+                tdo = 1
+                self.state, self.bit = ("STATUS" if self.write else "READ"), 0
+                self.data = self._result() if not self.write else self.data
+            elif not tdi:
+                self.state = "IDLE0"
+        elif state == "READ":
+            tdo = (self.data >> self.bit) & 1
+            self.bit += 1
+            if self.bit == 32:
+                self.state = "STATUS"
+        elif state == "STATUS":
+            tdo = int(self.error)
+            self.state = "IDLE0"
+        elif state == "BURST_LEN":
+            self.burst_len |= tdi << self.bit
+            self.bit += 1
+            if self.bit == 16:
+                self.remaining = self.burst_len + 1
+                self.bit, self.failed, self.first, self.shift_out = 0, False, True, 1 << 32
+                self.pending = False
+                if not self.write:
+                    self._start_access()
+                self.state = "BURST"
+        elif state == "BURST":
+            ok = self.pending and not self._running() and not self.error and not self.failed
+            word = self.shift_in
+            if self.write:
+                tdo = int(self.bit == 32 and (self.first or ok))
+                self.shift_in = (self.shift_in >> 1) | (tdi << 31)
+            else:
+                tdo = self.shift_out & 1
+                self.shift_out >>= 1
+            if self.bit < 32:
+                self.bit += 1
+            else:
+                self.bit = 0
+                if not tdi or self.remaining == 0:
+                    self.state = "IDLE0"
+                    return tdo
+                if not self.write:
+                    self.shift_out = self._result() | (int(ok) << 32)
+                remaining, self.remaining = self.remaining, self.remaining - 1
+                if not self.write and remaining == 1:
+                    return tdo
+                if self._running() or self.failed or (self.pending and self.error):
+                    self.failed = True
+                else:
+                    if self.write:
+                        self.data = word
+                    if not self.first or not self.write:
+                        self.addr += 4
+                    self._start_access()
+                self.first = False
+        return tdo
+
+
+class FakeOpenOCD:
+    """A tcp server that speaks enough of the openocd telnet protocol to shift bits through a `ConnectorModel`"""
+
+    def __init__(self, model):
+        self.model = model
+        self.commands = 0
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        connection, _ = self.server.accept()
+        with connection:
+            connection.sendall(b"Open On-Chip Debugger\r\n> ")
+            for line in connection.makefile("rb"):
+                line = line.decode("utf-8").strip()
+                self.commands += 1
+                connection.sendall("{}\r\n{}\r\n> ".format(line, self._execute(line)).encode("utf-8"))
+        self.server.close()
+
+    def _execute(self, line):
+        command, *args = line.split()
+        if command == "irscan":
+            return ""
+        assert command == "drscan"
+        result = []
+        for length, value in zip(args[1::2], args[2::2]):
+            length, value = int(length), int(value, 0)
+            captured = sum(self.model.shift((value >> i) & 1) << i for i in range(length))
+            result.append("{{:0{}x}}".format((length + 3) // 4).format(captured))
+        return " ".join(result)
+
+
+class JTAGAccessorTest(unittest.TestCase):
+    def make_accessor(self, **kwargs):
+        model = ConnectorModel(**kwargs)
+        server = FakeOpenOCD(model)
+        accessor = JTAGAccessor(port=server.port, spawn_server=False)
+        return accessor, model, server
+
+    def test_read_write(self):
+        accessor, model, _ = self.make_accessor()
+        accessor.write(0x10, 0xdead_beef)
+        self.assertEqual(model.memory[4], 0xdead_beef)
+        self.assertEqual(accessor.read(0x10), 0xdead_beef)
+
+        values = [i * 0x0101_0101 for i in range(40)]
+        accessor.write_burst(0x100, values)
+        self.assertEqual(model.memory[0x40:0x40 + 40], values)
+        self.assertEqual(accessor.read_burst(0x100, 40), values)
+
+        addrs = [0x104, 0x108, 0x10, 0x200, 0x204, 0x100]
+        accessor.write_many(addrs, range(6))
+        self.assertEqual(accessor.read_many(addrs), list(range(6)))
+        self.assertEqual(accessor.read_many(reversed(addrs)), list(reversed(range(6))))
+        self.assertEqual(accessor.read_many([]), [])
+
+        accessor.write_block(0x300, np.arange(8, dtype=np.uint32))
+        self.assertEqual(accessor.read_block(0x300, 8).tolist(), list(range(8)))
+
+    def test_single_accesses(self):
+        # registers are accessed exactly once and in order
+        accessor, model, _ = self.make_accessor()
+        addrs = [0x20, 0x10, 0x14, 0x0]
+        accessor.write_many(addrs, range(4))
+        self.assertEqual(model.written, addrs)
+        self.assertEqual(accessor.read_many(addrs), list(range(4)))
+        self.assertEqual(model.accesses, 8)
+
+    def test_batching(self):
+        accessor, model, server = self.make_accessor()
+        model.memory = list(range(1024))
+        commands = server.commands
+        self.assertEqual(accessor.read_burst(0, 1024), list(range(1024)))
+        self.assertEqual(model.accesses, 1024)
+        batched = server.commands - commands
+
+        commands = server.commands
+        accessor.write_burst(0, range(1024, 2048))
+        self.assertEqual(model.memory, list(range(1024, 2048)))
+        self.assertEqual(model.accesses, 2048)
+        batched = max(batched, server.commands - commands)
+
+        commands = server.commands
+        for addr in range(0, 64, 4):
+            accessor._read_single(addr)
+        single = (server.commands - commands) * 1024 // 16
+        print("{} openocd commands batched, {} with single transactions".format(batched, single))
+        self.assertLess(batched * 100, single)
+
+    def test_batched_single_accesses(self):
+        accessor, model, server = self.make_accessor()
+        addrs = [4 * i for i in range(32)][::-1]
+        commands = server.commands
+        accessor.write_many(addrs, range(32))
+        self.assertEqual(accessor.read_many(addrs), list(range(32)))
+        self.assertEqual(model.written, addrs)
+        self.assertEqual(model.accesses, 64)
+        batched = server.commands - commands
+
+        commands = server.commands
+        accessor.write(0, 1)
+        self.assertEqual(accessor.read(0), 1)
+        self.assertEqual(server.commands - commands, 2)
+        # all words of a batch go into the same scan sequence which is only split into a few lines by the line length
+        print("{} openocd commands for 64 batched single word accesses".format(batched))
+        self.assertLess(batched, 16)
+
+    def test_long_lines_are_split(self):
+        accessor, model, _ = self.make_accessor()
+        accessor.max_line_length = 100
+        accessor.write_burst(0, range(100))
+        self.assertEqual(accessor.read_burst(0, 100), list(range(100)))
+
+    def test_slow_peripheral(self):
+        # the accesses take longer than a burst slot so the words are read with the single word protocol
+        accessor, model, _ = self.make_accessor(latency=50)
+        accessor.write_burst(0, [1, 2, 3])
+        self.assertEqual(model.memory[:3], [1, 2, 3])
+        self.assertEqual(accessor.read_burst(0, 3), [1, 2, 3])
+
+    def test_wait_window_too_short(self):
+        # single accesses keep waiting after their window without starting the access again
+        accessor, model, server = self.make_accessor(latency=200)
+        accessor.write(0x10, 5)
+        self.assertEqual(accessor.read(0x10), 5)
+        self.assertEqual(model.accesses, 2)
+        self.assertEqual(accessor.read_many([0x10, 0x0]), [5, 0])
+        accessor.timeout = 100
+        with self.assertRaises(TimeoutError):
+            accessor.read(0x10)
+
+    def test_error(self):
+        accessor, model, _ = self.make_accessor(words=16)
+        self.assertEqual(accessor.read_burst(14 * 4, 2), [0, 0])
+        accesses = model.accesses
+        with self.assertRaises(TransactionNotSuccessfulException):
+            accessor.read_burst(14 * 4, 4)
+        # the burst stops at the error and only the failed word is retried
+        self.assertEqual(model.accesses - accesses, 3 + 1)
+        accesses = model.accesses
+        with self.assertRaises(TransactionNotSuccessfulException):
+            accessor.write_burst(13 * 4, [1, 2, 3, 4])
+        self.assertEqual(model.memory[13:], [1, 2, 3])
+        self.assertEqual(model.accesses - accesses, 4 + 1)
+        with self.assertRaises(TransactionNotSuccessfulException):
+            accessor.write(16 * 4, 1)
+        accessor.write(15 * 4, 1)
@@ -25,7 +25,7 @@ class SimSocPlatform(SocPlatform):
                 axi_lite_master = AxiEndpoint(addr_bits=32, data_bits=32, lite=True)
                 self.axi_lite_master = axi_lite_master
 
-                aggregator = PeripheralsAggregator()
+                aggregator = PeripheralsAggregator(pipeline_stages=platform.peripherals_decoder_pipeline_stages)
                 for peripheral in platform.peripherals:
                     aggregator.add_peripheral(peripheral)
                 connector = DomainRenamer(self.csr_domain)(AxiLitePeripheralConnector(aggregator))
@@ -53,6 +53,15 @@ class SimSocPlatform(SocPlatform):
                     def write(self, offset, to_write):
                         conn.send(('write', offset, to_write))
 
+                    # one message per block instead of one roundtrip through the pipe per word
+                    def read_block(self, offset, n_words):
+                        import numpy as np
+                        conn.send(('read_block', offset, n_words))
+                        return np.array(conn.recv(), dtype=np.uint32)
+
+                    def write_block(self, offset, array):
+                        conn.send(('write_block', offset, [int(value) for value in array]))
+
                 g = {}
                 exec(self.driver, g, g)
                 Design = g["Design"]
@@ -94,6 +103,16 @@ class SimSocPlatform(SocPlatform):
                     elif cmd == "write":
                         address, data = rest
                         yield from axil_write(self.axi_lite_master, address, data)
+                    elif cmd == "read_block":
+                        address, n_words = rest
+                        result = []
+                        for i in range(n_words):
+                            result.append((yield from axil_read(self.axi_lite_master, address + 4 * i)))
+                        conn.send(result)
+                    elif cmd == "write_block":
+                        address, words = rest
+                        for i, word in enumerate(words):
+                            yield from axil_write(self.axi_lite_master, address + 4 * i, word)
                     elif cmd == 'nmigen':
                         payload, = rest
                         conn.send((yield payload))
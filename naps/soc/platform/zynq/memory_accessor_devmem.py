@@ -30,3 +30,12 @@ class DevMemAccessor:
     def write(self, offset, to_write):
         self.mem[offset:offset + 4] = struct.pack('I', to_write)
 
+    def read_block(self, offset, n_words):
+        import numpy as np
+        # the view over the mmap is copied once so that the result does not change with the hardware
+        return np.frombuffer(self.mem, dtype=np.uint32, count=n_words, offset=offset).copy()
+
+    def write_block(self, offset, array):
+        import numpy as np
+        np.frombuffer(self.mem, dtype=np.uint32, count=len(array), offset=offset)[:] = array
+
@@ -0,0 +1,26 @@
+import mmap
+import tempfile
+import unittest
+
+import numpy as np
+
+from .memory_accessor_devmem import DevMemAccessor
+
+
+class DevMemAccessorTest(unittest.TestCase):
+    def test_blocks(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(bytes(mmap.PAGESIZE))
+            f.flush()
+            accessor = DevMemAccessor(base_addr=0, filename=f.name)
+
+            accessor.write_block(8, np.arange(16, dtype=np.uint32) * 3)
+            accessor.write(4, 0xffff_ffff)
+            self.assertEqual(accessor.read(8 + 4 * 15), 45)
+            block = accessor.read_block(4, 17)
+            self.assertEqual(block.dtype, np.uint32)
+            self.assertEqual(block.tolist(), [0xffff_ffff] + [i * 3 for i in range(16)])
+
+            # the result is a snapshot and not a view of the memory
+            accessor.write(4, 0)
+            self.assertEqual(block[0], 0xffff_ffff)
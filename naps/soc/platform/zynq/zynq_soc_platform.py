@@ -12,6 +12,11 @@ from ...fatbitstream import File
 class ZynqSocPlatform(SocPlatform):
     base_address = Address(0x4000_0000, 0, (0x7FFF_FFFF - 0x4000_0000) * 8)
     csr_domain = "axi_lite"
+    # use a connector that keeps multiple axi transactions in flight (only without the axi interconnect)
+    pipelined_peripheral_connector = False
+    # connect the peripherals directly to the axi (full) gp master so that bursts are not split up (only without the
+    # axi interconnect)
+    burst_peripheral_connector = False
 
     def __init__(self, platform, use_axi_interconnect=False):
         from naps.vendor.xilinx_s7 import PS7
@@ -21,15 +26,40 @@ class ZynqSocPlatform(SocPlatform):
         self.final_to_inject_subfragments.append((self.ps7, "ps7"))
 
         def peripherals_connect_hook(platform, top_fragment: Fragment, sames):
-            from naps.cores.axi import AxiEndpoint, AxiLitePeripheralConnector, AxiFullToLiteBridge, AxiInterconnect
+            from naps.cores.axi import AxiEndpoint, AxiLitePeripheralConnector, AxiLitePipelinedPeripheralConnector, \
+                AxiFullPeripheralConnector, AxiFullToLiteBridge, AxiInterconnect
+
+            burst = platform.burst_peripheral_connector and not use_axi_interconnect
+            pipelined = platform.pipelined_peripheral_connector and not use_axi_interconnect
+
+            def aggregate_peripherals():
+                aggregator = PeripheralsAggregator(pipeline_stages=platform.peripherals_decoder_pipeline_stages)
+                for peripheral in platform.peripherals:
+                    aggregator.add_peripheral(peripheral)
+                return aggregator
 
             if platform.peripherals:
                 m = Module()
                 platform.ps7.fck_domain(domain_name="axi_lite", requested_frequency=10e6)
+                if burst:
+                    if not hasattr(platform, "is_sim"):  # we are not in a simulation platform
+                        axi_full_master = platform.ps7.get_axi_gp_master(ClockSignal(self.csr_domain))
+                    else:  # we are in a simulation platform
+                        axi_full_master = AxiEndpoint(addr_bits=32, data_bits=32, lite=False, id_bits=12)
+                        self.axi_full_master = axi_full_master
+                    connector = DomainRenamer(self.csr_domain)(AxiFullPeripheralConnector(aggregate_peripherals()))
+                    m.d.comb += axi_full_master.connect_downstream(connector.axi)
+                    m.submodules.connector = connector
+                    platform.to_inject_subfragments.append((m, self.csr_domain))
+                    return
+
                 if not hasattr(platform, "is_sim"):  # we are not in a simulation platform
                     axi_full_port: AxiEndpoint = platform.ps7.get_axi_gp_master(ClockSignal(self.csr_domain))
                     axi_lite_bridge = m.submodules.axi_lite_bridge = DomainRenamer(self.csr_domain)(
-                        AxiFullToLiteBridge(axi_full_port)
+                        AxiFullToLiteBridge(
+                            axi_full_port,
+                            max_outstanding=AxiLitePipelinedPeripheralConnector.max_outstanding if pipelined else 1
+                        )
                     )
                     axi_lite_master = axi_lite_bridge.lite_master
                 else:  # we are in a simulation platform
@@ -45,10 +75,8 @@ class ZynqSocPlatform(SocPlatform):
                         m.d.comb += interconnect.get_port().connect_downstream(connector.axi)
                         m.submodules += connector
                 else:
-                    aggregator = PeripheralsAggregator()
-                    for peripheral in platform.peripherals:
-                        aggregator.add_peripheral(peripheral)
-                    connector = DomainRenamer(self.csr_domain)(AxiLitePeripheralConnector(aggregator))
+                    connector_class = AxiLitePipelinedPeripheralConnector if pipelined else AxiLitePeripheralConnector
+                    connector = DomainRenamer(self.csr_domain)(connector_class(aggregate_peripherals()))
                     m.d.comb += axi_lite_master.connect_downstream(connector.axi)
                     m.submodules.connector = connector
                 platform.to_inject_subfragments.append((m, self.csr_domain))
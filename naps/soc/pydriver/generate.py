@@ -1,6 +1,7 @@
 import re
 from enum import Enum
 from inspect import getsource
+from math import ceil
 from pathlib import Path
 from textwrap import indent, dedent
 
@@ -9,16 +10,86 @@ from nmigen.build import Platform
 
 from .driver_items import DriverMethod, DriverData
 from ..fatbitstream import FatbitstreamContext, File
-from ..memorymap import MemoryMap
+from ..memorymap import MemoryMap, Address
 from ..tracing_elaborate import ElaboratableSames
-from ..csr_types import EventReg, StatusSignal
+from ..csr_types import EventReg, StatusSignal, ControlSignal
 from ...util.py_serialize import py_serialize
 
 
+def register_words(address: Address):
+    """the (absolute) addresses of the bus words the register at the address touches"""
+    return [address.address + 4 * i for i in range(ceil((address.bit_offset + address.bit_len) / 32))]
+
+
+def shadowable_words(rows):
+    """
+    Finds the words that may be shadowed by the driver: words that only contain ControlSignals (which are only ever
+    written by software) and StatusSignals. Words with EventRegs or registers with strobes have side effects on
+    every access and always need to go to the bus.
+    """
+    words, excluded = set(), set()
+    for address, obj in rows:
+        if isinstance(obj, ControlSignal) and obj._read_strobe is None and obj._write_strobe is None:
+            words.update(register_words(address))
+        elif not (isinstance(obj, StatusSignal) and obj._read_strobe is None):
+            excluded.update(register_words(address))
+    return words - excluded
+
+
+def gen_register_property(name, address: Address, decoder, writable, shadowed=False) -> str:
+    """
+    Generates a property with a getter and a setter that access the register at the (absolute) address with all the
+    addresses, shifts and masks already computed. Shadowed registers are accessed through _read_shadowed and
+    _write_shadowed which are backed by the RegisterCache of the HardwareProxy if it is enabled.
+    """
+    bit_start, bit_len = address.bit_offset, address.bit_len
+    mask = (1 << bit_len) - 1
+    words = register_words(address)
+    read, write = ("_read_shadowed", "_write_shadowed") if shadowed else ("_read", "_write")
+
+    def read_word(word):
+        return f"self.{read}(0x{word:02x} - self._base)"
+
+    to_return = ""
+    if decoder is not None:
+        to_return += f"_{name}_decoder = {decoder}\n\n"
+
+    to_return += f"@property\ndef {name}(self):\n"
+    value = " | ".join(read_word(word) + (f" << {32 * i}" if i else "") for i, word in enumerate(words))
+    if len(words) > 1 and bit_start:
+        value = f"({value})"
+    if bit_start:
+        value = f"{value} >> {bit_start}"
+    if bit_len < 32 * len(words) - bit_start:
+        value = f"({value}) & 0x{mask:x}" if bit_start or len(words) > 1 else f"{value} & 0x{mask:x}"
+    if decoder is not None and not (bit_start == 0 and bit_len <= 32):
+        to_return += f"    return self._{name}_decoder[{value}]\n"
+    else:
+        to_return += f"    return {value}\n"
+
+    to_return += f"\n@{name}.setter\ndef {name}(self, value):\n"
+    if not writable:
+        to_return += f"    raise AssertionError(\"cannot write read-only value {name}\")\n"
+        return to_return
+    to_return += f"    assert value < 0x{1 << bit_len:x}, \"you can at maximum assign '{mask}' to a {bit_len} bit value\"\n"
+    for i, word in enumerate(words):
+        shift = bit_start - 32 * i
+        part = "value" if shift == 0 else f"(value << {shift})" if shift > 0 else f"(value >> {-shift})"
+        word_mask = ((mask << bit_start) >> (32 * i)) & 0xffff_ffff
+        if (mask << bit_start) >> (32 * i) > 0xffff_ffff:  # the value continues in the next word
+            part = f"({part} & 0x{word_mask:x})"
+        if word_mask == 0xffff_ffff:  # we own the whole word and do not need to read it first
+            to_return += f"    self.{write}(0x{word:02x} - self._base, {part})\n"
+        else:
+            to_return += f"    self.{write}(0x{word:02x} - self._base, {read_word(word)} & 0x{~word_mask & 0xffff_ffff:x} | {part})\n"
+    return to_return
+
+
 def gen_hardware_proxy_python_code(mmap: MemoryMap, name="design", superclass="", top=True) -> str:
     name = name.lower()
     class_name = ("_" if not top else "") + name.capitalize()
     to_return = "class {}({}):\n".format(class_name, superclass)
+    shadowable = shadowable_words([(mmap.own_offset.translate(row.address), row.obj) for row in mmap.direct_children])
     for row in mmap.direct_children:
         address = mmap.own_offset.translate(row.address)
         if isinstance(row.obj, Signal):
@@ -36,19 +107,14 @@ def gen_hardware_proxy_python_code(mmap: MemoryMap, name="design", superclass=""
                 decoder = None
             else:
                 raise TypeError(f"unknown decoder type {row.obj.decoder.__class__}")
-            writable = True
-            readable = True
-            if isinstance(row.obj, StatusSignal):
-                writable = False
-            rhs = f"Value(0x{address.address:02x}, {address.bit_offset}, {address.bit_len}, {decoder}, {writable}, {readable})"
+            writable = not isinstance(row.obj, StatusSignal)
+            shadowed = isinstance(row.obj, ControlSignal) and shadowable.issuperset(register_words(address))
+            code = gen_register_property(row.name, address, decoder, writable, shadowed)
         elif isinstance(row.obj, EventReg):
-            rhs = f"Value(0x{address.address:02x}, {address.bit_offset}, {address.bit_len}, None, True, True)"
+            code = gen_register_property(row.name, address, None, True)
         else:
-            rhs = f"Blob(0x{address.address:02x}, {address.bit_offset}, {address.bit_len})"
-        to_return += indent(
-            f"{row.name} = {rhs}\n",
-            "    "
-        )
+            code = f"{row.name} = Blob(0x{address.address:02x}, {address.bit_offset}, {address.bit_len})\n"
+        to_return += indent(code + "\n", "    ")
     init_function_seen = False
     for name, item in mmap.driver_items.items():
         if isinstance(item, DriverMethod):
@@ -0,0 +1,169 @@
+import unittest
+from pathlib import Path
+
+from naps import ControlSignal, StatusSignal, EventReg
+from naps.soc.memorymap import MemoryMap, Address
+from naps.soc.pydriver.generate import gen_hardware_proxy_python_code
+
+
+class DictAccessor:
+    base = 0x4000_0000
+
+    def __init__(self):
+        self.words = {}
+        self.reads = 0
+        self.writes = 0
+        self.written = []
+
+    def read(self, addr):
+        self.reads += 1
+        return self.words.get(addr, 0)
+
+    def write(self, addr, value):
+        assert 0 <= value < 2 ** 32
+        self.writes += 1
+        self.words[addr] = value
+        self.written.append(addr)
+
+
+class GeneratedHardwareProxyTest(unittest.TestCase):
+    def make_design(self):
+        memorymap = MemoryMap(top=True)
+        memorymap.allocate("low", True, address=Address(0x0, 0, 8), obj=ControlSignal(8))
+        memorymap.allocate("high", True, address=Address(0x0, 8, 4), obj=ControlSignal(4))
+        memorymap.allocate("straddling", True, address=Address(0x4, 4, 40), obj=ControlSignal(40))
+        memorymap.allocate("status", False, address=Address(0xc, 0, 32), obj=StatusSignal(32))
+        memorymap.allocate("wide", True, address=Address(0x10, 0, 64), obj=ControlSignal(64))
+        memorymap.allocate("mixed_control", True, address=Address(0x18, 0, 8), obj=ControlSignal(8))
+        memorymap.allocate("mixed_status", False, address=Address(0x18, 8, 8), obj=StatusSignal(8))
+        memorymap.allocate("event", True, address=Address(0x1c, 0, 8), obj=EventReg(8))
+        memorymap.allocate("event_neighbour", True, address=Address(0x1c, 8, 8), obj=ControlSignal(8))
+        memorymap.allocate("blob", True, address=Address(0x40, 0, 128), obj=None)
+        sub = MemoryMap()
+        sub.allocate("inner", True, address=Address(0x0, 16, 16), obj=ControlSignal(16))
+        memorymap.allocate_subrange(sub, "sub", place_at=Address(0x20, 0))
+        memorymap.place_at = Address(0x4000_0000, 0)
+        memorymap.freeze()
+
+        code = (Path(__file__).parent / "hardware_proxy.py").read_text()
+        code += gen_hardware_proxy_python_code(memorymap, superclass="HardwareProxy")
+        g = {}
+        exec(code, g, g)
+        accessor = DictAccessor()
+        return g["Design"](accessor), accessor
+
+    def test_fields(self):
+        design, accessor = self.make_design()
+        design.low = 0xab
+        design.high = 0x5
+        self.assertEqual(accessor.words[0x0], 0x5ab)
+        self.assertEqual((design.low, design.high), (0xab, 0x5))
+
+        design.straddling = 0xab_1234_5678
+        self.assertEqual(accessor.words[0x4], 0x2345_6780)
+        self.assertEqual(accessor.words[0x8], 0xab1)
+        self.assertEqual(design.straddling, 0xab_1234_5678)
+
+        design.sub.inner = 0xbeef
+        self.assertEqual(accessor.words[0x20], 0xbeef_0000)
+        self.assertEqual(design.sub.inner, 0xbeef)
+
+        accessor.words[0xc] = 42
+        self.assertEqual(design.status, 42)
+        with self.assertRaises(AssertionError):
+            design.status = 1
+        with self.assertRaises(AssertionError):
+            design.high = 0x10
+
+        # misspelled registers and blobs cannot be assigned
+        with self.assertRaises(AttributeError):
+            design.hihg = 1
+        with self.assertRaises(AttributeError):
+            design.sub.iner = 1
+        with self.assertRaises(AttributeError):
+            design.blob = 1
+        self.assertEqual(design.blob.address, 0x4000_0040)
+
+    def test_access_counts(self):
+        design, accessor = self.make_design()
+        accessor.words[0x0] = 0xffff_ffff
+        design.low = 0
+        self.assertEqual((accessor.reads, accessor.writes), (1, 1))
+        self.assertEqual(accessor.words[0x0], 0xffff_ff00)
+
+        # whole words are written without reading them first
+        design.wide = 0x1_0000_0002
+        self.assertEqual((accessor.reads, accessor.writes), (1, 3))
+        self.assertEqual((accessor.words[0x10], accessor.words[0x14]), (2, 1))
+        self.assertEqual(design.wide, 0x1_0000_0002)
+        self.assertEqual(accessor.reads, 3)
+
+    def test_shadow_registers(self):
+        design, accessor = self.make_design()
+        design.shadow_registers()
+        design.low = 1
+        design.high = 2
+        design.low = 3
+        self.assertEqual((accessor.reads, accessor.writes), (1, 3))
+        self.assertEqual((design.low, design.high), (3, 2))
+        self.assertEqual(accessor.reads, 1)
+
+        # status signals are always read from the bus, even if they share a word with a shadowed control signal
+        accessor.words[0x18] = 0x4200
+        self.assertEqual(design.mixed_status, 0x42)
+        self.assertEqual(accessor.reads, 2)
+        design.mixed_control = 1
+        self.assertEqual(design.mixed_control, 1)
+        self.assertEqual(accessor.reads, 3)
+
+        # words with event registers are never shadowed
+        design.event_neighbour = 1
+        design.event_neighbour = 2
+        self.assertEqual(accessor.reads, 5)
+
+        # the shadow copies are forgotten when they are disabled
+        design.shadow_registers(False)
+        accessor.words[0x0] = 0
+        self.assertEqual(design.low, 0)
+
+    def test_batch(self):
+        design, accessor = self.make_design()
+        with design.batch():
+            design.low = 0xab
+            design.high = 0x5
+            design.sub.inner = 0xbeef
+            design.straddling = 0xab_1234_5678
+            design.low = 0xcd
+            self.assertEqual(design.low, 0xcd)
+            self.assertEqual(accessor.writes, 0)
+        self.assertEqual(accessor.words[0x0], 0x5cd)
+        self.assertEqual(accessor.words[0x4], 0x2345_6780)
+        self.assertEqual(accessor.words[0x8], 0xab1)
+        self.assertEqual(accessor.words[0x20], 0xbeef_0000)
+        self.assertEqual((accessor.reads, accessor.writes), (4, 4))
+        # in the order in which the words were first changed
+        self.assertEqual(accessor.written, [0x0, 0x20, 0x4, 0x8])
+
+        # writes to words that are not shadowed flush the held back words first
+        accessor.written = []
+        with design.batch():
+            design.low = 1
+            design.high = 2
+            design.event_neighbour = 2
+            self.assertEqual(accessor.written, [0x0, 0x1c])
+            design.low = 3
+        self.assertEqual(accessor.written, [0x0, 0x1c, 0x0])
+        self.assertEqual(accessor.words[0x0], 0x203)
+
+        # outside of the batch the registers are accessed on the bus again
+        accessor.words[0x0] = 0
+        self.assertEqual(design.low, 0)
+
+        # nested batches are written when the outermost one is left. writes before an exception are not lost.
+        with self.assertRaises(ValueError):
+            with design.batch():
+                with design.batch():
+                    design.low = 1
+                self.assertEqual(accessor.words[0x0], 0)
+                raise ValueError()
+        self.assertEqual(accessor.words[0x0], 1)
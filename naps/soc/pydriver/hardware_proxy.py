@@ -1,11 +1,14 @@
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from dataclasses import dataclass
 from textwrap import indent
-from math import ceil
 from inspect import stack
 
 
 class MemoryAccessor(ABC):
+    # the interface of the memory accessors. the accessors of the platforms do not inherit from this class (their code
+    # is also used outside of the pydriver) so users of the optional read_block / write_block methods have to fall back
+    # to read / write if they are missing.
     base = 0
 
     @abstractmethod
@@ -16,6 +19,16 @@ class MemoryAccessor(ABC):
     def write(self, addr, value):
         raise NotImplementedError()
 
+    def read_block(self, addr, n_words):
+        """reads n_words consecutive words starting at addr into a numpy array"""
+        import numpy as np
+        return np.array([self.read(addr + 4 * i) for i in range(n_words)], dtype=np.uint32)
+
+    def write_block(self, addr, array):
+        """writes all the words of the array to consecutive words starting at addr"""
+        for i, value in enumerate(array):
+            self.write(addr + 4 * i, int(value))
+
 
 class BitwiseAccessibleInteger:
     def __init__(self, value=0):
@@ -51,103 +64,148 @@ class BitwiseAccessibleInteger:
 
 
 @dataclass
-class Value:
-    """Represents a Value that is automatically converted to / from an Integer"""
+class Blob:
+    """Represents bigger address chunks that are not useful to express as BitwiseAccessibleInteger"""
     address: int
     bit_start: int
     bit_len: int
-    decoder: dict
-    writable: bool
-    readable: bool
-    bit_mask: int = None
-    word_aligned_inverse_bit_mask: int = None
 
-    def __post_init__(self):
-        self.bit_mask = (2**self.bit_len - 1) << self.bit_start
-        num_words = (self.bit_start + self.bit_len + 31) // 32
-        self.word_aligned_inverse_bit_mask = (2**(num_words * 32) - 1) ^ self.bit_mask
 
+_missing = object()
 
-@dataclass
-class Blob:
-    """Represents bigger address chunks that are not useful to express as BitwiseAccessibleInteger"""
-    address: int
-    bit_start: int
-    bit_len: int
 
+class RegisterCache:
+    """
+    Shadow copies of the words that only hold ControlSignals. These are only ever written by software so their
+    value can be remembered instead of reading it back over the bus. While a batch is running, the writes are held
+    back and coalesced into one bus write per word. Writes to words that are not shadowed first flush the held back
+    words so that the hardware sees the writes in the order of the program.
+    """
 
-class HardwareProxy:
-    # TODO: test bit fiddeling
     def __init__(self, memory_accessor: MemoryAccessor):
-        object.__setattr__(self, "_memory_accessor", memory_accessor)
+        self.memory_accessor = memory_accessor
+        self.proxies = []
+        self.enabled = False
+        self.batch_depth = 0
+        self.words = {}
+        self.pending = {}
+
+    @property
+    def active(self):
+        return self.enabled or self.batch_depth > 0
+
+    def read(self, addr):
+        if addr not in self.words:
+            self.words[addr] = self.memory_accessor.read(addr)
+        return self.words[addr]
+
+    def write(self, addr, value):
+        self.words[addr] = value
+        if self.batch_depth > 0:
+            self.pending[addr] = value
+        else:
+            self.memory_accessor.write(addr, value)
+
+    def write_through(self, addr, value):
+        self.flush()
+        self.memory_accessor.write(addr, value)
+
+    def flush(self):
+        """writes the pending words one by one in the order in which they were first written"""
+        pending, self.pending = self.pending, {}
+        for addr, value in pending.items():
+            self.memory_accessor.write(addr, value)
+
+    def update(self):
+        if not self.active:
+            # the words are not kept up to date while the cache is inactive
+            self.words = {}
+        for proxy in self.proxies:
+            proxy._bind_shadowed()
+
+
+class HardwareProxy:
+    # the registers are generated as properties with precomputed addresses, shifts and masks (see generate.py).
+    # they access the memory through the _read, _write and _base attributes to keep the overhead of every access low.
+    # ControlSignals that can be shadowed use _read_shadowed and _write_shadowed which point to the RegisterCache
+    # while it is active and to the plain accessor methods otherwise. during a batch _write flushes the held back
+    # words before it writes.
+    def __init__(self, memory_accessor: MemoryAccessor, register_cache: RegisterCache = None):
+        self._memory_accessor = memory_accessor
+        self._read = memory_accessor.read
+        self._write = memory_accessor.write
+        self._base = memory_accessor.base
+        self._register_cache = RegisterCache(memory_accessor) if register_cache is None else register_cache
+        self._register_cache.proxies.append(self)
+        self._bind_shadowed()
         for k, v in self.__class__.__dict__.items():
             if isinstance(v, type) and issubclass(v, HardwareProxy):
-                object.__setattr__(self, k[1:].lower(), v(memory_accessor))
+                object.__setattr__(self, k[1:].lower(), v(memory_accessor, self._register_cache))
         if hasattr(self, 'init_function'):
             self.init_function()
 
-    def __getattribute__(self, name):
-        obj = object.__getattribute__(self, name)
-
-        if isinstance(obj, Value):
-            memory_accessor = object.__getattribute__(self, "_memory_accessor")
-
-            assert obj.readable, f"cannot read write-only value {name}"
-            # fast path if the value is easy to handle
-            if obj.bit_start == 0 and obj.bit_len <= 32:
-                return memory_accessor.read(obj.address - memory_accessor.base) & obj.bit_mask
-
-            to_return = BitwiseAccessibleInteger()
-            read_bytes = ceil((obj.bit_start + obj.bit_len) / 32)
-            for i in range(read_bytes):
-                val = BitwiseAccessibleInteger(memory_accessor.read(obj.address - memory_accessor.base + (i * 4)))
-                to_return[i * 32:(i + 1) * 32] = val[obj.bit_start if i == 0 else 0:(32 if i != read_bytes - 1 else (obj.bit_len + obj.bit_start) % 32)]
-            to_return = int(to_return)
-            if obj.decoder is not None:
-                to_return = obj.decoder[to_return]
-            return to_return
-        else:
-            return obj
-
     def __setattr__(self, name, value):
-        if name.startswith("__"):
-            return object.__setattr__(self, name, value)
+        # unknown names are rejected so that e.g. a misspelled register does not silently end up as an instance
+        # attribute. the registers are properties of the class and pass this check right away.
+        attr = getattr(type(self), name, _missing)
+        if isinstance(attr, Blob):
+            raise AttributeError("cannot assign to the blob '{}'".format(name))
+        if attr is _missing and not name.startswith("_") and name not in self.__dict__:
+            raise AttributeError("'{}' has no register or attribute '{}'".format(type(self).__name__, name))
+        object.__setattr__(self, name, value)
+
+    def _bind_shadowed(self):
+        if self._register_cache.batch_depth > 0:
+            self._write = self._register_cache.write_through
+        else:
+            self._write = self._memory_accessor.write
+        if self._register_cache.active:
+            self._read_shadowed = self._register_cache.read
+            self._write_shadowed = self._register_cache.write
         else:
-            obj = object.__getattribute__(self, name)
-
-            if not isinstance(obj, (Value, Blob)):
-                return object.__setattr__(self, name, value)
-            elif isinstance(obj, Value):
-                assert obj.writable, f"cannot write read-only value {name}"
-
-                memory_accessor = object.__getattribute__(self, "_memory_accessor")
-                assert value < 2 ** obj.bit_len, "you can at maximum assign '{}' to a {} bit value".format((2 ** obj.bit_len - 1), obj.bit_len)
-            
-                # fast path if the value is easy to handle
-                if obj.bit_start == 0 and obj.bit_len <= 32:
-                    old = memory_accessor.read(obj.address - memory_accessor.base)
-                    memory_accessor.write(obj.address - memory_accessor.base, old & obj.word_aligned_inverse_bit_mask | value)
-                    return
-
-                v = BitwiseAccessibleInteger(value)
-                read_bytes = ceil((obj.bit_start + obj.bit_len) / 32)
-                for i in range(read_bytes):
-                    prev_value = BitwiseAccessibleInteger(memory_accessor.read(obj.address - memory_accessor.base + (i * 4)))
-                    prev_value[obj.bit_start if i == 0 else 0:(32 if i != read_bytes - 1 else (obj.bit_len + obj.bit_start) % 32)] = v[i * 32:(i + 1) * 32]
-                    memory_accessor.write(
-                        obj.address - memory_accessor.base + (i * 4),
-                        int(prev_value)
-                    )
+            self._read_shadowed = self._read
+            self._write_shadowed = self._memory_accessor.write
+
+    def shadow_registers(self, enabled=True):
+        """
+        Enables (or disables) the shadow copies of the ControlSignals of the whole design. Reads of them are answered
+        from the shadow copy, so changing a field that shares its word with others costs a single bus write.
+        StatusSignals and EventRegs are always accessed on the bus.
+        Only use this if nothing but this driver writes the registers (e.g. no reset of the fpga in between).
+        """
+        self._register_cache.enabled = enabled
+        self._register_cache.update()
+
+    @contextmanager
+    def batch(self):
+        """
+        Holds back the writes to the words of the design that only hold ControlSignals inside the with block and
+        writes every changed word once when the (outermost) block is left. Reads inside the block see the held back
+        values. The words are written in the order in which they were first changed.
+        Writes to other words (e.g. ControlSignals next to an EventReg or a StatusSignal) are not held back. They
+        first write the held back words, so e.g. a strobe after a configuration still reaches the hardware last.
+        If the block raises, the words that were changed before the exception are still written (just like without
+        the batch), so the hardware might end up with a partial configuration.
+        """
+        cache = self._register_cache
+        cache.batch_depth += 1
+        if cache.batch_depth == 1:
+            cache.update()
+        try:
+            yield self
+        finally:
+            cache.batch_depth -= 1
+            if cache.batch_depth == 0:
+                cache.flush()
+                cache.update()
 
     def __repr__(self, allow_recursive=False):
         if stack()[1].filename == "<console>" or allow_recursive:
             to_return = ""
-            children = [(name, object.__getattribute__(self, name)) for name in dir(self) if not name.startswith("_")]
-            real_children = [(name, child) for name, child in children if not isinstance(child, HardwareProxy)]
-            proxy_children = [(name, child) for name, child in children if isinstance(child, HardwareProxy)]
-            for name, child in real_children:
-                if type(child) == Value:
-                    to_return += "{}: {}\n".format(name, getattr(self, name))
+            names = [name for name in dir(self) if not name.startswith("_")]
+            proxy_children = [(name, self.__dict__[name]) for name in names
+                              if isinstance(self.__dict__.get(name), HardwareProxy)]
+            for name in names:
                 if type(getattr(self.__class__, name, None)) == property:
                     to_return += "{}: {}\n".format(name, getattr(self, name))
             for name, child in proxy_children:
@@ -3,12 +3,21 @@ from abc import ABC
 from .hooks import csr_and_driver_item_hook, address_assignment_hook, peripherals_collect_hook
 from .pydriver.generate import pydriver_hook
 from .tracing_elaborate import fragment_get_with_elaboratable_trace
+from ..util.profiler import profile_section
 
 __all__ = ["SocPlatform", "soc_platform_name"]
 
 
+def _count_fragments(fragment):
+    return 1 + sum(_count_fragments(subfragment) for subfragment, name in fragment.subfragments)
+
+
 class SocPlatform(ABC):
     base_address = None
+    # register the read mux of the csr banks (costs one cycle of latency but helps timing for big banks)
+    pipelined_csr_read = False
+    # register stages between the address decoder of the peripherals aggregator and the peripherals
+    peripherals_decoder_pipeline_stages = 0
     _wrapped_platform = None
 
     # we build a new type that combines the soc and the real platform class
@@ -36,11 +45,13 @@ class SocPlatform(ABC):
     # we override the prepare method of the real platform to be able to inject stuff into the design
     def prepare_soc(self, elaboratable):
         print("# ELABORATING MAIN DESIGN")
-        top_fragment, sames = fragment_get_with_elaboratable_trace(elaboratable, self)
+        with profile_section("main design", "elaboration"):
+            top_fragment, sames = fragment_get_with_elaboratable_trace(elaboratable, self, name="top")
 
         def inject_subfragments(top_fragment, sames, to_inject_subfragments):
             for elaboratable, name in to_inject_subfragments:
-                fragment, fragment_sames = fragment_get_with_elaboratable_trace(elaboratable, self, sames)
+                with profile_section("inject {}".format(name), "elaboration"):
+                    fragment, fragment_sames = fragment_get_with_elaboratable_trace(elaboratable, self, sames, name)
                 print("<- injecting fragment '{}'".format(name))
                 top_fragment.add_subfragment(fragment, name)
             self.to_inject_subfragments = []
@@ -49,7 +60,11 @@ class SocPlatform(ABC):
         inject_subfragments(top_fragment, sames, self.to_inject_subfragments)
         for hook in self.prepare_hooks:
             print("-> running {}".format(hook.__name__))
-            hook(self, top_fragment, sames)
+            with profile_section(hook.__name__, "hook") as node:
+                hook(self, top_fragment, sames)
+            if node is not None:
+                node["fragments"] = _count_fragments(top_fragment)
+                node["injected_fragments"] = len(self.to_inject_subfragments)
             inject_subfragments(top_fragment, sames, self.to_inject_subfragments)
 
         print("\ninjecting final fragments")
@@ -4,37 +4,79 @@ from nmigen import *
 from nmigen.compat import Module as CompatModule
 from nmigen.hdl.xfrm import TransformedElaboratable
 
+from ..util.profiler import current_profiler
+
+
+def _is_module(obj):
+    return isinstance(obj, Module)
+
+
+def _is_elaboratable(obj):
+    return isinstance(obj, Elaboratable) and not isinstance(obj, (Module, TransformedElaboratable))
+
 
 class ElaboratableSames:
     def __init__(self):
-        self.sames = []
+        """
+        The equivalence classes of objects that are "the same" thing in the design (an elaboratable, the Module it
+        elaborated to, the transformed versions of that, ...). Backed by an identity keyed union-find.
+        """
+        self._parent = {}  # id -> id of the parent in the union-find forest
+        self._objects = {}  # id -> object; this also keeps the objects alive so that their ids stay unique
+        self._rows = {}  # id of a root -> all objects of its class
+        # per class indexes of the objects that get_module() and get_elaboratable() look for
+        self._modules = {}
+        self._elaboratables = {}
+
+    @property
+    def sames(self):
+        return list(self._rows.values())
+
+    def _add(self, obj):
+        key = id(obj)
+        if key not in self._parent:
+            self._parent[key] = key
+            self._objects[key] = obj
+            self._rows[key] = [obj]
+            self._modules[key] = [obj] if _is_module(obj) else []
+            self._elaboratables[key] = [obj] if _is_elaboratable(obj) else []
+
+    def _find(self, key):
+        parent = self._parent
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]  # path halving
+            key = parent[key]
+        return key
 
     def insert(self, a, b):
-        for row in self.sames:
-            if a in row and b not in row:
-                row.append(b)
-                return
-            elif b in row and a not in row:
-                row.append(a)
-                return
-            elif b in row and a in row:
-                return
-        self.sames.append([a, b])
+        self._add(a)
+        self._add(b)
+        root_a, root_b = self._find(id(a)), self._find(id(b))
+        if root_a == root_b:
+            return
+        if len(self._rows[root_a]) < len(self._rows[root_b]):
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        for index in (self._rows, self._modules, self._elaboratables):
+            index[root_a] += index.pop(root_b)
+
+    def _root(self, something):
+        key = id(something)
+        if key not in self._parent:
+            raise AssertionError()
+        return self._find(key)
 
     def get_row(self, something):
-        candidates = list(row for row in self.sames if something in row)
-        if len(candidates) == 0:
-            raise AssertionError()
-        if len(candidates) != 1:
-            raise AssertionError()
-        return candidates[0]
+        return self._rows[self._root(something)]
 
     def get_by_filter(self, something, item_filter):
         if isinstance(something, Instance):
             return None
-        if self.get_row(something) is None:
-            return None
         candidates = list(item for item in self.get_row(something) if item_filter(item))
+        return self._single(candidates)
+
+    @staticmethod
+    def _single(candidates):
         if len(candidates) == 0:
             return None
         if len(candidates) > 1:
@@ -42,22 +84,37 @@ class ElaboratableSames:
         return candidates[0]
 
     def get_module(self, something):
-        return self.get_by_filter(something, lambda x: isinstance(x, Module))
+        if isinstance(something, Instance):
+            return None
+        return self._single(self._modules[self._root(something)])
 
     def get_elaboratable(self, something):
-        return self.get_by_filter(
-            something, lambda x: isinstance(x, Elaboratable)
-                                 and not isinstance(x, Module)
-                                 and not isinstance(x, TransformedElaboratable)
-        )
+        if isinstance(something, Instance):
+            return None
+        return self._single(self._elaboratables[self._root(something)])
+
+
+def _profiled_elaborate(real_elaborate, obj, platform, name):
+    profiler = current_profiler()
+    if profiler is None:
+        return real_elaborate(platform)
+    # the elaboration of whatever an elaborate() call returned (e.g. a Module) is accounted to the original elaboratable
+    node = profiler.continuation(obj)
+    if node is None:
+        node = profiler.child(name or obj.__class__.__name__, "elaborate", **{"class": obj.__class__.__name__})
+    with profiler.measure(node):
+        elaborated = real_elaborate(platform)
+    if hasattr(elaborated, 'elaborate') and not isinstance(elaborated, Fragment):
+        profiler.continue_with(elaborated, node)
+    return elaborated
 
 
-def inject_elaborate_wrapper(obj, sames):
+def inject_elaborate_wrapper(obj, sames, name=None):
     if hasattr(obj, 'elaborate') and not isinstance(obj, Fragment):
 
         def generate_elaborate_wrapper(real_elaborate):
             def elaborate_wrapper(self, platform):
-                elaborated = real_elaborate(platform)
+                elaborated = _profiled_elaborate(real_elaborate, self, platform, name)
                 # print("{} ({}) elaborated to {} ({})".format(
                 #     self.__class__.__name__, self,
                 #     elaborated.__class__.__name__, elaborated
@@ -73,13 +130,13 @@ def inject_elaborate_wrapper(obj, sames):
             raise AssertionError()
 
     if isinstance(obj, Module):
-        submodules = [*obj._named_submodules.values(), *obj._anon_submodules]
-        for elab in submodules:
-            inject_elaborate_wrapper(elab, sames)
+        submodules = [*obj._named_submodules.items(), *((None, submod) for submod in obj._anon_submodules)]
+        for submodule_name, elab in submodules:
+            inject_elaborate_wrapper(elab, sames, submodule_name)
     elif isinstance(obj, CompatModule):
-        submodules = [submod for name, submod in obj.submodules._cm._submodules]
-        for elab in submodules:
-            inject_elaborate_wrapper(elab, sames)
+        submodules = list(obj.submodules._cm._submodules)
+        for submodule_name, elab in submodules:
+            inject_elaborate_wrapper(elab, sames, submodule_name)
     elif isinstance(obj, TransformedElaboratable):
         inject_elaborate_wrapper(obj._elaboratable_, sames)
         for i in range(len(obj._transforms_)):
@@ -106,12 +163,12 @@ def inject_elaborate_wrapper(obj, sames):
             raise AssertionError()
 
 
-def fragment_get_with_elaboratable_trace(elaboratable, platform, sames=None):
+def fragment_get_with_elaboratable_trace(elaboratable, platform, sames=None, name=None):
     # this is a hack to retrieve the elaboratable which produced a specific module
     if sames is None:
         sames = ElaboratableSames()
 
-    inject_elaborate_wrapper(elaboratable, sames)
+    inject_elaborate_wrapper(elaboratable, sames, name)
     fragment = Fragment.get(elaboratable, platform)
 
     return fragment, sames
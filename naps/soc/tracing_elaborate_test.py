@@ -0,0 +1,54 @@
+import unittest
+
+from nmigen import *
+
+from naps import SimPlatform
+from .tracing_elaborate import ElaboratableSames, fragment_get_with_elaboratable_trace
+
+
+class Counter(Elaboratable):
+    def __init__(self):
+        self.counter = Signal(8)
+
+    def elaborate(self, platform):
+        m = Module()
+        m.d.sync += self.counter.eq(self.counter + 1)
+        return m
+
+
+class Top(Elaboratable):
+    def __init__(self):
+        self.plain = Counter()
+        self.renamed = Counter()
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.plain = self.plain
+        m.submodules.renamed = ResetInserter(Signal())(DomainRenamer("other")(self.renamed))
+        return m
+
+
+class ElaboratableSamesTest(unittest.TestCase):
+    def test_union(self):
+        sames = ElaboratableSames()
+        a, b, c, d = object(), object(), object(), object()
+        sames.insert(a, b)
+        sames.insert(c, d)
+        self.assertEqual(len(sames.sames), 2)
+        sames.insert(d, a)
+        self.assertEqual(len(sames.sames), 1)
+        self.assertEqual({id(x) for x in sames.get_row(b)}, {id(x) for x in [a, b, c, d]})
+        with self.assertRaises(AssertionError):
+            sames.get_row(object())
+
+    def test_trace(self):
+        top = Top()
+        fragment, sames = fragment_get_with_elaboratable_trace(top, SimPlatform())
+        self.assertIs(sames.get_elaboratable(fragment), top)
+        self.assertIsInstance(sames.get_module(fragment), Module)
+
+        subfragments = dict((name, f) for f, name in fragment.subfragments)
+        self.assertIs(sames.get_elaboratable(subfragments["plain"]), top.plain)
+        # the transformed fragment is the same as the wrapped elaboratable
+        self.assertIs(sames.get_elaboratable(subfragments["renamed"]), top.renamed)
+        self.assertIs(sames.get_by_filter(subfragments["renamed"], lambda x: x is top.renamed), top.renamed)
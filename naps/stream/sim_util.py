@@ -1,9 +1,16 @@
+from collections import deque
+from itertools import repeat
+from random import Random
 from typing import Iterable
 
+import numpy as np
+from nmigen.sim import Passive
+
 from . import Stream, PacketizedStream
 from naps.util.sim import wait_for, do_nothing
 
-__all__ = ["write_to_stream", "read_from_stream", "read_packet_from_stream", "write_packet_to_stream"]
+__all__ = ["write_to_stream", "read_from_stream", "read_packet_from_stream", "write_packet_to_stream",
+           "StreamSource", "StreamSink", "always_ready", "random_ready", "bursty_ready"]
 
 
 def write_to_stream(stream: Stream, timeout=100, **kwargs):
@@ -43,9 +50,202 @@ def read_packet_from_stream(stream: PacketizedStream, timeout=100, allow_pause=T
     packet = []
     first = True
     while True:
-        payload, last = yield from read_from_stream(stream, extract=("payload", "last"), timeout=timeout if (first or allow_pause) else 1)
-        yield from do_nothing(pause_after_word)
+        yield stream.ready.eq(1)
+        current_timeout = timeout if (first or allow_pause) else 1
+        waited = 0
+        while True:  # this is an inlined version of wait_for() to avoid the generator overhead per word
+            yield
+            if (yield stream.valid):
+                break
+            waited += 1
+            if current_timeout != -1 and waited >= current_timeout:
+                raise TimeoutError("{} did not become '1' within {} cycles".format(stream.valid, current_timeout))
+        packet.append((yield stream.payload))
+        last = (yield stream.last)
+        if pause_after_word:
+            yield stream.ready.eq(0)
+            for _ in range(pause_after_word):
+                yield
         first = False
-        packet.append(payload)
         if last:
+            yield stream.ready.eq(0)
             return packet
+
+
+# backpressure profiles are infinite iterators of booleans that decide in every cycle if a StreamSource may offer a
+# new word / a StreamSink is ready to accept a word
+def always_ready():
+    return repeat(True)
+
+
+def random_ready(probability=0.5, seed=0):
+    random = Random(seed)
+    while True:
+        yield random.random() < probability
+
+
+def bursty_ready(burst_length=16, pause_length=4):
+    while True:
+        for _ in range(burst_length):
+            yield True
+        for _ in range(pause_length):
+            yield False
+
+
+def _to_array(signal, values):
+    return np.array(values, dtype=np.int64 if len(signal) < 64 else object)
+
+
+class StreamSource:
+    def __init__(self, platform, stream: Stream, domain="sync", profile=None):
+        """
+        Drives a stream from a single long living simulation process with data that is queued as whole numpy arrays.
+        valid stays asserted for back to back words as long as the profile allows it.
+
+        :param platform: the SimPlatform to which the driver process is added
+        :param stream: the stream to drive
+        :param profile: an iterator of booleans that decides whether a new word is offered in a given cycle.
+                        defaults to always_ready()
+        """
+        self.stream = stream
+        self.profile = profile if profile is not None else always_ready()
+        self._queue = deque()
+        self._in_flight = False
+        platform.add_process(self._process, domain)
+
+    def write(self, data):
+        """
+        Queue data for transmission.
+        :param data: either an array of payloads or a dict of field name -> array for also setting out of band signals
+        """
+        if not isinstance(data, dict):
+            data = {"payload": data}
+        columns = [(self.stream[k], np.asarray(v).tolist()) for k, v in data.items()]
+        lengths = set(len(column) for _, column in columns)
+        assert len(lengths) == 1, "all fields must have the same length"
+        length, = lengths
+        for i in range(length):
+            self._queue.append([(signal, column[i]) for signal, column in columns])
+
+    def write_packet(self, payload):
+        """Queue a packet. last is asserted with the last word."""
+        payload = np.asarray(payload)
+        assert len(payload) > 0, "a packet must contain at least one word"
+        last = np.zeros(len(payload), dtype=np.int64)
+        last[-1] = 1
+        self.write({"payload": payload, "last": last})
+
+    @property
+    def done(self):
+        return not self._queue and not self._in_flight
+
+    def wait_done(self, timeout=-1):
+        """Wait until all queued words were accepted by the stream sink."""
+        waited = 0
+        while not self.done:
+            if timeout != -1 and waited >= timeout:
+                raise TimeoutError("{} did not accept all queued words within {} cycles".format(self.stream, timeout))
+            waited += 1
+            yield
+
+    def _process(self):
+        yield Passive()
+        stream = self.stream
+        profile = iter(self.profile)
+        valid = False
+        while True:
+            if not self._in_flight and self._queue and next(profile):
+                for signal, value in self._queue.popleft():
+                    yield signal.eq(value)
+                self._in_flight = True
+            if valid != self._in_flight:
+                valid = self._in_flight
+                yield stream.valid.eq(valid)
+            yield
+            if valid and (yield stream.ready):
+                self._in_flight = False
+
+
+class StreamSink:
+    def __init__(self, platform, stream: Stream, domain="sync", profile=None):
+        """
+        Captures every word of a stream from a single long living simulation process. Captured data can be
+        retrieved as whole numpy arrays.
+
+        :param platform: the SimPlatform to which the driver process is added
+        :param stream: the stream to capture
+        :param profile: an iterator of booleans that decides whether ready is asserted in a given cycle.
+                        defaults to always_ready()
+        """
+        self.stream = stream
+        self.profile = profile if profile is not None else always_ready()
+        self._columns = {name: [] for name in stream.payload_signals.keys()}
+        self._read_pointer = 0
+        platform.add_process(self._process, domain)
+
+    def __len__(self):
+        return len(next(iter(self._columns.values()))) - self._read_pointer
+
+    def _extract(self, extract, start, stop):
+        def column(name):
+            return _to_array(self.stream[name], self._columns[name][start:stop])
+
+        if isinstance(extract, str):
+            return column(extract)
+        elif isinstance(extract, Iterable):
+            return {name: column(name) for name in extract}
+        else:
+            raise TypeError("extract must be either a string or an iterable of strings")
+
+    def _wait_for_words(self, n, timeout):
+        waited = 0
+        last_len = len(self)
+        while len(self) < n:
+            if len(self) != last_len:
+                last_len = len(self)
+                waited = 0
+            if timeout != -1 and waited >= timeout:
+                raise TimeoutError("{} did not deliver {} words (got {})".format(self.stream, n, len(self)))
+            waited += 1
+            yield
+
+    def read(self, n, extract="payload", timeout=100):
+        """
+        Wait until n words are captured and consume them.
+        :param extract: either the name of a field (returns an array) or an iterable of field names (returns a dict)
+        :param timeout: the number of cycles without a new word after which a TimeoutError is raised. -1 to disable.
+        """
+        yield from self._wait_for_words(n, timeout)
+        start = self._read_pointer
+        self._read_pointer += n
+        return self._extract(extract, start, self._read_pointer)
+
+    def read_packet(self, extract="payload", timeout=100):
+        """Wait until a word with last set is captured and consume all words up to and including it."""
+        last = self._columns["last"]
+        end = self._read_pointer
+        while True:
+            while end < len(last):
+                if last[end]:
+                    return (yield from self.read(end - self._read_pointer + 1, extract, timeout))
+                end += 1
+            yield from self._wait_for_words(end - self._read_pointer + 1, timeout)
+
+    def captured(self, extract="payload"):
+        """Return everything that was captured until now (including already consumed words)."""
+        return self._extract(extract, 0, None)
+
+    def _process(self):
+        yield Passive()
+        stream = self.stream
+        signals = [(self.stream[name], column) for name, column in self._columns.items()]
+        profile = iter(self.profile)
+        ready = False
+        while True:
+            if next(profile) != ready:
+                ready = not ready
+                yield stream.ready.eq(ready)
+            yield
+            if ready and (yield stream.valid):
+                for signal, column in signals:
+                    column.append((yield signal))
@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+
+from naps import SimPlatform
+from naps.cores.stream import BufferedSyncStreamFIFO
+from naps.stream import BasicStream, PacketizedStream, read_packet_from_stream
+from .sim_util import StreamSource, StreamSink, random_ready, bursty_ready
+
+
+class TestStreamSimUtil(unittest.TestCase):
+    def check_source_sink(self, source_profile, sink_profile):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+
+        input = BasicStream(32)
+        fifo = BufferedSyncStreamFIFO(input, 16)
+        source = StreamSource(platform, input, profile=source_profile)
+        sink = StreamSink(platform, fifo.output, profile=sink_profile)
+
+        data = np.arange(1000, dtype=np.uint32) * 3
+
+        def testbench():
+            source.write(data)
+            yield from source.wait_done(timeout=10000)
+            read = yield from sink.read(len(data), timeout=100)
+            np.testing.assert_array_equal(read, data)
+
+        platform.add_process(testbench, "sync")
+        platform.sim(fifo)
+
+    def test_always_ready(self):
+        self.check_source_sink(None, None)
+
+    def test_random_backpressure(self):
+        self.check_source_sink(random_ready(0.7, seed=0), random_ready(0.3, seed=1))
+
+    def test_bursty_backpressure(self):
+        self.check_source_sink(bursty_ready(5, 3), bursty_ready(7, 11))
+
+    def test_packets(self):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+
+        input = PacketizedStream(16)
+        fifo = BufferedSyncStreamFIFO(input, 16)
+        source = StreamSource(platform, input, profile=random_ready(0.5))
+        sink = StreamSink(platform, fifo.output, profile=random_ready(0.5, seed=1))
+
+        packets = [np.arange(length, dtype=np.uint16) + length for length in (1, 7, 32, 3)]
+
+        def testbench():
+            for packet in packets:
+                source.write_packet(packet)
+            for packet in packets:
+                read = yield from sink.read_packet(extract=("payload", "last"))
+                np.testing.assert_array_equal(read["payload"], packet)
+                self.assertEqual(list(read["last"]).index(1), len(packet) - 1)
+
+        platform.add_process(testbench, "sync")
+        platform.sim(fifo)
+
+    def test_empty_packet(self):
+        platform = SimPlatform()
+        source = StreamSource(platform, PacketizedStream(16))
+        with self.assertRaises(AssertionError):
+            source.write_packet([])
+        self.assertTrue(source.done)
+
+    def test_read_packet_from_stream(self):
+        platform = SimPlatform()
+        platform.add_sim_clock("sync", 100e6)
+
+        input = PacketizedStream(16)
+        fifo = BufferedSyncStreamFIFO(input, 16)
+        source = StreamSource(platform, input)
+        packet = list(range(20))
+
+        def testbench():
+            source.write_packet(packet)
+            self.assertEqual((yield from read_packet_from_stream(fifo.output, pause_after_word=2)), packet)
+
+        platform.add_process(testbench, "sync")
+        platform.sim(fifo)
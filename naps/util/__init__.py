@@ -2,7 +2,11 @@ from .nmigen_misc import *
 from .python_misc import *
 from .formal import *
 from .sim import *
+from .cxxrtl_sim import *
+from .sim_trace import *
+from .value_eval import *
 from .past import *
 from .py_serialize import *
 from .process import *
 from .env import *
+from .profiler import *
@@ -0,0 +1,451 @@
+# a simulation engine that compiles the design with yosys' cxxrtl backend and drives the compiled model from python.
+# it understands the same generator testbenches as the nMigen pysim engine but is orders of magnitude faster for
+# large designs.
+import ctypes
+import heapq
+import hashlib
+import os
+import re
+import subprocess
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from nmigen import *
+from nmigen.back import rtlil
+from nmigen.hdl.ast import UserValue, Operator, Slice, Part, Cat, Repl, ArrayProxy, Const, Assign, Statement, \
+    SignalDict
+from nmigen.sim import Tick, Settle, Delay, Passive, Active
+from nmigen._toolchain.yosys import find_yosys
+
+from .env import naps_getenv
+from .value_eval import UNARY_OPERATORS, BINARY_OPERATORS, as_signed
+
+__all__ = ["CxxrtlSimulator", "compile_cxxrtl_model"]
+
+
+class _CxxrtlObject(ctypes.Structure):
+    # see backends/cxxrtl/cxxrtl_capi.h; fields are only ever appended there so we can ignore the newer ones
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("width", ctypes.c_size_t),
+        ("lsb_at", ctypes.c_size_t),
+        ("depth", ctypes.c_size_t),
+        ("zero_at", ctypes.c_size_t),
+        ("curr", ctypes.POINTER(ctypes.c_uint32)),
+        ("next", ctypes.POINTER(ctypes.c_uint32)),
+    ]
+
+
+def _cache_dir():
+    return Path(naps_getenv("CXXRTL_CACHE", Path.home() / ".cache" / "naps" / "cxxrtl"))
+
+
+def _cxxrtl_include_dirs_and_capi(yosys):
+    include = Path(yosys.data_dir()) / "include"
+    include_dirs = [include, include / "backends" / "cxxrtl" / "runtime"]
+    capi_candidates = [
+        include / "backends" / "cxxrtl" / "runtime" / "cxxrtl" / "capi" / "cxxrtl_capi.cc",
+        include / "backends" / "cxxrtl" / "cxxrtl_capi.cc",
+    ]
+    capi = next((path for path in capi_candidates if path.exists()), None)
+    if capi is None:
+        raise FileNotFoundError("could not find the cxxrtl c api sources in {}".format(include))
+    return include_dirs, capi
+
+
+def compile_cxxrtl_model(rtlil_text):
+    """Compile an rtlil design to a shared library of its cxxrtl model. The result is cached on disk (see the
+    NAPS_CXXRTL_CACHE environment variable) keyed by a hash of the design so re-running unchanged designs is cheap.
+
+    :param rtlil_text: the rtlil of the design as returned by `nmigen.back.rtlil.convert_fragment`
+    :return: the path of the compiled model
+    """
+    yosys = find_yosys(lambda ver: ver >= (0, 10))
+    cxx = os.environ.get("CXX", "c++")
+    cxxflags = naps_getenv("CXXRTL_CXXFLAGS", "-O1")
+
+    # the src attributes do not change the behaviour of the design but would invalidate the cache on every unrelated
+    # line shift in the python sources
+    stripped = re.sub(r"^\s*attribute \\src .*$", "", rtlil_text, flags=re.MULTILINE)
+    key = hashlib.sha256("\0".join([stripped, str(yosys.version()), cxx, cxxflags]).encode("utf-8")).hexdigest()
+
+    cache_dir = _cache_dir()
+    library = cache_dir / "{}.so".format(key)
+    if library.exists():
+        return library
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    include_dirs, capi = _cxxrtl_include_dirs_and_capi(yosys)
+    cxx_source = yosys.run(["-q", "-"], "read_rtlil <<rtlil\n{}\nrtlil\nwrite_cxxrtl -O4 -g2".format(rtlil_text))
+    with TemporaryDirectory(prefix="naps_cxxrtl_") as build_dir:
+        design = Path(build_dir) / "design.cc"
+        design.write_text(cxx_source)
+        output = Path(build_dir) / "model.so"
+        subprocess.check_call([
+            *cxx.split(), "-std=c++14", "-shared", "-fPIC", *cxxflags.split(),
+            *("-I{}".format(include_dir) for include_dir in include_dirs),
+            str(design), str(capi), "-o", str(output)
+        ])
+        # an atomic rename keeps concurrent test runs from loading half written libraries
+        temp_library = cache_dir / "{}.{}.tmp".format(key, os.getpid())
+        output.replace(temp_library)
+        temp_library.replace(library)
+    return library
+
+
+class _Model:
+    def __init__(self, library_path):
+        lib = self.lib = ctypes.cdll.LoadLibrary(str(library_path))
+        lib.cxxrtl_design_create.restype = ctypes.c_void_p
+        lib.cxxrtl_create.argtypes = [ctypes.c_void_p]
+        lib.cxxrtl_create.restype = ctypes.c_void_p
+        lib.cxxrtl_destroy.argtypes = [ctypes.c_void_p]
+        lib.cxxrtl_step.argtypes = [ctypes.c_void_p]
+        lib.cxxrtl_step.restype = ctypes.c_size_t
+        lib.cxxrtl_get_parts.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.POINTER(ctypes.c_size_t)]
+        lib.cxxrtl_get_parts.restype = ctypes.POINTER(_CxxrtlObject)
+        self.handle = lib.cxxrtl_create(lib.cxxrtl_design_create())
+
+    def get(self, name):
+        parts = ctypes.c_size_t()
+        obj = self.lib.cxxrtl_get_parts(self.handle, name.encode("utf-8"), ctypes.byref(parts))
+        if not obj or parts.value != 1:
+            return None
+        return obj.contents
+
+    def step(self):
+        self.lib.cxxrtl_step(self.handle)
+
+    def __del__(self):
+        if getattr(self, "handle", None):
+            self.lib.cxxrtl_destroy(self.handle)
+            self.handle = None
+
+
+def _read_chunks(pointer, offset, chunks):
+    if chunks == 1:
+        return lambda: pointer[offset]
+    return lambda: sum(pointer[offset + i] << (32 * i) for i in range(chunks))
+
+
+def _write_chunks(pointer, offset, chunks):
+    def write(value):
+        for i in range(chunks):
+            pointer[offset + i] = (value >> (32 * i)) & 0xFFFF_FFFF
+    return write
+
+
+class _ValueCompiler:
+    """Compiles nMigen values to python closures that return the value as an unsigned int of the value's width."""
+
+    def __init__(self, signal_accessor, domains):
+        self.signal_accessor = signal_accessor
+        self.domains = domains
+
+    def rhs(self, value):
+        value = Value.cast(value)
+        if isinstance(value, Signal):
+            return self.signal_accessor(value)[0]
+        elif isinstance(value, Const):
+            constant = value.value & ((1 << len(value)) - 1)
+            return lambda: constant
+        return self._compile(value)
+
+    def signed_rhs(self, value):
+        value = Value.cast(value)
+        compiled = self.rhs(value)
+        width, signed = value.shape()
+        if signed:
+            return lambda: as_signed(compiled(), width)
+        return compiled
+
+    def _compile(self, value):
+        width = len(value)
+        mask = (1 << width) - 1
+        if isinstance(value, UserValue):
+            return self.rhs(value._lazy_lower())
+        elif isinstance(value, ClockSignal):
+            return self.rhs(self.domains[value.domain].clk)
+        elif isinstance(value, ResetSignal):
+            return self.rhs(self.domains[value.domain].rst)
+        elif isinstance(value, Operator):
+            operands = [self.signed_rhs(operand) for operand in value.operands]
+            if len(operands) == 1:
+                a, = operands
+                if value.operator == "r&":
+                    operand_mask = (1 << len(value.operands[0])) - 1
+                    unsigned = self.rhs(value.operands[0])
+                    return lambda: int(unsigned() == operand_mask)
+                op = UNARY_OPERATORS[value.operator]
+                return lambda: op(a()) & mask
+            elif len(operands) == 2:
+                a, b = operands
+                op = BINARY_OPERATORS[value.operator]
+                return lambda: op(a(), b()) & mask
+            elif value.operator == "m":
+                sel, val1, val0 = operands
+                return lambda: (val1() if sel() else val0()) & mask
+        elif isinstance(value, Slice):
+            inner = self.rhs(value.value)
+            start = value.start
+            return lambda: (inner() >> start) & mask
+        elif isinstance(value, Part):
+            inner = self.rhs(value.value)
+            offset = self.rhs(value.offset)
+            stride = value.stride
+            return lambda: (inner() >> (offset() * stride)) & mask
+        elif isinstance(value, Cat):
+            parts = [(self.rhs(part), offset) for part, offset in self._cat_offsets(value)]
+            return lambda: sum(part() << offset for part, offset in parts)
+        elif isinstance(value, Repl):
+            inner = self.rhs(value.value)
+            inner_width = len(value.value)
+            count = value.count
+            return lambda: sum(inner() << (inner_width * i) for i in range(count))
+        elif isinstance(value, ArrayProxy):
+            elems = [self.signed_rhs(elem) for elem in value.elems]
+            index = self.rhs(value.index)
+            return lambda: elems[min(index(), len(elems) - 1)]() & mask
+        raise NotImplementedError("the cxxrtl engine can not evaluate {!r}".format(value))
+
+    @staticmethod
+    def _cat_offsets(value):
+        offset = 0
+        for part in value.parts:
+            yield part, offset
+            offset += len(part)
+
+    def lhs(self, value):
+        """Returns a function that schedules the assignment of an unsigned int to the value"""
+        value = Value.cast(value)
+        if isinstance(value, UserValue):
+            return self.lhs(value._lazy_lower())
+        elif isinstance(value, Signal):
+            return self.signal_accessor(value)[1]
+        elif isinstance(value, (Slice, Part)):
+            # the read modify write happens on the whole signal which is correct as long as the slices of one signal
+            # are written in program order
+            inner_read = self.rhs(value.value)
+            inner_write = self.lhs(value.value)
+            mask = (1 << len(value)) - 1
+            if isinstance(value, Slice):
+                start = value.start
+                get_start = lambda: start
+            else:
+                offset = self.rhs(value.offset)
+                stride = value.stride
+                get_start = lambda: offset() * stride
+            def write(new, pending):
+                current = pending.get(inner_write, inner_read())
+                start = get_start()
+                inner_write((current & ~(mask << start)) | ((new & mask) << start), pending)
+            return write
+        elif isinstance(value, Cat):
+            parts = [(self.lhs(part), offset, (1 << len(part)) - 1) for part, offset in self._cat_offsets(value)]
+            def write(new, pending):
+                for part, offset, mask in parts:
+                    part((new >> offset) & mask, pending)
+            return write
+        elif isinstance(value, ArrayProxy):
+            elems = [self.lhs(elem) for elem in value.elems]
+            index = self.rhs(value.index)
+            return lambda new, pending: elems[min(index(), len(elems) - 1)](new, pending)
+        raise NotImplementedError("the cxxrtl engine can not assign to {!r}".format(value))
+
+
+class _Process:
+    def __init__(self, generator, domain):
+        self.generator = generator
+        self.default_cmd = Tick(domain)
+        self.passive = False
+        self.response = None
+        self.done = False
+
+
+class CxxrtlSimulator:
+    """A drop in replacement for the subset of `nmigen.sim.Simulator` that is used by SimPlatform."""
+
+    def __init__(self, fragment):
+        fragment = Fragment.get(fragment, None).prepare()
+        self.domains = fragment.domains
+        rtlil_text, self.name_map = rtlil.convert_fragment(fragment, "top")
+        self.model = _Model(compile_cxxrtl_model(rtlil_text))
+
+        self.memory_elements = SignalDict()
+        self._collect_memories(fragment, ())
+
+        self.accessors = SignalDict()
+        self.python_state = SignalDict()  # signals that are not part of the design are only known to the testbench
+        self.pending_writes = {}
+        self.pending_edges = {}
+        self.compiler = _ValueCompiler(self._signal_accessor, self.domains)
+
+        self.processes = []
+        self.waiting_for_tick = {}
+        self.time = 0
+        self.timeline = []  # a heap of (time, sequence, action)
+        self.sequence = 0
+
+        for signal in self.name_map:
+            if signal.reset != 0:
+                try:
+                    self._signal_accessor(signal)[1](signal.reset & ((1 << len(signal)) - 1), self.pending_writes)
+                except KeyError:
+                    pass
+        self._commit()
+
+    def _collect_memories(self, fragment, path):
+        for subfragment, name in fragment.subfragments:
+            if isinstance(subfragment, Instance) and isinstance(subfragment.parameters.get("MEMID"), Memory):
+                memory = subfragment.parameters["MEMID"]
+                obj = self.model.get(" ".join((*path, memory.name)))
+                if obj is not None:
+                    for i, element in enumerate(memory._array):
+                        self.memory_elements[element] = (obj, i)
+            else:
+                self._collect_memories(subfragment, (*path, name if name is not None else "U$"))
+
+    def _signal_accessor(self, signal):
+        if signal in self.accessors:
+            return self.accessors[signal]
+        chunks = (len(signal) + 31) // 32
+        if signal in self.memory_elements:
+            obj, index = self.memory_elements[signal]
+            offset = (index - obj.zero_at) * chunks
+            read = _read_chunks(obj.curr, offset, chunks)
+            write_now = _write_chunks(obj.curr, offset, chunks)
+        elif signal in self.name_map:
+            name = " ".join(self.name_map[signal][1:])
+            obj = self.model.get(name)
+            if obj is None:
+                raise KeyError("signal {!r} ({}) was optimized out of the cxxrtl model".format(signal, name))
+            read = _read_chunks(obj.curr, 0, chunks)
+            write_now = _write_chunks(obj.next if obj.next else obj.curr, 0, chunks)
+        else:
+            state = self.python_state
+            state.setdefault(signal, signal.reset & ((1 << len(signal)) - 1))
+            read = lambda: state[signal]
+            write_now = lambda value: state.__setitem__(signal, value)
+
+        def write(value, pending):
+            pending[write] = value
+        write.now = write_now
+        self.accessors[signal] = read, write
+        return read, write
+
+    def _commit(self):
+        # depending on the cxxrtl version, edges are detected either on the eval() that sees the new clock value or
+        # only after it was committed. committing the clock edges in a separate step avoids that the flip flops
+        # sample the values the processes wrote at the same edge in either case.
+        if self.pending_edges:
+            for write, value in self.pending_edges.items():
+                write.now(value)
+            self.pending_edges.clear()
+            self.model.step()
+        for write, value in self.pending_writes.items():
+            write.now(value)
+        self.pending_writes.clear()
+        self.model.step()
+
+    def _schedule(self, time, action):
+        heapq.heappush(self.timeline, (time, self.sequence, action))
+        self.sequence += 1
+
+    def add_clock(self, period, *, phase=None, domain="sync", if_exists=False):
+        if isinstance(domain, ClockDomain):
+            domain = domain.name
+        if domain not in self.domains:
+            if if_exists:
+                return
+            raise ValueError("Domain {!r} is not present in simulation".format(domain))
+        period = round(period * 1e15)  # we keep the time in femtoseconds to avoid rounding issues
+        phase = period // 2 if phase is None else round(phase * 1e15)
+        write = self._signal_accessor(self.domains[domain].clk)[1]
+        clock = (domain, period, write)
+        self._schedule(phase, ("rise", clock))
+
+    def add_sync_process(self, process, *, domain="sync"):
+        if isinstance(domain, ClockDomain):
+            domain = domain.name
+        process = _Process(process(), domain)
+        self.processes.append(process)
+        # just like in pysim, sync processes start at the first clock edge
+        self.waiting_for_tick.setdefault(domain, []).append(process)
+
+    def add_process(self, process):
+        process = _Process(process(), None)
+        process.default_cmd = None
+        self.processes.append(process)
+        self._schedule(0, ("resume", process))
+
+    def _run_process(self, process):
+        generator = process.generator
+        response = process.response
+        while True:
+            try:
+                command = generator.send(response)
+            except StopIteration:
+                process.done = True
+                return None
+            response = None
+            if command is None:
+                command = process.default_cmd
+                if command is None:
+                    raise TypeError("the default command of a process without domain must not be used")
+            if isinstance(command, (Value, UserValue)) or hasattr(command, "as_value"):
+                value = Value.cast(command)
+                response = self.compiler.signed_rhs(value)()
+            elif isinstance(command, Assign):
+                new = self.compiler.signed_rhs(command.rhs)() & ((1 << len(command.lhs)) - 1)
+                self.compiler.lhs(command.lhs)(new, self.pending_writes)
+            elif isinstance(command, Tick):
+                domain = command.domain.name if isinstance(command.domain, ClockDomain) else command.domain
+                process.response = None
+                return ("tick", domain)
+            elif isinstance(command, Settle):
+                self._commit()
+            elif isinstance(command, Delay):
+                process.response = None
+                return ("delay", 0 if command.interval is None else round(command.interval * 1e15))
+            elif isinstance(command, Passive):
+                process.passive = True
+            elif isinstance(command, Active):
+                process.passive = False
+            elif isinstance(command, Statement):
+                raise NotImplementedError("the cxxrtl engine only supports assignments, not {!r}".format(command))
+            else:
+                raise TypeError("received unsupported command {!r} from process {!r}".format(command, generator))
+
+    def run(self):
+        waiting_for_tick = self.waiting_for_tick
+        while self.timeline and any(not p.passive and not p.done for p in self.processes):
+            self.time, _, _ = self.timeline[0]
+            runnable = []
+            while self.timeline and self.timeline[0][0] == self.time:
+                _, _, (kind, *args) = heapq.heappop(self.timeline)
+                if kind == "rise":
+                    clock, = args
+                    domain, period, write = clock
+                    write(1, self.pending_edges)
+                    runnable.extend(waiting_for_tick.pop(domain, []))
+                    self._schedule(self.time + period // 2, ("fall", clock))
+                    self._schedule(self.time + period, ("rise", clock))
+                elif kind == "fall":
+                    clock, = args
+                    clock[2](0, self.pending_edges)
+                elif kind == "resume":
+                    runnable.extend(args)
+
+            # the clock edges are only committed after all processes ran. this way the processes observe the state
+            # from right before the edge (just like the flip flops do) unless they explicitly Settle()
+            for process in runnable:
+                wait = self._run_process(process)
+                if wait is None:
+                    continue
+                kind, arg = wait
+                if kind == "tick":
+                    waiting_for_tick.setdefault(arg, []).append(process)
+                else:
+                    self._schedule(self.time + arg, ("resume", process))
+            self._commit()
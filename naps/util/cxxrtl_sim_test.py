@@ -0,0 +1,77 @@
+import os
+import shutil
+import unittest
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from nmigen import *
+from nmigen.back import rtlil
+from nmigen.sim import Settle
+
+from naps import SimPlatform, do_nothing
+from naps.cores.stream import BufferedSyncStreamFIFO
+from naps.stream import BasicStream, write_to_stream, read_from_stream
+from .cxxrtl_sim import compile_cxxrtl_model
+
+
+@unittest.skipUnless(shutil.which(os.environ.get("CXX", "c++")), "needs a c++ compiler")
+class CxxrtlSimTest(unittest.TestCase):
+    def test_counter(self):
+        platform = SimPlatform()
+        m = Module()
+
+        enable = Signal()
+        counter = Signal(8)
+        signed_counter = Signal(signed(8))
+        with m.If(enable):
+            m.d.sync += counter.eq(counter + 1)
+        m.d.comb += signed_counter.eq(counter)
+
+        def testbench():
+            yield enable.eq(1)
+            yield from do_nothing(3)
+            self.assertEqual((yield counter), 2)
+            yield from do_nothing(200)
+            self.assertEqual((yield counter), 202)
+            self.assertEqual((yield signed_counter), 202 - 256)
+            self.assertEqual((yield counter[1:4]), (202 >> 1) & 0b111)
+            self.assertEqual((yield (counter * 2) == 404), 1)
+            yield enable.eq(0)
+            yield Settle()
+            self.assertEqual((yield counter), 203)
+            yield from do_nothing(10)
+            self.assertEqual((yield counter), 203)
+
+        platform.add_sim_clock("sync", 100e6)
+        platform.sim(m, testbench, engine="cxxrtl")
+
+    def test_fifo_memory(self):
+        platform = SimPlatform()
+        input = BasicStream(32)
+        fifo = BufferedSyncStreamFIFO(input, 64)
+
+        def writer():
+            for i in range(100):
+                yield from write_to_stream(input, payload=i * 0x1234567)
+
+        def reader():
+            for i in range(100):
+                self.assertEqual((yield from read_from_stream(fifo.output)), (i * 0x1234567) & 0xFFFF_FFFF)
+
+        platform.add_sim_clock("sync", 100e6)
+        platform.add_process(writer, "sync")
+        platform.add_process(reader, "sync")
+        platform.sim(fifo, engine="cxxrtl")
+
+    def test_model_cache(self):
+        m = Module()
+        a, b = Signal(8), Signal(8)
+        m.d.comb += b.eq(a + 1)
+        rtlil_text, _ = rtlil.convert_fragment(Fragment.get(m, None).prepare())
+
+        with TemporaryDirectory() as cache, patch.dict(os.environ, {"NAPS_CXXRTL_CACHE": cache}):
+            library = compile_cxxrtl_model(rtlil_text)
+            self.assertTrue(library.exists())
+            with patch("naps.util.cxxrtl_sim.subprocess.check_call") as compiler:
+                self.assertEqual(compile_cxxrtl_model(rtlil_text), library)
+                compiler.assert_not_called()
@@ -0,0 +1,166 @@
+# a profiler for everything that happens before the vendor toolchain is started. it records a tree of timings
+# (elaborate() calls per elaboratable instance, soc prepare hooks, rtlil & verilog generation) that can be written
+# as json. profiling is enabled with `--profile <file>` in the cli or by setting NAPS_PROFILE=<file>.
+import atexit
+import json
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+from .env import naps_getenv
+
+from nmigen.back import rtlil, verilog
+
+__all__ = ["Profiler", "current_profiler", "start_profiling", "stop_profiling", "profile_section", "profile_backends"]
+
+
+class Profiler:
+    def __init__(self):
+        self.root = {"name": "root", "kind": "root", "time": 0.0, "children": []}
+        self.stack = [self.root]
+        self.starts = [perf_counter()]
+        # nodes for objects that are the result of an elaborate() call and are elaborated themselves later
+        self._continuations = {}
+
+    @property
+    def current(self):
+        return self.stack[-1]
+
+    def child(self, name, kind, **attrs):
+        """Create a new node below the currently open node."""
+        parent = self.current
+        # instance paths are only built along the elaboration hierarchy
+        path = "{}.{}".format(parent["path"], name) if parent["kind"] == kind == "elaborate" else name
+        node = {"name": name, "kind": kind, "path": path, "time": 0.0, **attrs, "children": []}
+        parent["children"].append(node)
+        return node
+
+    def begin(self, node):
+        self.stack.append(node)
+        self.starts.append(perf_counter())
+
+    def end(self):
+        node = self.stack.pop()
+        node["time"] += perf_counter() - self.starts.pop()
+        return node
+
+    @contextmanager
+    def measure(self, node):
+        """Add the time spent in the with block to an (existing) node and make it the parent of new nodes."""
+        self.begin(node)
+        try:
+            yield node
+        finally:
+            self.end()
+
+    @contextmanager
+    def section(self, name, kind="section", **attrs):
+        with self.measure(self.child(name, kind, **attrs)) as node:
+            yield node
+
+    def continue_with(self, obj, node):
+        """Account the time of the elaboration of obj (e.g. the Module returned by elaborate()) to node."""
+        self._continuations[id(obj)] = (obj, node)
+
+    def continuation(self, obj):
+        entry = self._continuations.pop(id(obj), None)
+        return entry[1] if entry is not None else None
+
+    def as_dict(self):
+        self.root["time"] = perf_counter() - self.starts[0]
+
+        def convert(node):
+            converted = {k: v for k, v in node.items() if k != "children"}
+            children = [convert(child) for child in node["children"]]
+            converted["self_time"] = node["time"] - sum(child["time"] for child in node["children"])
+            if children:
+                converted["children"] = children
+            return converted
+        return convert(self.root)
+
+    def per_class(self, kind="elaborate"):
+        """The summed up self time and the number of instances of every elaboratable class."""
+        totals = defaultdict(lambda: [0.0, 0])
+
+        def walk(node):
+            if node["kind"] == kind:
+                totals[node.get("class", node["name"])][0] += node["self_time"]
+                totals[node.get("class", node["name"])][1] += 1
+            for child in node.get("children", []):
+                walk(child)
+        walk(self.as_dict())
+        return dict(totals)
+
+    def write_json(self, filename):
+        with open(filename, "w") as f:
+            json.dump({"tree": self.as_dict(), "per_class": self.per_class()}, f, indent=2)
+
+    def print_summary(self, n=10):
+        print("\n### slowest elaboratables (self time)")
+        for cls, (time, count) in sorted(self.per_class().items(), key=lambda item: -item[1][0])[:n]:
+            print("{:50} {:8.3f} s in {} instance(s)".format(cls, time, count))
+
+
+_active_profiler = None
+
+
+def current_profiler():
+    """The running profiler or None if profiling is disabled."""
+    return _active_profiler
+
+
+def start_profiling():
+    global _active_profiler
+    _active_profiler = Profiler()
+    return _active_profiler
+
+
+def stop_profiling():
+    global _active_profiler
+    profiler, _active_profiler = _active_profiler, None
+    return profiler
+
+
+@contextmanager
+def profile_section(name, kind="section", **attrs):
+    """A profiled section if profiling is enabled. yields the node of the section or None."""
+    if _active_profiler is None:
+        yield None
+    else:
+        with _active_profiler.section(name, kind, **attrs) as node:
+            yield node
+
+
+@contextmanager
+def profile_backends():
+    """Profile the rtlil & verilog generation of the nmigen backends (e.g. during platform.build())."""
+    def wrap(module, function_name, section_name):
+        original = getattr(module, function_name)
+
+        def wrapper(*args, **kwargs):
+            with profile_section(section_name, "backend"):
+                return original(*args, **kwargs)
+        setattr(module, function_name, wrapper)
+        return lambda: setattr(module, function_name, original)
+
+    restores = [
+        wrap(rtlil, "convert_fragment", "rtlil generation"),
+        wrap(verilog, "_convert_rtlil_text", "verilog generation (yosys)"),
+    ]
+    try:
+        yield
+    finally:
+        for restore in restores:
+            restore()
+
+
+def _write_profile_at_exit(filename):
+    profiler = current_profiler()
+    if profiler is not None:
+        profiler.write_json(filename)
+        print("wrote elaboration profile to {}".format(filename))
+
+
+if naps_getenv("PROFILE"):
+    start_profiling()
+    atexit.register(_write_profile_at_exit, naps_getenv("PROFILE"))
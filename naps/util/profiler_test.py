@@ -0,0 +1,73 @@
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from nmigen import *
+from nmigen.back import rtlil
+
+from naps import SimPlatform, SocMemory
+from naps.soc.platform.zynq import ZynqSocPlatform
+from naps.soc.tracing_elaborate import fragment_get_with_elaboratable_trace
+from .profiler import start_profiling, stop_profiling, profile_backends
+
+
+class Inner(Elaboratable):
+    def __init__(self):
+        self.counter = Signal(8)
+
+    def elaborate(self, platform):
+        m = Module()
+        m.d.sync += self.counter.eq(self.counter + 1)
+        return m
+
+
+class Outer(Elaboratable):
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.a = Inner()
+        m.submodules.b = Inner()
+        m.submodules += Inner()
+        return m
+
+
+def find(node, predicate):
+    if predicate(node):
+        yield node
+    for child in node.get("children", []):
+        yield from find(child, predicate)
+
+
+class ProfilerTest(unittest.TestCase):
+    def tearDown(self):
+        stop_profiling()
+
+    def test_elaboration_tree(self):
+        profiler = start_profiling()
+        fragment, _ = fragment_get_with_elaboratable_trace(Outer(), SimPlatform(), name="top")
+        with profile_backends():
+            rtlil.convert_fragment(fragment.prepare())
+
+        tree = profiler.as_dict()
+        top = tree["children"][0]
+        self.assertEqual((top["path"], top["class"]), ("top", "Outer"))
+        self.assertEqual([(c["path"], c["class"]) for c in top["children"]],
+                         [("top.a", "Inner"), ("top.b", "Inner"), ("top.Inner", "Inner")])
+        # the time of a node includes the time of its children
+        self.assertGreaterEqual(top["time"], sum(c["time"] for c in top["children"]))
+        self.assertEqual(len(list(find(tree, lambda n: n["kind"] == "backend"))), 1)
+        self.assertEqual(profiler.per_class()["Inner"][1], 3)
+
+    def test_soc_hooks(self):
+        profiler = start_profiling()
+        platform = ZynqSocPlatform(SimPlatform())
+        platform.prepare_soc(SocMemory(width=32, depth=128))
+
+        with TemporaryDirectory() as tmp:
+            profiler.write_json(Path(tmp) / "profile.json")
+            profile = json.loads((Path(tmp) / "profile.json").read_text())
+
+        hooks = list(find(profile["tree"], lambda n: n["kind"] == "hook"))
+        self.assertEqual([hook["name"] for hook in hooks], [hook.__name__ for hook in platform.prepare_hooks])
+        self.assertTrue(all(hook["fragments"] > 1 for hook in hooks))
+        self.assertIn("SocMemory", profile["per_class"])
@@ -1,3 +1,4 @@
+import gzip
 import inspect
 from os.path import join, dirname
 from pathlib import Path
@@ -7,6 +8,11 @@ from nmigen import Signal
 from nmigen.hdl.ast import UserValue
 from nmigen.sim import Simulator
 
+from .cxxrtl_sim import CxxrtlSimulator
+from .env import naps_getenv
+from .sim_trace import TraceWriter
+from .value_eval import evaluate, UnsupportedValueError
+
 __all__ = ["SimPlatform", "FakeResource", "TristateIo", "TristateDdrIo", "SimDdr", "wait_for", "pulse", "do_nothing", "resolve"]
 
 
@@ -75,10 +81,29 @@ class SimPlatform:
     def add_sim_clock(self, domain_name, frequency, phase=0):
         self.clocks[domain_name] = (frequency, phase)
 
-    def sim(self, dut, testbench=None, traces=(), engine="pysim"):
+    def sim(self, dut, testbench=None, traces=None, engine=None, trace_start=0, trace_length=None,
+            trace_on_failure=None, trace_format="vcd", trace_domain="sync"):
+        """
+        Simulate the design.
+
+        :param traces: None dumps all signals with pysim and nothing with cxxrtl, "all" or "none" do what they say,
+                       otherwise a list of signals and / or hierarchy globs (like "top.fifo.*") to dump
+        :param trace_start: the cycle of trace_domain in which dumping starts or an nMigen expression that starts
+                            dumping once it becomes true
+        :param trace_length: the number of cycles to dump after the start (None for dumping until the end)
+        :param trace_on_failure: only keep the last n cycles in memory and dump them if the simulation raises
+        :param trace_format: "vcd", "vcd.gz" or "fst"
+        """
+        if engine is None:
+            engine = naps_getenv("SIM_ENGINE", "pysim")
+        if traces is None:
+            traces = "none" if engine == "cxxrtl" else "all"
         dut = self.prepare(dut)
         self.fragment = dut
-        simulator = Simulator(dut, engine=engine)
+        if engine == "cxxrtl":
+            simulator = CxxrtlSimulator(dut)
+        else:
+            simulator = Simulator(dut, engine=engine)
         for name, (frequency, phase) in self.clocks.items():
             simulator.add_clock(1 / frequency, domain=name, phase=phase)
 
@@ -95,10 +120,38 @@ class SimPlatform:
         for generator, domain in self.processes:
             simulator.add_sync_process(generator, domain=domain)
 
-        print("\nwriting vcd to '{}.vcd'".format(self.output_filename_base))
-        with simulator.write_vcd("{}.vcd".format(self.output_filename_base), "{}.gtkw".format(self.output_filename_base),
-                                 traces=traces):
+        if traces == "none":
+            simulator.run()
+            return
+
+        # the full dump of nMigen is the cheapest way to trace everything with pysim
+        full_pysim_dump = traces == "all" and engine == "pysim" and trace_start == 0 and trace_length is None \
+                          and trace_on_failure is None and trace_format in ("vcd", "vcd.gz")
+        if full_pysim_dump:
+            vcd_filename = "{}.{}".format(self.output_filename_base, trace_format)
+            print("\nwriting vcd to '{}'".format(vcd_filename))
+            with (gzip.open(vcd_filename, "wt") if trace_format == "vcd.gz" else open(vcd_filename, "wt")) as vcd_file:
+                with simulator.write_vcd(vcd_file, "{}.gtkw".format(self.output_filename_base)):
+                    simulator.run()
+            return
+
+        if trace_domain not in self.clocks:
+            if not self.clocks:
+                raise ValueError(
+                    "selective or windowed tracing needs a clock to sample the signals with; "
+                    "add one with add_sim_clock() or use traces='all' / 'none'"
+                )
+            trace_domain = next(iter(self.clocks))
+        frequency, phase = self.clocks[trace_domain]
+        trace_writer = TraceWriter(dut, self.output_filename_base, traces, start=trace_start, length=trace_length,
+                                   on_failure=trace_on_failure, format=trace_format)
+        simulator.add_sync_process(trace_writer.process(1 / frequency, phase), domain=trace_domain)
+        try:
             simulator.run()
+        except BaseException:
+            trace_writer.close(failed=True)
+            raise
+        trace_writer.close()
 
 
 class FakeResource(UserValue):
@@ -193,7 +246,12 @@ def do_nothing(length=10):
 
 def resolve(expr):
     """Resolves a nMigen expression that can be constantly evaluated to an integer"""
+    try:
+        return evaluate(expr)
+    except UnsupportedValueError:
+        pass
 
+    # fall back to a simulator for everything the pure python evaluator does not understand (e.g. Sample)
     sim = Simulator(Module())
 
     a = []
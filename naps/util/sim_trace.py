@@ -0,0 +1,183 @@
+# selective waveform capture for simulations. instead of dumping every signal of the design (like nMigen's
+# write_vcd() does) a passive process samples only the requested signals once per clock cycle and only writes
+# them out if they are inside the requested window.
+import gzip
+import subprocess
+from collections import deque
+from fnmatch import fnmatchcase
+from pathlib import Path
+from shutil import which
+
+from nmigen import *
+from nmigen.hdl.ast import SignalDict
+from nmigen.sim import Passive
+from vcd import VCDWriter
+
+__all__ = ["hierarchical_signal_names", "TraceWriter", "vcd_to_fst"]
+
+
+def vcd_to_fst(vcd_filename, fst_filename):
+    """Convert a vcd file to fst with gtkwave's vcd2fst and remove the vcd file afterwards"""
+    vcd2fst = which("vcd2fst")
+    if vcd2fst is None:
+        raise FileNotFoundError("vcd2fst (from gtkwave) is needed for writing fst traces")
+    subprocess.check_call([vcd2fst, str(vcd_filename), str(fst_filename)])
+    Path(vcd_filename).unlink()
+
+
+def hierarchical_signal_names(fragment, hierarchy=("top",)):
+    """Collect all signals used in a fragment with their hierarchical (dotted) names, e.g. `top.fifo.r_level`"""
+    names = SignalDict()
+
+    def add(signal, hierarchy):
+        names.setdefault(signal, set()).add(".".join((*hierarchy, str(signal.name))))
+
+    def walk(fragment, hierarchy):
+        for domain_name in fragment.drivers:
+            if domain_name is not None and domain_name in fragment.domains:
+                domain = fragment.domains[domain_name]
+                add(domain.clk, hierarchy)
+                if domain.rst is not None:
+                    add(domain.rst, hierarchy)
+        for statement in fragment.statements:
+            for signal in statement._lhs_signals() | statement._rhs_signals():
+                if not isinstance(signal, (ClockSignal, ResetSignal)):
+                    add(signal, hierarchy)
+        for i, (subfragment, name) in enumerate(fragment.subfragments):
+            walk(subfragment, (*hierarchy, name if name is not None else "U${}".format(i)))
+
+    walk(fragment, hierarchy)
+    return names
+
+
+class TraceWriter:
+    def __init__(self, fragment, filename_base, traces="all", start=0, length=None, on_failure=None,
+                 format="vcd"):
+        """
+        Samples the selected signals once per cycle of a clock domain and writes them to a waveform file.
+
+        :param traces: "all" or a list of signals and / or globs that are matched against the hierarchical signal
+                       names (e.g. "top.fifo.*")
+        :param start: the cycle in which dumping starts or an nMigen expression that triggers the start of dumping
+                      once it becomes true
+        :param length: the number of cycles to dump after the start (None for dumping until the end)
+        :param on_failure: if given, only the last `on_failure` cycles are kept in memory and written out only if
+                           the simulation raises an exception
+        :param format: "vcd", "vcd.gz" or "fst" (needs vcd2fst from gtkwave)
+        """
+        if format not in ("vcd", "vcd.gz", "fst"):
+            raise ValueError("unknown trace format {!r}".format(format))
+        self.filename = "{}.{}".format(filename_base, format)
+        self.format = format
+        self.start = start
+        self.length = length
+        self.on_failure = on_failure
+
+        names = hierarchical_signal_names(fragment)
+        if traces == "all":
+            self.signals = SignalDict(names.items())
+        else:
+            self.signals = SignalDict()
+            for trace in traces:
+                if isinstance(trace, str):
+                    for signal, signal_names in names.items():
+                        matching = {name for name in signal_names if fnmatchcase(name, trace)}
+                        if matching:
+                            self.signals.setdefault(signal, set()).update(matching)
+                else:
+                    trace = Value.cast(trace)
+                    if not isinstance(trace, Signal):
+                        raise TypeError("traces must be signals or hierarchy globs, not {!r}".format(trace))
+                    self.signals[trace] = names.get(trace, {"bench.{}".format(trace.name)})
+        self.signal_list = list(self.signals.keys())
+
+        self.buffer = deque(maxlen=on_failure) if on_failure is not None else None
+        self.file = None
+        self.writer = None
+        self.vcd_vars = None
+        self.last_values = None
+        self.last_timestamp = 0
+
+    def process(self, period, phase=0):
+        """Returns the sampling process for a clock with the given period and phase (in seconds)."""
+        period_ps = round(period * 1e12)
+        phase_ps = round(phase * 1e12)
+        signals = self.signal_list
+
+        def sampler():
+            yield Passive()
+            cycle = 0
+            started_at = self.start if isinstance(self.start, int) else None
+            while True:
+                if started_at is None and (yield self.start):
+                    started_at = cycle
+                if started_at is not None and cycle >= started_at and \
+                        (self.length is None or cycle < started_at + self.length):
+                    values = []
+                    for signal in signals:
+                        values.append((yield signal))
+                    self._record(phase_ps + cycle * period_ps, values)
+                cycle += 1
+                yield
+
+        return sampler
+
+    def _record(self, timestamp, values):
+        if self.buffer is not None:
+            self.buffer.append((timestamp, values))
+        else:
+            self._write(timestamp, values)
+
+    def _open(self):
+        if self.format == "vcd.gz":
+            self.file = gzip.open(self.filename, "wt")
+        else:
+            self.file = open(self.filename if self.format == "vcd" else self.filename + ".vcd", "wt")
+        self.writer = VCDWriter(self.file, timescale="1 ps", comment="Generated by naps")
+        self.vcd_vars = []
+        for signal in self.signal_list:
+            var_type, size, init = ("string", 1, self._decode(signal, signal.reset)) if signal.decoder else \
+                ("wire", len(signal), signal.reset)
+            var = None
+            for name in sorted(self.signals[signal]):
+                *scope, var_name = name.split(".")
+                suffix = 0
+                while True:
+                    try:
+                        unique_name = var_name if suffix == 0 else "{}${}".format(var_name, suffix)
+                        if var is None:
+                            var = self.writer.register_var(scope, unique_name, var_type, size=size, init=init)
+                        else:
+                            self.writer.register_alias(scope, unique_name, var)
+                        break
+                    except KeyError:
+                        suffix += 1
+            self.vcd_vars.append(var)
+        self.last_values = [None] * len(self.signal_list)
+
+    @staticmethod
+    def _decode(signal, value):
+        return signal.decoder(value).expandtabs().replace(" ", "_")
+
+    def _write(self, timestamp, values):
+        if self.writer is None:
+            self._open()
+        for i, value in enumerate(values):
+            if value != self.last_values[i]:
+                self.last_values[i] = value
+                signal = self.signal_list[i]
+                self.writer.change(self.vcd_vars[i], timestamp, self._decode(signal, value) if signal.decoder else value)
+        self.last_timestamp = timestamp
+
+    def close(self, failed=False):
+        """Finish writing. With on_failure set, the kept cycles are only written if `failed` is true."""
+        if self.buffer is not None and failed:
+            for timestamp, values in self.buffer:
+                self._write(timestamp, values)
+        if self.writer is None:
+            return
+        self.writer.close(self.last_timestamp)
+        self.file.close()
+        if self.format == "fst":
+            vcd_to_fst(self.filename + ".vcd", self.filename)
+        print("\nwrote {} traced signals to '{}'".format(len(self.signal_list), self.filename))
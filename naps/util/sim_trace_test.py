@@ -0,0 +1,91 @@
+import gzip
+import os
+import re
+import unittest
+
+from nmigen import *
+
+from naps import SimPlatform, do_nothing
+
+
+class Counter(Elaboratable):
+    def __init__(self):
+        self.counter = Signal(16)
+        self.big = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+        m.d.sync += self.counter.eq(self.counter + 1)
+        m.d.comb += self.big.eq(self.counter > 100)
+        return m
+
+
+def vcd_vars(filename):
+    with (gzip.open(filename, "rt") if filename.endswith(".gz") else open(filename)) as f:
+        content = f.read()
+    # we are not interested in the initial values
+    content = re.sub(r"\$dumpvars.*?\$end", "", content, flags=re.DOTALL).replace("#0\n", "")
+    return re.findall(r"\$var \w+ \d+ \S+ (\S+) \$end", content), content
+
+
+class SimTraceTest(unittest.TestCase):
+    def run_counter(self, cycles=200, fail=False, **kwargs):
+        platform = SimPlatform()
+        dut = Counter()
+        for stale in (platform.output_filename_base + ".vcd", platform.output_filename_base + ".vcd.gz"):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+        def testbench():
+            yield from do_nothing(cycles)
+            if fail:
+                raise AssertionError("failing on purpose")
+
+        platform.add_sim_clock("sync", 100e6)
+        platform.sim(dut, testbench, engine="pysim", **kwargs)
+        return platform.output_filename_base
+
+    def test_none(self):
+        filename_base = self.run_counter(traces="none")
+        self.assertFalse(os.path.exists(filename_base + ".vcd"))
+
+    def test_selected_signals_and_globs(self):
+        filename_base = self.run_counter(traces=["top.coun*"], trace_format="vcd.gz")
+        names, content = vcd_vars(filename_base + ".vcd.gz")
+        self.assertEqual(names, ["counter"])
+
+    def test_window(self):
+        filename_base = self.run_counter(traces="all", trace_start=50, trace_length=10)
+        names, content = vcd_vars(filename_base + ".vcd")
+        self.assertIn("big", names)
+        timestamps = [int(t) for t in re.findall(r"^#(\d+)$", content, re.MULTILINE)]
+        self.assertEqual(timestamps[0], 50 * 10_000)
+        self.assertLessEqual(timestamps[-1], 60 * 10_000)
+
+    def test_trigger(self):
+        dut_counter = Counter()
+        platform = SimPlatform()
+
+        def testbench():
+            yield from do_nothing(200)
+
+        platform.add_sim_clock("sync", 100e6)
+        platform.sim(dut_counter, testbench, traces=[dut_counter.counter], trace_start=dut_counter.big,
+                     trace_length=5)
+        names, content = vcd_vars(platform.output_filename_base + ".vcd")
+        changes = [int(v, 2) for v in re.findall(r"^b([01]+) ", content, re.MULTILINE)]
+        self.assertEqual(changes, [101, 102, 103, 104, 105])
+
+    def test_on_failure(self):
+        filename_base = self.run_counter(traces="all", trace_on_failure=20)
+        self.assertFalse(os.path.exists(filename_base + ".vcd"))
+
+        with self.assertRaises(AssertionError):
+            self.run_counter(traces="all", trace_on_failure=20, fail=True)
+        names, content = vcd_vars(filename_base + ".vcd")
+        self.assertEqual(len(re.findall(r"^#\d+$", content, re.MULTILINE)), 20)
+
+    def test_no_clock(self):
+        platform = SimPlatform()
+        with self.assertRaisesRegex(ValueError, "clock"):
+            platform.sim(Counter(), traces=["top.counter"])
@@ -1,34 +1,46 @@
 import re
-import subprocess
 from typing import Dict
 
+from nmigen._toolchain.yosys import find_yosys
 from nmigen.back import rtlil
 
+__all__ = ["get_module_sizes", "print_module_sizes", "get_logic_depth"]
 
-def get_module_sizes(module, *args, **kwargs):
+
+def _synth_xilinx(module, commands, *args, **kwargs):
     rtlil_text = rtlil.convert(module, *args, **kwargs)
 
     script = """
-        read_ilang <<rtlil
+        read_rtlil <<rtlil
         {}
         rtlil
-        
-        expose top
-        
-        synth_xilinx -abc9
-    """.format(rtlil_text)
 
-    popen = subprocess.Popen(["yosys", "-s", "-"],
-                             stdin=subprocess.PIPE,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE,
-                             encoding="utf-8")
-    output, error = popen.communicate(script)
+        {}
+    """.format(rtlil_text, "\n".join(commands))
+
+    yosys = find_yosys(lambda ver: ver >= (0, 10))
+    return yosys.run(["-"], script, ignore_warnings=True)
+
+
+def get_module_sizes(module, *args, **kwargs):
+    output = _synth_xilinx(module, ["expose top", "synth_xilinx -abc9", "stat"], *args, **kwargs)
+
+    # the output contains one section per module for every stat run; later sections override earlier ones
+    sizes = {}
+    for name, section in re.findall("=== (.*?) ===(.*?)(?====|$)", output, flags=re.DOTALL):
+        estimate = re.findall("Estimated number of LCs:\\W*(\\d+)", section)
+        if estimate:
+            sizes[name] = estimate[0]
+    return sizes
+
 
-    return {
-        re.findall("== (.*?) ===", section)[0]: re.findall("Estimated number of LCs:\\W*(\\d+)", section)[0]
-        for section in re.findall("== .*? ===.*?=", output, flags=re.DOTALL)
-    }
+def get_logic_depth(module, *args, **kwargs):
+    """
+    The number of cells on the longest register to register (or port) path after synthesis for xilinx 7 series.
+    This is a rough (but cheap) proxy for the achievable fmax of a design.
+    """
+    output = _synth_xilinx(module, ["synth_xilinx -abc9 -flatten", "ltp -noff"], *args, **kwargs)
+    return int(re.search("Longest topological path in .*? \\(length=(\\d+)\\)", output).group(1))
 
 
 def print_module_sizes(module, *args, **kwargs):
@@ -36,4 +48,4 @@ def print_module_sizes(module, *args, **kwargs):
     max_module_size = max(int(v) for v in module_sizes.values())
 
     for name, size in module_sizes.items():
-        print(name.ljust(30), size.ljust(3), "".join("=" for _ in range(int(int(size) / max_module_size * 80))))
\ No newline at end of file
+        print(name.ljust(30), size.ljust(3), "".join("=" for _ in range(int(int(size) / max_module_size * 80))))
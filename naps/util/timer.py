@@ -1,6 +1,8 @@
 import atexit
 from time import time
 
+from .profiler import current_profiler
+
 
 current_task = None
 current_start = None
@@ -24,6 +26,8 @@ def start_task(name):
     global current_task, current_start
     current_task = name
     current_start = time()
+    if current_profiler() is not None:
+        current_profiler().begin(current_profiler().child(name, "task"))
 
 
 def end_task():
@@ -31,6 +35,8 @@ def end_task():
     if current_task is not None:
         assert current_start is not None
         task_timings.append((current_task, time() - current_start))
+        if current_profiler() is not None and current_profiler().current["kind"] == "task":
+            current_profiler().end()
         print_task_timing(*task_timings[-1])
     current_task = None
     current_start = None
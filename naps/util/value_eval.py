@@ -0,0 +1,149 @@
+# evaluation of nMigen expressions in pure python without building a simulator
+from nmigen import *
+from nmigen.hdl.ast import UserValue, Operator, Slice, Part, Cat, Repl, ArrayProxy, Const
+
+__all__ = ["evaluate", "UnsupportedValueError"]
+
+
+UNARY_OPERATORS = {
+    "~": lambda a: ~a,
+    "-": lambda a: -a,
+    "b": lambda a: int(a != 0),
+    "r|": lambda a: int(a != 0),
+    "r^": lambda a: bin(a).count("1") & 1,
+    "u": lambda a: a,
+    "s": lambda a: a,
+}
+
+BINARY_OPERATORS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "//": lambda a, b: a // b if b else 0,
+    "%": lambda a, b: a % b if b else 0,
+    "&": lambda a, b: a & b,
+    "|": lambda a, b: a | b,
+    "^": lambda a, b: a ^ b,
+    "<<": lambda a, b: a << b,
+    ">>": lambda a, b: a >> b,
+    "==": lambda a, b: int(a == b),
+    "!=": lambda a, b: int(a != b),
+    "<": lambda a, b: int(a < b),
+    "<=": lambda a, b: int(a <= b),
+    ">": lambda a, b: int(a > b),
+    ">=": lambda a, b: int(a >= b),
+}
+
+
+def as_signed(value, width):
+    if width and value >> (width - 1):
+        return value - (1 << width)
+    return value
+
+
+class UnsupportedValueError(Exception):
+    pass
+
+
+class _Evaluator:
+    def __init__(self, signal_value):
+        self.signal_value = signal_value
+        self.memo = {}  # id -> (value, result); the value is kept alive so that its id can not be reused
+
+    def unsigned(self, value):
+        """Evaluate a value to an unsigned int of the width of the value."""
+        memoized = self.memo.get(id(value))
+        if memoized is not None:
+            return memoized[1]
+
+        # expressions can be nested arbitrarily deep, so we walk them with an explicit stack instead of recursing.
+        # every node is evaluated by a generator that yields the subexpressions it needs and gets their (unsigned)
+        # values sent back.
+        stack = [(value, self._evaluate(value))]
+        result = None
+        while stack:
+            node, evaluation = stack[-1]
+            try:
+                child = evaluation.send(result)
+            except StopIteration as e:
+                stack.pop()
+                result = e.value
+                self.memo[id(node)] = (node, result)
+                continue
+            memoized = self.memo.get(id(child))
+            if memoized is not None:
+                result = memoized[1]
+            else:
+                stack.append((child, self._evaluate(child)))
+                result = None
+        return result
+
+    def signed(self, value):
+        """Evaluate a value to an int that is interpreted according to the signedness of the value."""
+        return self._as_signed(value, self.unsigned(value))
+
+    @staticmethod
+    def _as_signed(value, result):
+        width, signed = value.shape()
+        return as_signed(result, width) if signed else result
+
+    def _evaluate(self, value):
+        if not isinstance(value, Value):
+            value = Value.cast(value)
+        mask = (1 << len(value)) - 1
+        if isinstance(value, Const):
+            return value.value & mask
+        elif isinstance(value, Signal):
+            return self.signal_value(value) & mask
+        elif isinstance(value, UserValue):
+            return (yield value._lazy_lower())
+        elif isinstance(value, Operator):
+            operands = value.operands
+            if len(operands) == 1:
+                operand = yield operands[0]
+                if value.operator == "r&":
+                    return int(operand == (1 << len(operands[0])) - 1)
+                return UNARY_OPERATORS[value.operator](self._as_signed(operands[0], operand)) & mask
+            elif len(operands) == 2:
+                a = self._as_signed(operands[0], (yield operands[0]))
+                b = self._as_signed(operands[1], (yield operands[1]))
+                return BINARY_OPERATORS[value.operator](a, b) & mask
+            elif value.operator == "m":
+                sel, val1, val0 = operands
+                chosen = val1 if (yield sel) else val0
+                return self._as_signed(chosen, (yield chosen)) & mask
+        elif isinstance(value, Slice):
+            return ((yield value.value) >> value.start) & mask
+        elif isinstance(value, Part):
+            inner = yield value.value
+            return (inner >> ((yield value.offset) * value.stride)) & mask
+        elif isinstance(value, Cat):
+            result = 0
+            offset = 0
+            for part in value.parts:
+                result |= (yield part) << offset
+                offset += len(part)
+            return result
+        elif isinstance(value, Repl):
+            inner = yield value.value
+            width = len(value.value)
+            return sum(inner << (width * i) for i in range(value.count))
+        elif isinstance(value, ArrayProxy):
+            elems = value.elems
+            elem = Value.cast(elems[min((yield value.index), len(elems) - 1)])
+            return self._as_signed(elem, (yield elem)) & mask
+        raise UnsupportedValueError("can not evaluate {!r}".format(value))
+
+
+def evaluate(expr, signal_value=lambda signal: signal.reset):
+    """
+    Evaluate an nMigen expression (or anything that can be cast to one) in pure python.
+    Identical subexpressions (the same objects) are only evaluated once.
+
+    :param signal_value: a function that returns the value of a signal. by default signals have their reset value.
+    :raises UnsupportedValueError: if the expression contains nodes that can not be evaluated this way
+    """
+    if isinstance(expr, int):
+        return expr
+    value = Value.cast(expr)
+    return _Evaluator(signal_value).signed(value)
@@ -0,0 +1,70 @@
+import unittest
+
+from nmigen import *
+from nmigen.hdl.ast import Sample
+from nmigen.sim import Simulator
+
+from naps.data_structure import packed_struct
+from .value_eval import evaluate, UnsupportedValueError
+
+
+@packed_struct
+class Header:
+    a: unsigned(3)
+    b: unsigned(5)
+
+
+def simulator_resolve(expr):
+    sim = Simulator(Module())
+    a = []
+
+    def testbench():
+        a.append((yield expr))
+
+    sim.add_process(testbench)
+    sim.run()
+    return a[0]
+
+
+class ValueEvalTest(unittest.TestCase):
+    def test_matches_simulator(self):
+        a = Const(0b1011_0110, 8)
+        b = Const(-3, signed(5))
+        s = Signal(8, reset=0x5A)
+        array = Array([Const(1, 4), Const(7, 4), Const(12, 4)])
+        expressions = [
+            a + b, a - b, b - a, a * b, a // 3, a % 7, -b, ~a, ~b, a & s, a | b, a ^ s, a << 3, a >> 2, b >> 1,
+            a == 0xB6, a != s, b < 0, a <= s, a > b, b >= -3, a.bool(), a.any(), a.all(), Const(0xF, 4).all(),
+            a.xor(), Mux(a[0], a, b), Mux(a[1], a, b), a[2:6], b[1:], a.bit_select(Const(3, 3), 4),
+            a.word_select(Const(1, 1), 4), Cat(a, b, s[0:3]), Repl(b[0:2], 5), a.as_signed(), b.as_unsigned(),
+            array[Const(1, 2)], array[Const(3, 2)], s + 1, Cat(s, s)[4:12],
+        ]
+        for expr in expressions:
+            self.assertEqual(simulator_resolve(expr), evaluate(expr), expr)
+
+    def test_value_castable(self):
+        header = Header(a=5, b=17)
+        self.assertEqual(evaluate(header), 5 | (17 << 3))
+        self.assertEqual(evaluate(Cat(Value.cast(header), Const(1, 1))), 5 | (17 << 3) | (1 << 8))
+
+    def test_shared_subexpressions(self):
+        expr = Const(1, 1)
+        for _ in range(200):
+            expr = Cat(expr, expr)[0:64]
+        self.assertEqual(evaluate(expr), (1 << 64) - 1)
+
+    def test_deep_expressions(self):
+        # much deeper than the python recursion limit
+        expr = Const(0, 16)
+        for _ in range(20000):
+            expr = (expr + 1)[0:16]
+        self.assertEqual(evaluate(expr), 20000)
+
+    def test_signal_values(self):
+        s = Signal(8, reset=3)
+        self.assertEqual(evaluate(s + 1), 4)
+        self.assertEqual(evaluate(s + 1, signal_value=lambda signal: 41), 42)
+
+    def test_unsupported(self):
+        with self.assertRaises(UnsupportedValueError):
+            evaluate(Sample(Signal(), 1, "sync"))